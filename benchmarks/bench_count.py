@@ -0,0 +1,217 @@
+# ruff: noqa: T201
+"""
+Time each stage of `python-import count` on a synthetic project.
+
+The project is like `tests/sample_projects/project1`, scaled up:
+`src/myproject/pkg0/pkg1/.../mod{i}.py` with absolute, aliased, relative and lazy imports of the searched name,
+and non-import uses of it that ripgrep also finds.
+
+Usage:
+    python benchmarks/bench_count.py [--files 2000] [--imports-per-file 4] [--uses-per-file 8] [--depth 4]
+    python benchmarks/bench_count.py --save before.json
+    python benchmarks/bench_count.py --compare before.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import timeit
+from pathlib import Path
+
+import tree_sitter_python as tspython
+from tree_sitter import Language, Parser
+
+from python_import.count import count_imports, merge_import_counts
+from python_import.parallel import imap_with_parser
+from python_import.rg import iter_rg_import_rowcols
+from python_import.utils import (
+    RelativeImportResolver,
+    get_all_imports_in_file_as_absolute,
+    relative_import_to_absolute_import,
+)
+from python_import.walk import iter_python_files, iter_walk_import_word_rowcols
+
+WORD = "foo"
+
+
+def make_project(
+    project_root: Path,
+    *,
+    num_files: int,
+    imports_per_file: int,
+    uses_per_file: int,
+    depth: int,
+) -> list[tuple[Path, str]]:
+    """
+    Write the synthetic project.
+
+    Returns:
+        (file path, relative import name) of every relative import in the project.
+    """
+    relative_imports: list[tuple[Path, str]] = []
+    import_templates = [
+        "from python_import import {word}",
+        "import {word}",
+        "from .utils import {word}",
+        "from {dots}common.utils import {word}",
+        "import numpy as {word}",
+        "from python_import import {word} as bar",
+    ]
+    for i in range(num_files):
+        # spread the files over `depth` levels of packages
+        level = i % (depth + 1)
+        module_dir = project_root / "src/myproject"
+        for j in range(level):
+            module_dir = module_dir / f"pkg{j}"
+        module_dir.mkdir(parents=True, exist_ok=True)
+        python_file_path = module_dir / f"mod{i}.py"
+
+        lines = ["from __future__ import annotations", "", "import os", ""]
+        for j in range(imports_per_file):
+            template = import_templates[(i + j) % len(import_templates)]
+            import_line = template.format(word=WORD, dots="." * (level + 1))
+            if j % 2 == 1:
+                # lazy import
+                lines += [f"def lazy{j}():", f"    {import_line}", ""]
+            else:
+                lines += [import_line, ""]
+            if import_line.startswith("from ."):
+                relative_imports.append((python_file_path, import_line.split()[1]))
+        for j in range(uses_per_file):
+            lines += [f"def use{j}(x):", f"    return {WORD}(x, os.sep) + {j}", ""]
+        python_file_path.write_text("\n".join(lines))
+
+    return relative_imports
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    arg_parser.add_argument("--files", type=int, default=2000)
+    arg_parser.add_argument("--imports-per-file", type=int, default=4)
+    arg_parser.add_argument("--uses-per-file", type=int, default=8)
+    arg_parser.add_argument("--depth", type=int, default=4)
+    arg_parser.add_argument("--jobs", type=int, default=0)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--save", type=Path, help="Save the timings as JSON.")
+    arg_parser.add_argument(
+        "--compare", type=Path, help="Compare with the timings saved with --save."
+    )
+    args = arg_parser.parse_args()
+
+    parser = Parser(Language(tspython.language()))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        project_root = Path(tmp_dir).resolve()
+        relative_imports = make_project(
+            project_root,
+            num_files=args.files,
+            imports_per_file=args.imports_per_file,
+            uses_per_file=args.uses_per_file,
+            depth=args.depth,
+        )
+
+        def best_of(func) -> float:
+            return min(timeit.repeat(func, number=1, repeat=args.repeat))
+
+        rg_import_rowcols = list(iter_rg_import_rowcols(project_root, WORD))
+        import_statement_to_count_files = [
+            get_all_imports_in_file_as_absolute(
+                project_root, python_file_path, parser, rowcols
+            )
+            for python_file_path, rowcols in rg_import_rowcols
+        ]
+
+        timings = {
+            "ripgrep": best_of(
+                lambda: list(iter_rg_import_rowcols(project_root, WORD))
+            ),
+            # the fallback when ripgrep is not installed
+            "built-in search": best_of(
+                lambda: list(iter_walk_import_word_rowcols(project_root, [WORD]))
+            ),
+            "built-in search (listing files only)": best_of(
+                lambda: list(iter_python_files(project_root))
+            ),
+            "tree-sitter (jobs=1)": best_of(
+                lambda: [
+                    get_all_imports_in_file_as_absolute(
+                        project_root, python_file_path, parser, rowcols
+                    )
+                    for python_file_path, rowcols in rg_import_rowcols
+                ]
+            ),
+            f"tree-sitter (jobs={args.jobs})": best_of(
+                lambda: list(
+                    imap_with_parser(
+                        get_all_imports_in_file_as_absolute,
+                        (
+                            {
+                                "project_root": project_root,
+                                "python_file_path": python_file_path,
+                                "rowcols": rowcols,
+                            }
+                            for python_file_path, rowcols in rg_import_rowcols
+                        ),
+                        parser,
+                        args.jobs,
+                    )
+                )
+            ),
+            "aggregation": best_of(
+                lambda: merge_import_counts(import_statement_to_count_files)
+            ),
+            "relative_import_to_absolute_import": best_of(
+                lambda: [
+                    relative_import_to_absolute_import(
+                        project_root, python_file_path, from_import_name
+                    )
+                    for python_file_path, from_import_name in relative_imports
+                ]
+            ),
+            "RelativeImportResolver": best_of(
+                lambda: [
+                    resolver.to_absolute(python_file_path, from_import_name)
+                    for resolver in [RelativeImportResolver(project_root)]
+                    for python_file_path, from_import_name in relative_imports
+                ]
+            ),
+            f"count (jobs={args.jobs})": best_of(
+                lambda: count_imports(
+                    project_root, WORD, parser, use_index=False, jobs=args.jobs
+                )
+            ),
+        }
+
+    print(
+        f"{args.files} files, {args.imports_per_file} imports and {args.uses_per_file} uses per file, "
+        f"depth {args.depth}: {sum(len(rowcols) for _, rowcols in rg_import_rowcols)} import hits, "
+        f"{len(relative_imports)} relative imports"
+    )
+
+    previous_timings = (
+        json.loads(args.compare.read_text())["timings"] if args.compare else {}
+    )
+    for name, seconds in timings.items():
+        line = f"{name:40s} {seconds * 1000:10.1f} ms"
+        if name in previous_timings:
+            line += f" ({seconds / previous_timings[name]:.2f}x of before)"
+        print(line)
+
+    if args.save:
+        args.save.write_text(
+            json.dumps(
+                {
+                    "args": vars(args) | {"save": None, "compare": None},
+                    "timings": timings,
+                },
+                indent=2,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
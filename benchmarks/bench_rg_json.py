@@ -0,0 +1,146 @@
+# ruff: noqa: T201
+"""
+Compare decoding `rg --json` output with `json.loads` on every line against `iter_rg_json_rowcols()`.
+
+Usage:
+    python benchmarks/bench_rg_json.py [--files 20000] [--matches-per-file 5] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import timeit
+
+from python_import.rg import is_possible_import_line, iter_rg_json_rowcols
+
+
+def make_rg_json_lines(num_files: int, matches_per_file: int) -> list[bytes]:
+    """
+    Make a synthetic `rg --json` stream, like `rg --json --word-regexp np`.
+
+    Half of the hits are import lines, and each file has a context record like `rg --json -C` would.
+    """
+    lines: list[bytes] = []
+    for i in range(num_files):
+        path = {"text": f"src/pkg{i % 100}/module_{i}.py"}
+        lines.append(
+            json.dumps(
+                {"type": "begin", "data": {"path": path}}, separators=(",", ":")
+            ).encode()
+        )
+        for j in range(matches_per_file):
+            text = (
+                "import numpy as np\n" if j % 2 == 0 else "    x = np.zeros((3, 3))\n"
+            )
+            start = text.index("np")
+            record = {
+                "type": "match",
+                "data": {
+                    "path": path,
+                    "lines": {"text": text},
+                    "line_number": j * 10 + 1,
+                    "absolute_offset": j * 300,
+                    "submatches": [
+                        {"match": {"text": "np"}, "start": start, "end": start + 2}
+                    ],
+                },
+            }
+            lines.append(json.dumps(record, separators=(",", ":")).encode())
+            lines.append(
+                json.dumps(
+                    {
+                        "type": "context",
+                        "data": {
+                            "path": path,
+                            "lines": {"text": "\n"},
+                            "line_number": j * 10 + 2,
+                            "absolute_offset": j * 300 + len(text),
+                            "submatches": [],
+                        },
+                    },
+                    separators=(",", ":"),
+                ).encode()
+            )
+        end = {
+            "type": "end",
+            "data": {
+                "path": path,
+                "binary_offset": None,
+                "stats": {
+                    "elapsed": {"secs": 0, "nanos": 12345, "human": "0.000012s"},
+                    "searches": 1,
+                    "searches_with_match": 1,
+                    "bytes_searched": 3000,
+                    "bytes_printed": 1234,
+                    "matched_lines": matches_per_file,
+                    "matches": matches_per_file,
+                },
+            },
+        }
+        lines.append(json.dumps(end, separators=(",", ":")).encode())
+    summary = {
+        "type": "summary",
+        "data": {
+            "elapsed_total": {"secs": 0, "nanos": 123456, "human": "0.000123s"},
+            "stats": {"searches": num_files},
+        },
+    }
+    lines.append(json.dumps(summary, separators=(",", ":")).encode())
+    return lines
+
+
+def json_loads_all(
+    rg_json_lines: list[bytes],
+) -> list[tuple[str, list[tuple[int, int]]]]:
+    """The previous implementation: decode every record."""
+    result = []
+    rowcols: list[tuple[int, int]] = []
+    for line in rg_json_lines:
+        rg_output = json.loads(line)
+        if rg_output["type"] == "match":
+            line_text = rg_output["data"]["lines"].get("text")
+            if line_text is not None and not is_possible_import_line(line_text):
+                continue
+            rowcols.extend(
+                (rg_output["data"]["line_number"] - 1, submatch["start"])
+                for submatch in rg_output["data"]["submatches"]
+            )
+        elif rg_output["type"] == "end":
+            if rowcols:
+                result.append((rg_output["data"]["path"]["text"], rowcols))
+            rowcols = []
+    return result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--files", type=int, default=20000)
+    arg_parser.add_argument("--matches-per-file", type=int, default=5)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    rg_json_lines = make_rg_json_lines(args.files, args.matches_per_file)
+    num_bytes = sum(len(line) for line in rg_json_lines)
+    print(f"{len(rg_json_lines)} records, {num_bytes / 1e6:.1f} MB")
+
+    assert json_loads_all(rg_json_lines) == list(iter_rg_json_rowcols(rg_json_lines))
+
+    baseline = min(
+        timeit.repeat(
+            lambda: json_loads_all(rg_json_lines), number=1, repeat=args.repeat
+        )
+    )
+    fast = min(
+        timeit.repeat(
+            lambda: list(iter_rg_json_rowcols(rg_json_lines)),
+            number=1,
+            repeat=args.repeat,
+        )
+    )
+    print(f"json.loads every record: {baseline * 1000:8.1f} ms")
+    print(f"iter_rg_json_rowcols:    {fast * 1000:8.1f} ms ({baseline / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,8 +20,23 @@ local M = {}
 ---@field import_from table<string, string|vim.NIL>?
 ---@field statement_after_imports table<string, string[]|vim.NIL>?
 
+---@class PythonImport.UserServerConfig
+---@field enabled boolean?
+---@field timeout integer?
+
+---@class PythonImport.UserCountConfig
+---@field limit integer?
+---@field max_time integer? milliseconds
+---@field rank_by_proximity boolean?
+---@field rank_by_recency "mtime"|"git"|nil
+
 ---@class PythonImport.UserConfig
 ---@field extend_lookup_table PythonImport.UserExtendLookupTable?
+---@field server PythonImport.UserServerConfig?
+---@field count PythonImport.UserCountConfig?
+---@field warm_up boolean?
+---@field index_env boolean?
+---@field stats boolean?
 ---
 ---Return nil to indicate no match is found and continue with the default lookup
 ---Return a table to stop the lookup and use the returned table as the result
@@ -58,6 +73,21 @@ function M.setup(opts)
   for _, v in ipairs(lookup_table.import) do
     lookup_table.is_import[v] = true
   end
+
+  local augroup = vim.api.nvim_create_augroup("python_import_warm_up", { clear = true })
+  if config.opts.warm_up then
+    vim.api.nvim_create_autocmd("BufEnter", {
+      group = augroup,
+      pattern = "*.py",
+      callback = function(args)
+        require("python_import.api").warm_up(args.buf)
+      end,
+    })
+    -- The plugin may be lazy-loaded after entering a Python buffer.
+    if vim.bo.filetype == "python" then
+      require("python_import.api").warm_up(vim.api.nvim_get_current_buf())
+    end
+  end
 end
 
 return M
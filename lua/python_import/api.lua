@@ -4,22 +4,320 @@ local health = require "python_import.health"
 local utils = require "python_import.utils"
 local config = require "python_import.config"
 local pyright = require "python_import.pyright"
+local server = require "python_import.server"
 local notify = require("python_import.notify").notify
 
 local M = {}
 
----@param winnr integer
+---@class PythonImport.ImportCount
+---@field statement string
+---@field count integer
+---@field kind "import"|"from"|"as"?
+---@field module string?
+---@field path string|vim.NIL? a file with the import, as an example
+---@field line integer|vim.NIL? 1-based line of the import in `path`
+---@field partial boolean? the search stopped early (`count.limit` or `count.max_time`)
+---@field score number? the weighted count it's ranked by (`count.rank_by_proximity` or `count.rank_by_recency`)
+
 ---@param word string
----@param ts_node TSNode?
----@return string[]?
-local function get_import(winnr, word, ts_node)
-  winnr = winnr or vim.api.nvim_get_current_win()
-  local bufnr = vim.api.nvim_win_get_buf(winnr)
+---@param stats table? `{ seconds = { stage = seconds }, counts = { name = count } }`
+local function notify_stats(word, stats)
+  if type(stats) ~= "table" then
+    return
+  end
 
-  if word == nil then
+  local lines = { ("python-import count %s"):format(word) }
+  for stage, seconds in pairs(stats.seconds or {}) do
+    table.insert(lines, ("%s: %.1f ms"):format(stage, seconds * 1000))
+  end
+  for name, count in pairs(stats.counts or {}) do
+    table.insert(lines, ("%s: %d"):format(name, count))
+  end
+  notify(lines, "info", { title = "python-import stats" })
+end
+
+---The file to rank the statements near, with `count.rank_by_proximity`.
+---@param bufnr integer
+---@return string?
+local function get_near_file(bufnr)
+  if not config.opts.count.rank_by_proximity then
+    return nil
+  end
+  local file_path = vim.api.nvim_buf_get_name(bufnr)
+  if file_path == "" then
+    return nil
+  end
+  return file_path
+end
+
+---@param project_root string
+---@param word string
+---@param bufnr integer
+---@return table params of the server's `count`
+local function get_count_params(project_root, word, bufnr)
+  local max_time = config.opts.count.max_time
+  return {
+    project_root = project_root,
+    module_name = word,
+    limit = config.opts.count.limit,
+    max_time = max_time and max_time / 1000,
+    near = get_near_file(bufnr),
+    recency = config.opts.count.rank_by_recency,
+  }
+end
+
+---@param project_root string
+---@param word string
+---@param bufnr integer
+---@return string[]
+local function get_count_cmd(project_root, word, bufnr)
+  local cmd = { "python-import", "count", project_root, word, "--format", "jsonl" }
+  if config.opts.count.limit ~= nil then
+    vim.list_extend(cmd, { "--limit", tostring(config.opts.count.limit) })
+  end
+  if config.opts.count.max_time ~= nil then
+    vim.list_extend(cmd, { "--max-time", config.opts.count.max_time .. "ms" })
+  end
+  local near = get_near_file(bufnr)
+  if near ~= nil then
+    vim.list_extend(cmd, { "--near", near })
+  end
+  if config.opts.count.rank_by_recency ~= nil then
+    vim.list_extend(cmd, { "--recency", config.opts.count.rank_by_recency })
+  end
+  if config.opts.stats then
+    table.insert(cmd, "--stats")
+  end
+  return cmd
+end
+
+---@param word string
+---@param response vim.SystemCompleted
+---@return PythonImport.ImportCount[]?
+local function decode_count_response(word, response)
+  if response.code ~= 0 then
     return nil
   end
+  if config.opts.stats then
+    -- the stats are the last line
+    local stderr_lines = vim.split(response.stderr, "\n", { trimempty = true })
+    local ok, stats = pcall(vim.json.decode, stderr_lines[#stderr_lines] or "")
+    if ok then
+      notify_stats(word, stats)
+    end
+  end
+
+  -- e.g. {"statement":"import numpy as np","count":4,"kind":"as","module":"numpy","path":"/a.py","line":3}
+  local lines = vim.split(response.stdout, "\n", { trimempty = true })
+  return vim.json.decode("[" .. table.concat(lines, ",") .. "]")
+end
+
+---Count the import statements of the word in the project, in descending order of count (or score, if ranked).
+---@param project_root string
+---@param word string
+---@param bufnr integer the buffer to look up for, to rank the statements near it.
+---@return PythonImport.ImportCount[]?
+local function count_imports(project_root, word, bufnr)
+  if config.opts.server.enabled then
+    local result = server.request("count", get_count_params(project_root, word, bufnr))
+    if result ~= nil then
+      if config.opts.stats then
+        notify_stats(word, server.request "stats")
+      end
+      return result
+    end
+    -- server not available. Fall back to the cli.
+  end
+
+  local response = vim.system(get_count_cmd(project_root, word, bufnr), { text = true }):wait()
+  return decode_count_response(word, response)
+end
+
+---Same as `count_imports`, but it runs in the background and calls `callback` with the result on the main loop.
+---@param project_root string
+---@param word string
+---@param bufnr integer
+---@param callback fun(import_counts: PythonImport.ImportCount[]?)
+---@return fun() cancel stop the lookup. The callback is not called after this.
+local function count_imports_async(project_root, word, bufnr, callback)
+  local cancelled = false
+  local function noop() end
+  local cancel_current = noop
+
+  local function count_with_cli()
+    local ok, process = pcall(
+      vim.system,
+      get_count_cmd(project_root, word, bufnr),
+      { text = true },
+      vim.schedule_wrap(function(response)
+        if not cancelled then
+          callback(decode_count_response(word, response))
+        end
+      end)
+    )
+    if not ok then
+      callback(nil)
+      return
+    end
+    cancel_current = function()
+      process:kill "sigterm"
+    end
+  end
+
+  if config.opts.server.enabled then
+    local cancel_request = server.request_async("count", get_count_params(project_root, word, bufnr), function(result)
+      if cancelled then
+        return
+      end
+      if result == nil then
+        -- server not available. Fall back to the cli.
+        count_with_cli()
+        return
+      end
+      if config.opts.stats then
+        server.request_async("stats", nil, function(stats)
+          notify_stats(word, stats)
+        end)
+      end
+      callback(result)
+    end)
+    -- The callback may have already started the cli.
+    if cancel_current == noop then
+      cancel_current = cancel_request
+    end
+  else
+    count_with_cli()
+  end
+
+  return function()
+    cancelled = true
+    cancel_current()
+  end
+end
+
+---@param response vim.SystemCompleted
+---@return string[]? statements found in the index of the python environment.
+local function decode_lookup_response(response)
+  if response.code ~= 0 or response.stdout == nil or response.stdout == "" then
+    return nil
+  end
+  local ok, result = pcall(vim.json.decode, response.stdout)
+  if not ok or result.source ~= "env" then
+    -- The pre-defined tables are already looked up in lua.
+    return nil
+  end
+  return result.statements
+end
+
+---Find the word in the index of the python environment (stdlib and site-packages). See `python-import index-env`.
+---@param word string
+---@return string[]?
+local function lookup_env(word)
+  if config.opts.server.enabled then
+    local result = server.request("lookup", { module_names = { word } })
+    if result ~= nil then
+      return result[1].source == "env" and result[1].statements or nil
+    end
+    -- server not available. Fall back to the cli.
+  end
 
+  local response = vim.system({ "python-import", "lookup", "get", word }, { text = true }):wait()
+  return decode_lookup_response(response)
+end
+
+---Same as `lookup_env`, but it runs in the background and calls `callback` with the result on the main loop.
+---@param word string
+---@param callback fun(import_statements: string[]?)
+---@return fun() cancel stop the lookup. The callback is not called after this.
+local function lookup_env_async(word, callback)
+  local cancelled = false
+  local function noop() end
+  local cancel_current = noop
+
+  local function lookup_with_cli()
+    local ok, process = pcall(
+      vim.system,
+      { "python-import", "lookup", "get", word },
+      { text = true },
+      vim.schedule_wrap(function(response)
+        if not cancelled then
+          callback(decode_lookup_response(response))
+        end
+      end)
+    )
+    if not ok then
+      callback(nil)
+      return
+    end
+    cancel_current = function()
+      process:kill "sigterm"
+    end
+  end
+
+  if config.opts.server.enabled then
+    local cancel_request = server.request_async("lookup", { module_names = { word } }, function(result)
+      if cancelled then
+        return
+      end
+      if result == nil then
+        -- server not available. Fall back to the cli.
+        lookup_with_cli()
+        return
+      end
+      callback(result[1].source == "env" and result[1].statements or nil)
+    end)
+    -- The callback may have already started the cli.
+    if cancel_current == noop then
+      cancel_current = cancel_request
+    end
+  else
+    lookup_with_cli()
+  end
+
+  return function()
+    cancelled = true
+    cancel_current()
+  end
+end
+
+---Count the import statements of many words in the project with a single `python-import` run.
+---@param project_root string
+---@param words string[]
+---@return table<string, PythonImport.ImportCount[]>? word to import counts, in descending order of count.
+local function count_imports_many(project_root, words)
+  local result
+  if config.opts.server.enabled then
+    result = server.request("count_many", { project_root = project_root, module_names = words })
+    -- nil: server not available. Fall back to the cli.
+  end
+
+  if result == nil then
+    local cmd = { "python-import", "count", project_root, "--stdin" }
+    local response = vim.system(cmd, { text = true, stdin = table.concat(words, "\n") }):wait()
+    if response.code ~= 0 then
+      return nil
+    end
+
+    -- e.g. {"module_name":"np","imports":[{"statement":"import numpy as np","count":4}]}
+    result = {}
+    for _, line in ipairs(vim.split(response.stdout, "\n", { trimempty = true })) do
+      table.insert(result, vim.json.decode(line))
+    end
+  end
+
+  local word_to_import_counts = {}
+  for _, v in ipairs(result) do
+    word_to_import_counts[v.module_name] = v.imports
+  end
+  return word_to_import_counts
+end
+
+---Find the import statements from the custom function and the pre-defined lookup tables, without the project.
+---@param winnr integer
+---@param word string
+---@param ts_node TSNode?
+---@return string[]?
+local function get_import_predefined(winnr, word, ts_node)
   if ts_node ~= nil then
     -- check if currently on
     -- class Data(torch.utils.data.Dataset):
@@ -75,52 +373,68 @@ local function get_import(winnr, word, ts_node)
   if lookup_table.import_from[word] ~= nil then
     return { "from " .. lookup_table.import_from[word] .. " import " .. word }
   end
+end
+
+---@param import_count PythonImport.ImportCount
+---@return string e.g. count 4: import numpy as np (e.g. src/a.py:3)
+local function format_import_count(import_count)
+  local text = string.format("count %d: %s", import_count.count, import_count.statement)
+  if type(import_count.path) == "string" and type(import_count.line) == "number" then
+    text = ("%s (e.g. %s:%d)"):format(text, vim.fn.fnamemodify(import_count.path, ":~:."), import_count.line)
+  end
+  return text
+end
+
+---@param winnr integer
+---@param word string
+---@param ts_node TSNode?
+---@return string[]?
+local function get_import(winnr, word, ts_node)
+  winnr = winnr or vim.api.nvim_get_current_win()
+  local bufnr = vim.api.nvim_win_get_buf(winnr)
+
+  if word == nil then
+    return nil
+  end
+
+  local import_statements = get_import_predefined(winnr, word, ts_node)
+  if import_statements ~= nil then
+    return import_statements
+  end
 
   -- Can't find from pre-defined tables.
   -- Search the project directory for the import statements
   -- Sorted from the most frequently used
-  -- e.g. 00020:import ABCD
 
   local requirements_installed = health.is_python_cli_installed()
 
   if requirements_installed then
     local project_root = vim.fs.root(bufnr, { ".git", "pyproject.toml" })
     if project_root ~= nil then
-      local response = vim.system({ "python-import", "count", project_root, word }, { text = true }):wait()
-      if response.code == 0 then
-        local find_import_outputs = response.stdout:gsub("\n$", "")
-
-        -- strip
-        find_import_outputs = find_import_outputs:gsub("^\n", "")
-        -- find_import_outputs = find_import_outputs:match "^%s*(.*)%s*$"
-        -- strip trailing newline
-        find_import_outputs = find_import_outputs:gsub("\n$", "")
-        -- find_import_outputs = find_import_outputs:match "^%s*(.*)%s*$"
-
-        if find_import_outputs ~= "" then
-          local find_import_outputs_split = vim.split(find_import_outputs, "\n")
-          -- print(#find_import_outputs_split)
-          if #find_import_outputs_split == 1 then
-            local import_statement = { find_import_outputs_split[1]:sub(7) } -- remove the count
-            return import_statement
-          end
-
-          local outputs_to_inputlist = {}
-          for i, v in ipairs(find_import_outputs_split) do
-            local count = tonumber(v:sub(1, 5))
-            local import_statement = v:sub(7) -- remove the count
-
-            outputs_to_inputlist[i] = string.format("%d. count %d: %s", i, count, import_statement)
-          end
-
-          local choice = vim.fn.inputlist(outputs_to_inputlist)
-          if choice == 0 then
-            return nil
-          end
-
-          local import_statement = find_import_outputs_split[choice]:sub(7) -- remove the count
-          return { import_statement }
+      local import_counts = count_imports(project_root, word, bufnr)
+      if import_counts ~= nil and #import_counts > 0 then
+        if #import_counts == 1 then
+          return { import_counts[1].statement }
         end
+
+        local outputs_to_inputlist = {}
+        for i, v in ipairs(import_counts) do
+          outputs_to_inputlist[i] = string.format("%d. %s", i, format_import_count(v))
+        end
+
+        local choice = vim.fn.inputlist(outputs_to_inputlist)
+        if import_counts[choice] == nil then
+          return nil
+        end
+
+        return { import_counts[choice].statement }
+      end
+    end
+
+    if config.opts.index_env then
+      import_statements = lookup_env(word)
+      if import_statements ~= nil then
+        return import_statements
       end
     end
   end
@@ -139,6 +453,129 @@ local function get_import(winnr, word, ts_node)
   return { "import " .. word }
 end
 
+---Same as `get_import`, but the project lookup and the pyright completion run in the background,
+---so the editor stays responsive. `callback` gets the import statements on the main loop.
+---@param winnr integer
+---@param word string
+---@param ts_node TSNode?
+---@param callback fun(import_statements: string[]?)
+---@return fun() cancel stop the lookup. The callback is not called after this.
+local function get_import_async(winnr, word, ts_node, callback)
+  local bufnr = vim.api.nvim_win_get_buf(winnr)
+  local cancelled = false
+  -- Once the user is choosing from the results, moving the cursor doesn't cancel it.
+  local choosing = false
+  local function noop() end
+  local cancel_current = noop
+  local function cancel()
+    if not choosing then
+      cancelled = true
+      cancel_current()
+    end
+  end
+
+  local import_statements = get_import_predefined(winnr, word, ts_node)
+  if import_statements ~= nil then
+    callback(import_statements)
+    return cancel
+  end
+
+  -- Last resort: use pyright LSP completion.
+  local function import_with_pyright()
+    local prev_buf_str = utils.notify_diff_pre(bufnr)
+    cancel_current = pyright.import_async(winnr, function(import_status)
+      if cancelled then
+        return
+      end
+      if import_status == pyright.ImportStatus.RESOLVED_IMPORT then
+        utils.notify_diff(bufnr, prev_buf_str, "python-import: pyright")
+        callback {} -- no further adding lines to buffer needed
+      elseif import_status == pyright.ImportStatus.USER_ABORT then
+        callback {} -- no further adding lines to buffer needed
+      else
+        callback { "import " .. word }
+      end
+    end)
+  end
+
+  -- Not found in the project. Try the index of the python environment, then pyright.
+  local function import_with_env_index()
+    if not config.opts.index_env then
+      import_with_pyright()
+      return
+    end
+    cancel_current = noop
+    local cancel_lookup = lookup_env_async(word, function(env_import_statements)
+      if cancelled then
+        return
+      end
+      if env_import_statements ~= nil then
+        callback(env_import_statements)
+      else
+        import_with_pyright()
+      end
+    end)
+    -- The callback may have already moved on to pyright.
+    if cancel_current == noop then
+      cancel_current = cancel_lookup
+    end
+  end
+
+  if not health.is_python_cli_installed() then
+    import_with_pyright()
+    return cancel
+  end
+  local project_root = vim.fs.root(bufnr, { ".git", "pyproject.toml" })
+  if project_root == nil then
+    import_with_env_index()
+    return cancel
+  end
+
+  local cancel_count = count_imports_async(project_root, word, bufnr, function(import_counts)
+    if import_counts == nil or #import_counts == 0 then
+      import_with_env_index()
+      return
+    end
+    if #import_counts == 1 then
+      callback { import_counts[1].statement }
+      return
+    end
+
+    choosing = true
+    vim.ui.select(import_counts, {
+      prompt = "Import " .. word,
+      format_item = format_import_count,
+    }, function(import_count)
+      callback(import_count and { import_count.statement })
+    end)
+  end)
+  -- The callback may have already moved on to pyright.
+  if cancel_current == noop then
+    cancel_current = cancel_count
+  end
+  return cancel
+end
+
+---@param bufnr integer
+---@param import_statements string[]
+---@return integer line_number where the statements are inserted
+local function insert_import_statements(bufnr, import_statements)
+  -- prefer to add after last import
+  local line_number = utils.find_line_last_import(bufnr)
+  if line_number == nil then
+    -- if no import, add to first empty line
+    line_number = utils.find_line_after_module_docstring(bufnr)
+    if line_number == nil then
+      line_number = 1
+    end
+  else
+    line_number = line_number + 1 -- add after last import
+  end
+
+  vim.api.nvim_buf_set_lines(bufnr, line_number - 1, line_number - 1, false, import_statements)
+  return line_number
+end
+
 ---@param winnr integer
 ---@param word string
 ---@param ts_node TSNode?
@@ -170,21 +607,106 @@ local function add_import(winnr, word, ts_node)
     return nil, nil
   end
 
-  -- prefer to add after last import
-  local line_number = utils.find_line_last_import(bufnr)
-  if line_number == nil then
-    -- if no import, add to first empty line
-    line_number = utils.find_line_after_module_docstring(bufnr)
-    if line_number == nil then
-      line_number = 1
+  return insert_import_statements(bufnr, import_statements), import_statements
+end
+
+---Same as `add_import`, but the lookup runs in the background. See `get_import_async`.
+---@param winnr integer
+---@param word string
+---@param ts_node TSNode?
+---@param callback fun(line_number: integer?, import_statements: string[]?)
+---@return fun() cancel
+local function add_import_async(winnr, word, ts_node, callback)
+  local bufnr = vim.api.nvim_win_get_buf(winnr)
+
+  -- strip
+  word = word:match "^%s*(.*)%s*$"
+  if word == "" or lookup_table.ban_from_import[word] then
+    callback(nil, nil)
+    return function() end
+  end
+
+  return get_import_async(winnr, word, ts_node, function(import_statements)
+    if import_statements == nil then
+      notify("No import statement found or it was aborted, for `" .. word .. "`", "warn", {
+        title = "Python auto import",
+        on_open = function(win)
+          local buf = vim.api.nvim_win_get_buf(win)
+          vim.bo[buf].filetype = "markdown"
+        end,
+      })
+      callback(nil, nil)
+    elseif #import_statements == 0 or not vim.api.nvim_buf_is_valid(bufnr) then
+      callback(nil, nil)
+    else
+      callback(insert_import_statements(bufnr, import_statements), import_statements)
+    end
+  end)
+end
+
+---Names that the LSP / linter diagnostics report as undefined, without duplicates.
+---@param bufnr integer
+---@return string[]
+local function get_undefined_names(bufnr)
+  local names = {}
+  local seen = {}
+  for _, diagnostic in ipairs(vim.diagnostic.get(bufnr)) do
+    -- pyright/basedpyright: "np" is not defined
+    -- ruff: Undefined name `np`
+    local message = diagnostic.message
+    local name = message:match '^"([%w_]+)" is not defined' or message:match "^Undefined name `([%w_]+)`"
+    if name ~= nil and not seen[name] and not lookup_table.ban_from_import[name] then
+      seen[name] = true
+      table.insert(names, name)
     end
-  else
-    line_number = line_number + 1 -- add after last import
   end
+  return names
+end
 
-  vim.api.nvim_buf_set_lines(bufnr, line_number - 1, line_number - 1, false, import_statements)
+---Add the imports of all undefined names in the buffer at once.
+---The names not in the lookup tables are counted in the project with a single `python-import` run,
+---and the most used import statement is chosen for each. The names not found anywhere are left alone.
+---@param winnr integer?
+---@return integer? line_number
+---@return string[] import_statements
+---@return string[] not_found_names
+local function add_imports_undefined(winnr)
+  winnr = winnr or vim.api.nvim_get_current_win()
+  local bufnr = vim.api.nvim_win_get_buf(winnr)
+
+  local import_statements = {}
+  local not_found_names = {}
+  local project_words = {}
+  for _, name in ipairs(get_undefined_names(bufnr)) do
+    local statements = get_import_predefined(winnr, name, nil)
+    if statements ~= nil then
+      vim.list_extend(import_statements, statements)
+    else
+      table.insert(project_words, name)
+    end
+  end
+
+  if #project_words > 0 then
+    local word_to_import_counts
+    local project_root = vim.fs.root(bufnr, { ".git", "pyproject.toml" })
+    if project_root ~= nil and health.is_python_cli_installed() then
+      word_to_import_counts = count_imports_many(project_root, project_words)
+    end
 
-  return line_number, import_statements
+    for _, word in ipairs(project_words) do
+      local import_counts = word_to_import_counts and word_to_import_counts[word] or {}
+      if #import_counts > 0 then
+        table.insert(import_statements, import_counts[1].statement)
+      else
+        table.insert(not_found_names, word)
+      end
+    end
+  end
+
+  if #import_statements == 0 then
+    return nil, import_statements, not_found_names
+  end
+  return insert_import_statements(bufnr, import_statements), import_statements, not_found_names
 end
 
 ---@param winnr integer?
@@ -253,6 +775,79 @@ M.add_import_current_word_and_notify = function(winnr)
   end
 end
 
+---@type fun()?
+local cancel_pending_lookup = nil
+
+-- vim.keymap.set({ "n", "i" }, "<M-CR>",
+-- , { silent = true, desc = "Add python import" })
+---Same as `add_import_current_word_and_notify`, but it doesn't block the editor while searching the project.
+---The lookup is cancelled if the cursor moves, the buffer is left, or another lookup starts.
+---@param winnr integer?
+M.add_import_current_word_and_notify_async = function(winnr)
+  winnr = winnr or vim.api.nvim_get_current_win()
+  local bufnr = vim.api.nvim_win_get_buf(winnr)
+  local word = utils.get_current_word(winnr)
+  local node = ts_utils.get_node_at_cursor(winnr)
+  local cursor = vim.api.nvim_win_get_cursor(winnr)
+
+  if cancel_pending_lookup ~= nil then
+    cancel_pending_lookup()
+  end
+  local augroup = vim.api.nvim_create_augroup("python_import_pending_lookup", { clear = true })
+
+  ---@type fun()?
+  local cancel_this_lookup = nil
+  local function stop_waiting()
+    -- The autocmds may be of a newer lookup already.
+    if cancel_pending_lookup == cancel_this_lookup then
+      cancel_pending_lookup = nil
+      vim.api.nvim_clear_autocmds { group = augroup }
+    end
+  end
+
+  local finished = false
+  local cancel = add_import_async(winnr, word, node, function(line_number, import_statements)
+    finished = true
+    stop_waiting()
+    if line_number ~= nil then
+      notify(import_statements, "info", {
+        title = "Python import added at line " .. line_number,
+        on_open = function(win)
+          local buf = vim.api.nvim_win_get_buf(win)
+          vim.bo[buf].filetype = "python"
+        end,
+      })
+    end
+  end)
+  if finished then
+    -- found without searching the project
+    return
+  end
+
+  cancel_this_lookup = function()
+    stop_waiting()
+    cancel()
+  end
+  cancel_pending_lookup = cancel_this_lookup
+  vim.api.nvim_create_autocmd({ "CursorMoved", "CursorMovedI" }, {
+    group = augroup,
+    buffer = bufnr,
+    callback = function()
+      local new_cursor = vim.api.nvim_win_get_cursor(0)
+      if new_cursor[1] ~= cursor[1] or new_cursor[2] ~= cursor[2] then
+        cancel_this_lookup()
+      end
+    end,
+  })
+  vim.api.nvim_create_autocmd("BufLeave", {
+    group = augroup,
+    buffer = bufnr,
+    callback = function()
+      cancel_this_lookup()
+    end,
+  })
+end
+
 -- vim.keymap.set("x", "<M-CR>",
 -- , { silent = true, desc = "Add python import" })
 ---@param winnr integer?
@@ -271,6 +866,98 @@ M.add_import_current_selection_and_notify = function(winnr)
   end
 end
 
+-- vim.keymap.set({ "n" }, "<space>I",
+-- , { silent = true, desc = "Add python imports of all undefined names" })
+---@param winnr integer?
+M.add_imports_undefined_and_notify = function(winnr)
+  winnr = winnr or vim.api.nvim_get_current_win()
+
+  local line_number, import_statements, not_found_names = add_imports_undefined(winnr)
+  if line_number ~= nil then
+    notify(import_statements, "info", {
+      title = "Python imports added at line " .. line_number,
+      on_open = function(win)
+        local buf = vim.api.nvim_win_get_buf(win)
+        vim.bo[buf].filetype = "python"
+      end,
+    })
+  end
+  if #not_found_names > 0 then
+    notify("No import statement found for " .. table.concat(not_found_names, ", "), "warn", {
+      title = "Python auto import",
+    })
+  end
+end
+
+---Compile the lookup tables (with the user's extension) for the python cli and server,
+---so that they find the well-known names (e.g. `np`) without searching the project.
+---The tables are only defined here in lua, and sent to `python-import lookup compile`.
+---@param callback fun(success: boolean)?
+M.compile_lookup_table = function(callback)
+  if not health.is_python_cli_installed() then
+    if callback ~= nil then
+      callback(false)
+    end
+    return
+  end
+  local tables = vim.json.encode {
+    import = lookup_table.import,
+    import_as = lookup_table.import_as,
+    import_from = lookup_table.import_from,
+    statement_after_imports = lookup_table.statement_after_imports,
+  }
+  local ok = pcall(
+    vim.system,
+    { "python-import", "lookup", "compile" },
+    { stdin = tables, text = true },
+    function(obj)
+      if callback ~= nil then
+        callback(obj.code == 0)
+      end
+    end
+  )
+  if not ok and callback ~= nil then
+    callback(false)
+  end
+end
+
+local lookup_table_compiled = false
+
+---@type table<string, boolean>
+local warmed_up_project_roots = {}
+
+---Prepare the project of the buffer for the first lookup, in the background:
+---build (or update) the index of the project, and start the server if enabled.
+---Only the first call for each project does something.
+---The lookup tables are compiled (and the python environment indexed if `index_env`) with the first call.
+---@param bufnr integer?
+M.warm_up = function(bufnr)
+  bufnr = bufnr or vim.api.nvim_get_current_buf()
+  local project_root = vim.fs.root(bufnr, { ".git", "pyproject.toml" })
+  if project_root == nil or warmed_up_project_roots[project_root] then
+    return
+  end
+  warmed_up_project_roots[project_root] = true
+
+  if not health.is_python_cli_installed() then
+    return
+  end
+  if not lookup_table_compiled then
+    lookup_table_compiled = true
+    M.compile_lookup_table()
+    if config.opts.index_env then
+      pcall(vim.system, { "python-import", "index-env" }, { text = true }, function() end)
+    end
+  end
+  if config.opts.server.enabled then
+    server.start()
+  end
+  -- The update holds the lock of the index only to commit a small batch of files.
+  -- A lookup that finds the index locked for longer searches the project instead of waiting.
+  -- A missing index is built in a temporary file, and used once it's complete.
+  pcall(vim.system, { "python-import", "index", "update", project_root }, { text = true }, function() end)
+end
+
 -- vim.keymap.set({ "n" }, "<space>tr",
 -- , { silent = true, desc = "Add rich traceback install" })
 ---@param winnr integer?
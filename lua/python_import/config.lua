@@ -26,6 +26,47 @@ M.default_opts = {
     },
   },
 
+  ---Keep a `python-import serve` process running and send the project lookups to it,
+  ---instead of starting a new `python-import` process for every lookup.
+  server = {
+    enabled = false,
+    ---Milliseconds to wait for a response before falling back to the `python-import` cli.
+    ---@type integer
+    timeout = 5000,
+  },
+
+  ---Searching the project for a common word can take long on a large project.
+  count = {
+    ---Show at most this many import statements found in the project. nil: no limit.
+    ---The search stops once the top statements stay the same for a while.
+    ---@type integer?
+    limit = nil,
+    ---Milliseconds to search the project for. The best statements found until then are shown. nil: no limit.
+    ---@type integer?
+    max_time = nil,
+    ---Rank the statements used in the directories near the current file higher, instead of by count alone.
+    ---@type boolean
+    rank_by_proximity = false,
+    ---Also rank the statements used in recently changed files higher,
+    ---by the file's modification time ("mtime") or last commit ("git"). nil: don't.
+    ---@type "mtime"|"git"|nil
+    rank_by_recency = nil,
+  },
+
+  ---When the first Python buffer of a project is opened, build (or update) the project's index
+  ---with `python-import index update` in the background, and start the server if enabled.
+  ---The first lookup then doesn't have to search the whole project.
+  warm_up = false,
+
+  ---When a name is not imported anywhere in the project, look it up in the index of the python environment
+  ---(stdlib and site-packages of `python3` in PATH) before asking pyright.
+  ---The index is built with `python-import index-env` on `warm_up`.
+  index_env = false,
+
+  ---Notify the time spent and the work done in each stage of the project lookup (ripgrep, parsing, ...).
+  ---Useful to find out why a lookup is slow.
+  stats = false,
+
   ---Return nil to indicate no match is found and continue with the default lookup
   ---Return a table to stop the lookup and use the returned table as the result
   ---Return an empty table to stop the lookup. This is useful when you want to add to wherever you need to.
@@ -21,12 +21,10 @@ function M.check()
     vim.health.error "Neovim >= 0.10.0 is required"
   end
 
-  for _, cmd in ipairs { "rg" } do
-    if vim.fn.executable(cmd) == 1 then
-      vim.health.ok(("`%s` is installed"):format(cmd))
-    else
-      vim.health.error(("`%s` is not installed"):format(cmd))
-    end
+  if vim.fn.executable "rg" == 1 then
+    vim.health.ok "`rg` is installed"
+  else
+    vim.health.warn "`rg` is not installed. python-import falls back to its built-in search, which is slower."
   end
 
   local cmd = "python-import"
@@ -67,13 +65,8 @@ end
 
 ---@return boolean
 function M.is_python_cli_installed()
-  for _, cmd in ipairs { "rg", "python-import" } do
-    if vim.fn.executable(cmd) ~= 1 then
-      return false
-    end
-  end
-
-  return true
+  -- rg is optional. Without it, python-import uses its built-in search.
+  return vim.fn.executable "python-import" == 1
 end
 
 return M
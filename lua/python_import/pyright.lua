@@ -202,8 +202,9 @@ local lsp_completion_handler = function(server, result, unresolved_import, bufnr
 end
 
 ---@param diagnostic vim.Diagnostic
----@return python_import.pyright.ImportStatus
-local lsp_completion = function(diagnostic)
+---@param callback fun(status: python_import.pyright.ImportStatus)
+---@return fun() cancel cancel the completion request. The callback is not called after this.
+local lsp_completion_async = function(diagnostic, callback)
   local unresolved_import = vim.api.nvim_buf_get_text(
     diagnostic.bufnr,
     diagnostic.lnum,
@@ -214,24 +215,41 @@ local lsp_completion = function(diagnostic)
   )
   if vim.tbl_isempty(unresolved_import) then
     -- vim.notify "cannot find diagnostic symbol"
-    return M.ImportStatus.NO_IMPORT
+    callback(M.ImportStatus.NO_IMPORT)
+    return function() end
   end
   local server = M.get_server(diagnostic)
   if server == nil then
     -- vim.notify "cannot find server implemantion for lsp import"
-    return M.ImportStatus.ERROR
+    callback(M.ImportStatus.ERROR)
+    return function() end
   end
   local params = {
     textDocument = vim.lsp.util.make_text_document_params(0),
     position = { line = diagnostic.lnum, character = diagnostic.end_col },
   }
 
+  local cancelled = false
+  local _, cancel_request = vim.lsp.buf_request(diagnostic.bufnr, "textDocument/completion", params, function(_, result)
+    if not cancelled then
+      callback(lsp_completion_handler(server, result, unresolved_import[1], diagnostic.bufnr))
+    end
+  end)
+
+  return function()
+    cancelled = true
+    cancel_request()
+  end
+end
+
+---@param diagnostic vim.Diagnostic
+---@return python_import.pyright.ImportStatus
+local lsp_completion = function(diagnostic)
   -- Wait for the completion to finish so it can return the status.
-  -- TODO: I think it can be implemented with coroutine.
   local resolved
   local async_finished = false
-  vim.lsp.buf_request(diagnostic.bufnr, "textDocument/completion", params, function(_, result)
-    resolved = lsp_completion_handler(server, result, unresolved_import[1], diagnostic.bufnr)
+  lsp_completion_async(diagnostic, function(status)
+    resolved = status
     async_finished = true
   end)
 
@@ -270,4 +288,20 @@ M.import = function(winnr)
   return lsp_completion(diagnostic or diagnostics[1])
 end
 
+---Same as `M.import`, but it doesn't wait for the completion.
+---@param winnr integer?
+---@param callback fun(status: python_import.pyright.ImportStatus)
+---@return fun() cancel cancel the completion request. The callback is not called after this.
+M.import_async = function(winnr, callback)
+  winnr = winnr or vim.api.nvim_get_current_win()
+
+  local diagnostics = get_unresolved_import_errors(winnr)
+  if vim.tbl_isempty(diagnostics) then
+    callback(M.ImportStatus.NO_IMPORT)
+    return function() end
+  end
+  local diagnostic = get_diagnostic_under_cursor(winnr, diagnostics)
+  return lsp_completion_async(diagnostic or diagnostics[1], callback)
+end
+
 return M
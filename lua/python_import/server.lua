@@ -0,0 +1,174 @@
+-- Client of `python-import serve`.
+-- It keeps one server process running so that each lookup doesn't pay for the Python start-up,
+-- and the server keeps the tree-sitter parser and the project indices in memory.
+local config = require "python_import.config"
+
+local M = {}
+
+---@type integer?
+local job_id = nil
+local next_request_id = 1
+---The responses of the requests waited for by `M.request`. Only these are kept.
+---@type table<integer, table|false>
+local responses = {}
+---The callbacks of the requests sent by `M.request_async`, removed once called.
+---@type table<integer, fun(response: table?)>
+local callbacks = {}
+local stdout_partial_line = ""
+
+---@param response table
+local function on_response(response)
+  local callback = callbacks[response.id]
+  if callback ~= nil then
+    callbacks[response.id] = nil
+    vim.schedule(function()
+      callback(response)
+    end)
+  elseif responses[response.id] == false then
+    responses[response.id] = response
+  end
+  -- Otherwise nobody waits for it anymore (timed out).
+end
+
+---@param data string[]
+local function on_stdout(_, data, _)
+  -- The first item continues the last partial line, and the last item is a partial line (or "").
+  data[1] = stdout_partial_line .. data[1]
+  stdout_partial_line = data[#data]
+  for i = 1, #data - 1 do
+    if data[i] ~= "" then
+      local ok, response = pcall(vim.json.decode, data[i])
+      if ok and type(response) == "table" and response.id ~= nil then
+        on_response(response)
+      end
+    end
+  end
+end
+
+local function on_exit()
+  job_id = nil
+  stdout_partial_line = ""
+  -- No response will come for the pending requests.
+  local pending_callbacks = callbacks
+  callbacks = {}
+  vim.schedule(function()
+    for _, callback in pairs(pending_callbacks) do
+      callback(nil)
+    end
+  end)
+end
+
+---Start the server if it's not running.
+---@return integer? job_id nil if it failed to start
+function M.start()
+  if job_id ~= nil then
+    return job_id
+  end
+
+  local cmd = { "python-import", "serve" }
+  if config.opts.stats then
+    table.insert(cmd, "--stats")
+  end
+  local id = vim.fn.jobstart(cmd, {
+    on_stdout = on_stdout,
+    on_exit = on_exit,
+  })
+  if id <= 0 then
+    return nil
+  end
+  job_id = id
+  return job_id
+end
+
+function M.stop()
+  if job_id ~= nil then
+    vim.fn.jobstop(job_id)
+  end
+end
+
+---@return boolean
+function M.is_running()
+  return job_id ~= nil
+end
+
+---Send a JSON-RPC request.
+---@param method string
+---@param params table?
+---@return integer? request_id nil if the server is not available.
+local function send(method, params)
+  local id = M.start()
+  if id == nil then
+    return nil
+  end
+
+  local request_id = next_request_id
+  next_request_id = next_request_id + 1
+  vim.fn.chansend(
+    id,
+    vim.json.encode { jsonrpc = "2.0", id = request_id, method = method, params = params or {} } .. "\n"
+  )
+  return request_id
+end
+
+---@param response table?
+---@return any? result nil if there is no response or it is an error.
+local function get_result(response)
+  if response == nil or response.error ~= nil then
+    return nil
+  end
+  return response.result
+end
+
+---Send a JSON-RPC request and wait for the response.
+---@param method string
+---@param params table?
+---@return any? result nil if the server is not available, timed out or returned an error.
+function M.request(method, params)
+  local request_id = send(method, params)
+  if request_id == nil then
+    return nil
+  end
+  responses[request_id] = false
+
+  vim.wait(config.opts.server.timeout, function()
+    return responses[request_id] ~= false
+  end, 5)
+
+  local response = responses[request_id] or nil
+  responses[request_id] = nil
+  return get_result(response)
+end
+
+---Send a JSON-RPC request without waiting. `callback` is called with the result on the main loop.
+---@param method string
+---@param params table?
+---@param callback fun(result: any?) result is nil if the server is not available, timed out or returned an error.
+---@return fun() cancel ignore the response. The callback is not called after this.
+function M.request_async(method, params, callback)
+  local request_id = send(method, params)
+  if request_id == nil then
+    callback(nil)
+    return function() end
+  end
+
+  local function ignore_response() end
+  callbacks[request_id] = function(response)
+    callback(get_result(response))
+  end
+  vim.defer_fn(function()
+    local pending_callback = callbacks[request_id]
+    if pending_callback ~= nil and pending_callback ~= ignore_response then
+      -- The late response is dropped.
+      callbacks[request_id] = ignore_response
+      callback(nil)
+    end
+  end, config.opts.server.timeout)
+
+  return function()
+    if callbacks[request_id] ~= nil then
+      callbacks[request_id] = ignore_response
+    end
+  end
+end
+
+return M
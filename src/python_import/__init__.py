@@ -1,5 +1,19 @@
 from __future__ import annotations
 
-from ._version import get_version_dict
+from typing import TYPE_CHECKING
 
-__version__ = get_version_dict()["version"]
+if TYPE_CHECKING:
+    from typing import Any
+
+
+def __getattr__(name: str) -> Any:
+    # Computed on first use, as it may take a while (e.g. git describe in a development install).
+    if name == "__version__":
+        from ._version import get_version_dict
+
+        global __version__  # noqa: PLW0603
+        __version__ = get_version_dict()["version"]
+        return __version__
+
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
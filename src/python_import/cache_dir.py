@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+
+def get_cache_dir() -> Path:
+    """
+    Return the directory where python-import stores its caches.
+
+    `$PYTHON_IMPORT_CACHE_DIR` if set, otherwise `$XDG_CACHE_HOME/python-import` (default: `~/.cache/python-import`).
+    """
+    cache_dir = os.environ.get("PYTHON_IMPORT_CACHE_DIR")
+    if cache_dir:
+        return Path(cache_dir)
+
+    xdg_cache_home = os.environ.get("XDG_CACHE_HOME")
+    if xdg_cache_home:
+        return Path(xdg_cache_home) / "python-import"
+    return Path.home() / ".cache" / "python-import"
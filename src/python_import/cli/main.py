@@ -1,23 +1,50 @@
 # ruff: noqa: T201 TC003
 from __future__ import annotations
 
-import json
-import subprocess
-from collections import defaultdict
+import sys
+from contextlib import contextmanager
+from enum import Enum
 from pathlib import Path
+from typing import TYPE_CHECKING, Annotated, Optional
 
-import tree_sitter_python as tspython
 import typer
-from tree_sitter import Language, Parser
 
 import python_import
-from python_import.utils import get_all_imports_in_file_as_absolute
+from python_import.stats import STATS_ENV_VAR
+from python_import.tree_cache import DEFAULT_TREE_CACHE_BYTES
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from tree_sitter import Parser
+
+    from python_import.utils import ImportCount
+
+# The commands import what they need (e.g. tree-sitter, sqlite3, the worker pool) only when they run,
+# so that e.g. `python-import --version` (called by :checkhealth) and `lookup get` start fast.
+# tests/test_cli_startup.py keeps it that way.
+
+
+def _get_parser() -> Parser:
+    import tree_sitter_python as tspython
+    from tree_sitter import Language, Parser
+
+    return Parser(Language(tspython.language()))
 
-PY_LANGUAGE = Language(tspython.language())
 
 app = typer.Typer(
     no_args_is_help=True, context_settings={"help_option_names": ["-h", "--help"]}
 )
+index_app = typer.Typer(
+    no_args_is_help=True,
+    help="Manage the persistent import index of a project.",
+)
+app.add_typer(index_app, name="index")
+lookup_app = typer.Typer(
+    no_args_is_help=True,
+    help="Find the pre-defined import statements of well-known names, without searching the project.",
+)
+app.add_typer(lookup_app, name="lookup")
 
 
 def version_callback(*, value: bool):
@@ -37,10 +64,142 @@ def common(
     pass
 
 
+@contextmanager
+def _print_stats_to_stderr(*, enabled: bool) -> Iterator[None]:
+    if not enabled:
+        yield
+        return
+
+    import json
+
+    from python_import.stats import collect_stats
+
+    with collect_stats() as stats, stats.timer("total"):
+        yield
+    print(json.dumps(stats.to_dict(), separators=(",", ":")), file=sys.stderr)
+
+
+class OutputFormat(str, Enum):
+    text = "text"
+    jsonl = "jsonl"
+
+
+class Recency(str, Enum):
+    mtime = "mtime"
+    git = "git"
+
+
+def _parse_seconds(value: str) -> float:
+    """
+    Parse a duration like 200ms, 1.5s or 2 (seconds) to seconds.
+
+    Examples:
+    >>> _parse_seconds("200ms")
+    0.2
+    >>> _parse_seconds("1.5s")
+    1.5
+    """
+    if value.endswith("ms"):
+        return float(value[:-2]) / 1000
+    return float(value.removesuffix("s"))
+
+
 @app.command()
 def count(
     project_root: Path,
-    module_name: str,
+    module_names: Annotated[
+        Optional[list[str]],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Argument(
+            help="Module names to count the imports of.", show_default=False
+        ),
+    ] = None,
+    *,
+    stdin: Annotated[
+        bool,
+        typer.Option(
+            "--stdin",
+            help="Also read the module names from stdin, separated by whitespace.",
+        ),
+    ] = False,
+    use_index: Annotated[
+        bool,
+        typer.Option(
+            "--index/--no-index",
+            help="Answer from the index if it was built with `python-import index build`.",
+        ),
+    ] = True,
+    update_index: Annotated[
+        bool,
+        typer.Option(
+            "--update-index/--no-update-index",
+            help="Re-parse the files changed since the index was last updated, before answering.",
+        ),
+    ] = True,
+    exclude: Annotated[
+        Optional[list[str]],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Option(
+            "--exclude",
+            help="Skip the files matching this gitignore-style pattern (relative to PROJECT_ROOT), "
+            "on top of the excludes in [tool.python-import] of pyproject.toml. Can be repeated.",
+            show_default=False,
+        ),
+    ] = None,
+    jobs: Annotated[
+        int,
+        typer.Option(
+            "--jobs",
+            "-j",
+            help="Number of processes to parse the files with. 0 means the number of CPUs.",
+        ),
+    ] = 0,
+    stats: Annotated[
+        bool,
+        typer.Option(
+            "--stats",
+            envvar=STATS_ENV_VAR,
+            help="Print the time spent and the work done in each stage to stderr as JSON.",
+        ),
+    ] = False,
+    output_format: Annotated[
+        OutputFormat,
+        typer.Option(
+            "--format",
+            help="Output format of a single module name. jsonl adds the kind, module and an example file:line.",
+        ),
+    ] = OutputFormat.text,
+    limit: Annotated[
+        Optional[int],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Option(
+            "--limit",
+            min=1,
+            help="Print only the top LIMIT statements, and stop searching once they stay the same for a while.",
+            show_default=False,
+        ),
+    ] = None,
+    max_time: Annotated[
+        Optional[float],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Option(
+            "--max-time",
+            parser=_parse_seconds,
+            metavar="DURATION",
+            help="Stop searching after the time (e.g. 200ms, 1.5s) and print the best statements so far.",
+            show_default=False,
+        ),
+    ] = None,
+    near: Annotated[
+        Optional[Path],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Option(
+            help="Rank the statements used in the directories near this file (e.g. the one being edited) higher.",
+            show_default=False,
+        ),
+    ] = None,
+    recency: Annotated[
+        Optional[Recency],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Option(
+            help="Rank the statements used in recently changed files higher, by their mtime or last git commit.",
+            show_default=False,
+        ),
+    ] = None,
 ) -> None:
     """
     Count python imports in a project and print them in descending order of count.
@@ -49,6 +208,29 @@ def count(
     00002:from my_module import logging
     00001:import logging
 
+    With --format jsonl, each statement is printed as json-line instead:
+    {"statement":"from my_module import logging","count":2,"kind":"from","module":"my_module","path":"/a.py","line":3,
+     "partial":false}
+
+    With --limit or --max-time, the search may stop before the end (partial: true),
+    which is also reported to stderr with the text format.
+
+    With --near or --recency, the statements are ranked by their uses weighted by the distance
+    from the file and how recently the files changed, instead of by count. jsonl adds the "score".
+
+    With many names (or --stdin), they are searched with a single ripgrep and each file is parsed once.
+    The result of each name is printed as json-line, in the given order:
+    {"module_name":"logging","imports":[{"statement":"from my_module import logging","count":2,...},...]}
+
+    If the project has an index, it answers from the index instead of searching with ripgrep.
+    With --exclude, the index is not used.
+
+    If PROJECT_ROOT is in a workspace (`workspace = true` in [tool.python-import] of a parent pyproject.toml),
+    the whole workspace is counted.
+
+    With --stats, stderr gets e.g.
+    {"seconds":{"ripgrep":0.01,"read":0.001,"parse":0.002,...,"total":0.02},"counts":{"files_read":3,...}}
+
     Todo:
         - [ ] Test import abcd
         - [ ] Test import abcd as efg
@@ -63,70 +245,361 @@ def count(
         - [ ] Test imports within a function
         - [ ] Test relative imports
     """
-    parser = Parser(PY_LANGUAGE)
-
-    # NOTE: rg json outputs are (1, 0)-indexed
-    rg_outputs = subprocess.run(
-        [
-            "rg",
-            "--word-regexp",
-            "--fixed-strings",
-            "--json",
-            "--type",
-            "python",
-            module_name,
-        ],
-        cwd=project_root,
-        capture_output=True,
-        check=False,
+    module_names = list(module_names or [])
+    if stdin:
+        module_names += sys.stdin.read().split()
+    if not module_names:
+        msg = "Give at least one module name, or --stdin."
+        raise typer.BadParameter(msg)
+
+    import json
+
+    from python_import.count import (
+        count_imports_of_words_with_examples,
+        count_top_imports,
     )
-    # print(rg_outputs)
-
-    # 0-indexed row, col
-    file_path_to_rowcol: dict[str, list[tuple[int, int]]] = defaultdict(list)
-    for line in rg_outputs.stdout.decode("utf-8").split("\n"):
-        if not line:
-            continue
-        # print(line)
-        rg_output = json.loads(line)
-        # print(rg_output["type"])
-        if rg_output["type"] == "match":
-            file_path = str(
-                (project_root / rg_output["data"]["path"]["text"]).resolve()
-            )
-            row = rg_output["data"]["line_number"] - 1
-            col = rg_output["data"]["submatches"][0]["start"]
-            # col_end = rg_output["data"]["submatches"][0]["end"]
-            file_path_to_rowcol[file_path].append((row, col))
+    from python_import.workspace import get_workspace_root
+
+    project_root = get_workspace_root(project_root)
+    parser = _get_parser()
 
-    # print(file_path_to_rowcol)
+    if len(module_names) == 1 and not stdin:
+        with _print_stats_to_stderr(enabled=stats):
+            import_counts, partial = count_top_imports(
+                project_root,
+                module_names[0],
+                parser,
+                limit=limit,
+                max_time=max_time,
+                use_index=use_index,
+                update_index=update_index,
+                exclude=exclude or (),
+                near=near,
+                recency=None if recency is None else recency.value,
+                jobs=jobs,
+            )
+        if output_format == OutputFormat.jsonl:
+            for import_count in import_counts:
+                print(
+                    json.dumps(
+                        import_count.to_json() | {"partial": partial},
+                        separators=(",", ":"),
+                    )
+                )
+        else:
+            if partial:
+                print(
+                    "python-import: the search stopped early, the counts are partial.",
+                    file=sys.stderr,
+                )
+            _print_import_counts(import_counts)
+        return
 
-    import_statement_to_count: dict[str, int] = defaultdict(int)
+    if any(option is not None for option in (limit, max_time, near, recency)):
+        msg = "--limit, --max-time, --near and --recency are only for a single module name."
+        raise typer.BadParameter(msg)
 
-    for python_file_path, rowcols in file_path_to_rowcol.items():
-        import_statement_to_count_file = get_all_imports_in_file_as_absolute(
-            project_root=project_root,
-            python_file_path=python_file_path,
-            parser=parser,
-            rowcols=rowcols,
+    with _print_stats_to_stderr(enabled=stats):
+        name_to_import_counts = count_imports_of_words_with_examples(
+            project_root,
+            module_names,
+            parser,
+            use_index=use_index,
+            update_index=update_index,
+            exclude=exclude or (),
+            jobs=jobs,
+        )
+    for module_name, import_counts in name_to_import_counts.items():
+        print(
+            json.dumps(
+                {
+                    "module_name": module_name,
+                    "imports": [
+                        import_count.to_json() for import_count in import_counts
+                    ],
+                },
+                separators=(",", ":"),
+            )
         )
 
-        # merge counts
-        for import_statement, count in import_statement_to_count_file.items():
-            import_statement_to_count[import_statement] += count
 
-    # sort and print as json-line
-    for import_statement, count in sorted(
-        import_statement_to_count.items(), key=lambda x: x[1], reverse=True
+def _print_import_counts(import_counts: list[ImportCount]) -> None:
+    # already sorted in descending order of count
+    for import_count in import_counts:
+        print(f"{import_count.count:05d}:{import_count.statement}")
+
+
+@app.command()
+def scan(
+    project_root: Path,
+    *,
+    exclude: Annotated[
+        Optional[list[str]],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Option(
+            "--exclude",
+            help="Skip the files matching this gitignore-style pattern (relative to PROJECT_ROOT), "
+            "on top of the excludes in [tool.python-import] of pyproject.toml. Can be repeated.",
+            show_default=False,
+        ),
+    ] = None,
+    jobs: Annotated[
+        int,
+        typer.Option(
+            "--jobs",
+            "-j",
+            help="Number of processes to parse the files with. 0 means the number of CPUs.",
+        ),
+    ] = 0,
+) -> None:
+    """
+    Print every import in the project as json-line, walking each Python file only once.
+
+    For example,
+    {"name":"np","statement":"import numpy as np","path":"/path/to/project/a.py","line":3}
+
+    `name` is the name the import binds, and `line` is 1-based.
+    """
+    import json
+
+    from python_import.index import list_python_files
+    from python_import.parallel import imap_with_parser
+    from python_import.utils import scan_imports_in_file
+    from python_import.workspace import get_workspace_root
+
+    project_root = get_workspace_root(project_root).resolve()
+    parser = _get_parser()
+    python_file_paths = list_python_files(project_root, exclude=exclude or ())
+    for python_file_path, import_records in zip(
+        python_file_paths,
+        imap_with_parser(
+            scan_imports_in_file,
+            [
+                {"project_root": project_root, "python_file_path": python_file_path}
+                for python_file_path in python_file_paths
+            ],
+            parser,
+            jobs,
+        ),
     ):
-        print(f"{count:05d}:{import_statement}")
-    #     print(
-    #         json.dumps(
-    #             {"import_statement": import_statement, "count": count},
-    #             indent=None,
-    #             separators=(",", ":"),
-    #         )
-    #     )
+        for import_record in import_records:
+            print(
+                json.dumps(
+                    {
+                        "name": import_record.name,
+                        "statement": import_record.statement,
+                        "path": python_file_path,
+                        "line": import_record.row + 1,
+                    },
+                    separators=(",", ":"),
+                )
+            )
+
+
+@app.command()
+def serve(
+    socket: Annotated[
+        Optional[Path],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Option(help="Listen on a Unix socket instead of stdio."),
+    ] = None,
+    *,
+    stats: Annotated[
+        bool,
+        typer.Option(
+            "--stats",
+            envvar=STATS_ENV_VAR,
+            help="Record the stats of each `count`, to be read with the `stats` method.",
+        ),
+    ] = False,
+    tree_cache_size: Annotated[
+        int,
+        typer.Option(
+            min=0,
+            help="Keep the parsed trees of up to this many MiB of source files, "
+            "to skip parsing the unchanged files in the next lookups. 0 disables the cache.",
+        ),
+    ] = DEFAULT_TREE_CACHE_BYTES // (1024 * 1024),
+) -> None:
+    """
+    Run a long-running JSON-RPC server (one request per line) over stdio or a Unix socket.
+
+    The parser and the project indices stay in memory, so repeated lookups skip the start-up cost.
+    """
+    from python_import.server import ImportServer
+
+    server = ImportServer(
+        _get_parser(),
+        collect_stats=stats,
+        tree_cache_bytes=tree_cache_size * 1024 * 1024,
+    )
+    try:
+        if socket is None:
+            server.serve(sys.stdin, sys.stdout)
+        else:
+            server.serve_unix_socket(socket)
+    finally:
+        server.close()
+
+
+@index_app.command("build")
+def index_build(
+    project_root: Path,
+    *,
+    exclude: Annotated[
+        Optional[list[str]],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Option(
+            "--exclude",
+            help="Skip the files matching this gitignore-style pattern (relative to PROJECT_ROOT), "
+            "on top of the excludes in [tool.python-import] of pyproject.toml. Can be repeated.",
+            show_default=False,
+        ),
+    ] = None,
+) -> None:
+    """
+    Build the import index of a project so that `count` doesn't need to search the whole project.
+
+    The --exclude patterns only apply to this build. The next update (e.g. by `count`) adds the files back,
+    so keep the permanent ones in [tool.python-import] of pyproject.toml.
+    """
+    from python_import.index import build_index, get_index_path
+    from python_import.workspace import get_workspace_root
+
+    project_root = get_workspace_root(project_root)
+    updated = build_index(project_root, _get_parser(), exclude=exclude or ())
+    print(f"Indexed {updated.added} files in {get_index_path(project_root)}")
+
+
+@index_app.command("update")
+def index_update(
+    project_root: Path,
+    *,
+    exclude: Annotated[
+        Optional[list[str]],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Option(
+            "--exclude",
+            help="Skip the files matching this gitignore-style pattern (relative to PROJECT_ROOT), "
+            "on top of the excludes in [tool.python-import] of pyproject.toml. Can be repeated.",
+            show_default=False,
+        ),
+    ] = None,
+) -> None:
+    """
+    Re-parse only the files that were added, changed or deleted since the index was last updated.
+
+    If the project has no index yet, it is built.
+    The files that became excluded are removed from the index.
+    """
+    from python_import.index import UPDATE_LOCK_TIMEOUT, ImportIndex
+    from python_import.workspace import get_workspace_root
+
+    project_root = get_workspace_root(project_root)
+    if not ImportIndex.exists(project_root):
+        index_build(project_root, exclude=exclude)
+        return
+
+    with ImportIndex(project_root, timeout=UPDATE_LOCK_TIMEOUT) as index:
+        updated = index.update(_get_parser(), exclude=exclude or ())
+    print(
+        f"Added {updated.added}, changed {updated.changed}, "
+        f"removed {updated.removed} files in {index.index_path}"
+    )
+
+
+@app.command("index-env")
+def index_env(
+    *,
+    python: Annotated[
+        Optional[str],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Option(
+            help="Index the environment of this interpreter. Default: python3 in PATH."
+        ),
+    ] = None,
+    exclude: Annotated[
+        Optional[list[str]],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Option(
+            "--exclude",
+            help="Skip the packages and modules matching this gitignore-style pattern, relative to the stdlib "
+            "and each site-packages directory (e.g. tensorflow/ or */tests/). Can be repeated.",
+            show_default=False,
+        ),
+    ] = None,
+    jobs: Annotated[
+        int,
+        typer.Option(
+            "--jobs",
+            "-j",
+            help="Number of processes to parse the files with. 0 means the number of CPUs.",
+        ),
+    ] = 0,
+) -> None:
+    """
+    Index the names exported by the stdlib and site-packages of a Python environment, for `lookup get`.
+
+    No module is imported. The `__init__.py` of each package is parsed for its `__all__`
+    (or its public definitions), and the candidates of each name are ranked by
+    how many of the parsed files import the module.
+    """
+    from python_import.env import build_env_index, get_default_python
+
+    python = python or get_default_python()
+    env_index_path, num_modules = build_env_index(
+        python, _get_parser(), exclude=exclude or (), jobs=jobs
+    )
+    print(f"Indexed {num_modules} modules of {python} in {env_index_path}")
+
+
+@lookup_app.command("compile")
+def lookup_compile() -> None:
+    """
+    Compile the lookup tables given as JSON in stdin, for `lookup get` and the server.
+
+    The JSON is like the tables in `lua/python_import/lookup_table.lua` merged with the user's extension:
+    {"import":["os",...],"import_as":{"np":"numpy",...},"import_from":{"Path":"pathlib",...},
+     "statement_after_imports":{"logger":["import logging","","logger = logging.getLogger(__name__)"],...}}
+    """
+    import json
+
+    from python_import.lookup import compile_lookup_table, write_lookup_table
+
+    word_to_statements = compile_lookup_table(json.load(sys.stdin))
+    lookup_table_path = write_lookup_table(word_to_statements)
+    print(f"Compiled {len(word_to_statements)} names in {lookup_table_path}")
+
+
+@lookup_app.command("get")
+def lookup_get(
+    module_names: Annotated[
+        list[str], typer.Argument(help="Names to find the import statements of.")
+    ],
+    *,
+    python: Annotated[
+        Optional[str],  # noqa: UP007 (typer evaluates the annotation in Python 3.9)
+        typer.Option(
+            help="Also look in the index of this interpreter's environment (see `index-env`). "
+            "Default: python3 in PATH."
+        ),
+    ] = None,
+) -> None:
+    """
+    Print the pre-defined import statements of each name as json-line.
+
+    e.g. {"module_name":"np","statements":["import numpy as np"],"source":"lookup_table"}
+    The names not in the compiled lookup tables are looked up in the environment's index ("source":"env").
+    The statements and source are null if the name is in neither.
+    """
+    import json
+
+    from python_import.env import get_default_python, get_env_index_path
+    from python_import.lookup import LookupTable, lookup_module_name
+
+    lookup_table = LookupTable()
+    env_index = LookupTable(get_env_index_path(python or get_default_python()))
+    for module_name in module_names:
+        print(
+            json.dumps(
+                lookup_module_name(module_name, lookup_table, env_index),
+                separators=(",", ":"),
+            )
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,480 @@
+from __future__ import annotations
+
+import heapq
+import logging
+import sqlite3
+import time
+from collections import defaultdict
+from contextlib import closing
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .index import ImportIndex
+from .parallel import imap_with_parser
+from .ranking import ImportRanker
+from .rg import iter_rg_import_rowcols, iter_rg_import_word_rowcols
+from .stats import add_count, stage
+from .utils import (
+    ImportCount,
+    get_import_rows_in_file_as_absolute,
+    get_import_rows_in_file_as_absolute_by_word,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
+    from os import PathLike
+
+    from tree_sitter import Parser
+
+    from .ranking import Recency
+
+logger = logging.getLogger(__name__)
+
+# With a `limit`, the search stops once the top statements stay the same over this many files.
+RANKING_STABLE_FILES = 500
+
+
+def count_imports(
+    project_root: str | PathLike,
+    module_name: str,
+    parser: Parser,
+    *,
+    use_index: bool = True,
+    update_index: bool = True,
+    index: ImportIndex | None = None,
+    exclude: Sequence[str] = (),
+    jobs: int = 0,
+) -> dict[str, int]:
+    """
+    Count the import statements of a module name in a project.
+
+    If the project has an index, it answers from the index instead of searching with ripgrep.
+    Pass an already opened `index` to reuse its connection (e.g. in the server).
+
+    The files excluded by `[tool.python-import]` in pyproject.toml are not searched,
+    nor the ones matching the `exclude` patterns (gitignore-style, relative to the project root).
+    The index may have the latter, so it is not used with `exclude`.
+
+    The files are parsed as soon as ripgrep finishes them,
+    in `jobs` worker processes (0: number of CPUs, 1: no worker processes).
+    The result is the same regardless of `jobs`.
+
+    Returns:
+        import statement to count, in descending order of count.
+    """
+    return {
+        import_count.statement: import_count.count
+        for import_count in count_imports_with_examples(
+            project_root,
+            module_name,
+            parser,
+            use_index=use_index,
+            update_index=update_index,
+            index=index,
+            exclude=exclude,
+            jobs=jobs,
+        )
+    }
+
+
+def count_imports_with_examples(
+    project_root: str | PathLike,
+    module_name: str,
+    parser: Parser,
+    *,
+    use_index: bool = True,
+    update_index: bool = True,
+    index: ImportIndex | None = None,
+    exclude: Sequence[str] = (),
+    jobs: int = 0,
+) -> list[ImportCount]:
+    """
+    Same as `count_imports()`, with a file and row where each statement is used.
+
+    Returns:
+        import counts, in descending order of count.
+    """
+    import_counts, _ = count_top_imports(
+        project_root,
+        module_name,
+        parser,
+        use_index=use_index,
+        update_index=update_index,
+        index=index,
+        exclude=exclude,
+        jobs=jobs,
+    )
+    return import_counts
+
+
+def count_top_imports(
+    project_root: str | PathLike,
+    module_name: str,
+    parser: Parser,
+    *,
+    limit: int | None = None,
+    max_time: float | None = None,
+    stable_files: int = RANKING_STABLE_FILES,
+    use_index: bool = True,
+    update_index: bool = True,
+    index: ImportIndex | None = None,
+    exclude: Sequence[str] = (),
+    near: str | PathLike | None = None,
+    recency: Recency | None = None,
+    jobs: int = 0,
+) -> tuple[list[ImportCount], bool]:
+    """
+    Same as `count_imports_with_examples()`, but the search can stop early for a faster, approximate answer.
+
+    With `limit`, only the top `limit` statements are returned, and the search stops once they
+    have stayed the same (in the same order) over `stable_files` matched files.
+    With `max_time` (seconds), the search stops when the time is up. It is checked for each file,
+    and while waiting for the worker processes, so the latency of a common word is bounded
+    even if it's in every file of the project. Only a file parsed in this process is not interrupted.
+
+    The index answers exactly, so `limit` only cuts the ripgrep search short.
+    `max_time` also bounds the update of the index, which then answers with the files updated so far.
+
+    With `near` (the file being edited) or `recency` ("mtime" or "git"), the statements are ranked
+    by the uses weighted by their proximity and recency instead of by count (see `python_import.ranking`),
+    and each has the `score` it is ranked by.
+
+    Returns:
+        (import counts in descending order of count or score, whether the search stopped before the end)
+    """
+    # the matched file paths are absolute
+    project_root = Path(project_root).resolve()
+    ranker = (
+        ImportRanker(project_root, near=near, recency=recency)
+        if near is not None or recency is not None
+        else None
+    )
+
+    deadline = None if max_time is None else time.perf_counter() + max_time
+
+    # The index is keyed by identifiers, so dotted names like `torch.utils` are searched with ripgrep.
+    if use_index and not exclude and module_name.isidentifier():
+        try:
+            if index is not None:
+                return _count_top_imports_with_index(
+                    index, module_name, parser, update_index, limit, ranker, deadline
+                )
+            if ImportIndex.exists(project_root):
+                with ImportIndex(project_root) as project_index:
+                    return _count_top_imports_with_index(
+                        project_index,
+                        module_name,
+                        parser,
+                        update_index,
+                        limit,
+                        ranker,
+                        deadline,
+                    )
+        except sqlite3.OperationalError as e:
+            _warn_index_unavailable(project_root, e)
+            if ranker is not None:
+                # Some files may have been added before the error.
+                ranker = ImportRanker(project_root, near=near, recency=recency)
+
+    python_file_paths: list[str] = []
+
+    def iter_kwargs() -> Iterator[dict[str, Any]]:
+        for python_file_path, rowcols in iter_rg_import_rowcols(
+            project_root, module_name, exclude=exclude
+        ):
+            python_file_paths.append(python_file_path)
+            yield {
+                "project_root": project_root,
+                "python_file_path": python_file_path,
+                "rowcols": rowcols,
+            }
+
+    import_statement_to_count: dict[str, ImportCount] = {}
+    top_import_statements: list[str] = []
+    num_stable_files = 0
+    partial = False
+    # Closing them stops ripgrep and the worker processes when the search stops early.
+    with (
+        closing(iter_kwargs()) as kwargs_iterator,
+        closing(
+            imap_with_parser(
+                get_import_rows_in_file_as_absolute,
+                kwargs_iterator,
+                parser,
+                jobs,
+                deadline=deadline,
+            )
+        ) as results,
+    ):
+        # The results are in the order of the files, and a file path is appended before its result is made.
+        for import_statement_to_rows, python_file_path in zip(
+            results, python_file_paths
+        ):
+            if ranker is not None:
+                ranker.add_file(python_file_path, import_statement_to_rows)
+            else:
+                _add_import_rows(
+                    import_statement_to_count,
+                    python_file_path,
+                    import_statement_to_rows,
+                )
+
+            if limit is not None:
+                if ranker is not None:
+                    new_top_import_statements = ranker.top_statements(limit)
+                else:
+                    new_top_import_statements = [
+                        import_count.statement
+                        for import_count in heapq.nlargest(
+                            limit,
+                            import_statement_to_count.values(),
+                            key=lambda x: x.count,
+                        )
+                    ]
+                if new_top_import_statements == top_import_statements:
+                    num_stable_files += 1
+                else:
+                    top_import_statements = new_top_import_statements
+                    num_stable_files = 0
+                if num_stable_files >= stable_files:
+                    partial = True
+                    break
+
+            if deadline is not None and time.perf_counter() >= deadline:
+                partial = True
+                break
+
+    # The results stop coming when the time is up while waiting for them.
+    if deadline is not None and time.perf_counter() >= deadline:
+        partial = True
+    if partial:
+        add_count("stopped_early")
+    if ranker is not None:
+        return ranker.top(limit), partial
+    return sorted(
+        import_statement_to_count.values(), key=lambda x: x.count, reverse=True
+    )[:limit], partial
+
+
+def count_imports_of_words(
+    project_root: str | PathLike,
+    module_names: Iterable[str],
+    parser: Parser,
+    *,
+    use_index: bool = True,
+    update_index: bool = True,
+    index: ImportIndex | None = None,
+    exclude: Sequence[str] = (),
+    jobs: int = 0,
+) -> dict[str, dict[str, int]]:
+    """
+    Count the import statements of many module names at once.
+
+    Same as calling `count_imports()` for each name, but the names not in the index are searched
+    with a single ripgrep, and each matched file is parsed only once.
+
+    Returns:
+        module name to (import statement to count, in descending order of count),
+        in the order of `module_names` without duplicates.
+    """
+    return {
+        module_name: {
+            import_count.statement: import_count.count for import_count in import_counts
+        }
+        for module_name, import_counts in count_imports_of_words_with_examples(
+            project_root,
+            module_names,
+            parser,
+            use_index=use_index,
+            update_index=update_index,
+            index=index,
+            exclude=exclude,
+            jobs=jobs,
+        ).items()
+    }
+
+
+def count_imports_of_words_with_examples(
+    project_root: str | PathLike,
+    module_names: Iterable[str],
+    parser: Parser,
+    *,
+    use_index: bool = True,
+    update_index: bool = True,
+    index: ImportIndex | None = None,
+    exclude: Sequence[str] = (),
+    jobs: int = 0,
+) -> dict[str, list[ImportCount]]:
+    """
+    Same as `count_imports_of_words()`, with a file and row where each statement is used.
+
+    Returns:
+        module name to (import counts, in descending order of count),
+        in the order of `module_names` without duplicates.
+    """
+    project_root = Path(project_root).resolve()
+    module_names = list(dict.fromkeys(module_names))
+
+    name_to_import_counts: dict[str, list[ImportCount]] = {}
+
+    # The index is keyed by identifiers, so dotted names like `torch.utils` are searched with ripgrep.
+    index_names = (
+        [name for name in module_names if name.isidentifier()]
+        if use_index and not exclude
+        else []
+    )
+    if index_names:
+        try:
+            if index is not None:
+                name_to_import_counts.update(
+                    _count_imports_of_words_with_index(
+                        index, index_names, parser, update_index
+                    )
+                )
+            elif ImportIndex.exists(project_root):
+                with ImportIndex(project_root) as project_index:
+                    name_to_import_counts.update(
+                        _count_imports_of_words_with_index(
+                            project_index, index_names, parser, update_index
+                        )
+                    )
+        except sqlite3.OperationalError as e:
+            _warn_index_unavailable(project_root, e)
+
+    rg_names = [name for name in module_names if name not in name_to_import_counts]
+    if rg_names:
+        python_file_paths: list[str] = []
+
+        def iter_kwargs() -> Iterator[dict[str, Any]]:
+            for python_file_path, word_rowcols in iter_rg_import_word_rowcols(
+                project_root, rg_names, exclude=exclude
+            ):
+                python_file_paths.append(python_file_path)
+                yield {
+                    "project_root": project_root,
+                    "python_file_path": python_file_path,
+                    "word_rowcols": word_rowcols,
+                }
+
+        name_to_file_rows: dict[str, list[tuple[str, dict[str, list[int]]]]] = {
+            name: [] for name in rg_names
+        }
+        # See `count_imports_with_examples()` for the order.
+        for word_to_import_statement_to_rows, python_file_path in zip(
+            imap_with_parser(
+                get_import_rows_in_file_as_absolute_by_word,
+                iter_kwargs(),
+                parser,
+                jobs,
+            ),
+            python_file_paths,
+        ):
+            for word, file_rows in word_to_import_statement_to_rows.items():
+                # The matched text is one of the names,
+                # unless e.g. a ripgrep config file adds --ignore-case.
+                if word in name_to_file_rows:
+                    name_to_file_rows[word].append((python_file_path, file_rows))
+
+        for name, file_rows_list in name_to_file_rows.items():
+            name_to_import_counts[name] = merge_import_rows(file_rows_list)
+
+    return {name: name_to_import_counts[name] for name in module_names}
+
+
+def merge_import_counts(
+    import_statement_to_count_files: Iterable[dict[str, int]],
+) -> dict[str, int]:
+    """
+    Sum the per-file counts.
+
+    Returns:
+        import statement to count, in descending order of count.
+    """
+    import_statement_to_count: dict[str, int] = defaultdict(int)
+    for import_statement_to_count_file in import_statement_to_count_files:
+        for import_statement, count in import_statement_to_count_file.items():
+            import_statement_to_count[import_statement] += count
+
+    return dict(
+        sorted(import_statement_to_count.items(), key=lambda x: x[1], reverse=True)
+    )
+
+
+def merge_import_rows(
+    import_statement_to_rows_files: Iterable[tuple[str, dict[str, list[int]]]],
+) -> list[ImportCount]:
+    """
+    Sum the per-file (file path, import statement to rows), keeping the first row of each statement as example.
+
+    Returns:
+        import counts, in descending order of count.
+    """
+    import_statement_to_count: dict[str, ImportCount] = {}
+    for python_file_path, import_statement_to_rows in import_statement_to_rows_files:
+        _add_import_rows(
+            import_statement_to_count, python_file_path, import_statement_to_rows
+        )
+
+    return sorted(
+        import_statement_to_count.values(), key=lambda x: x.count, reverse=True
+    )
+
+
+def _add_import_rows(
+    import_statement_to_count: dict[str, ImportCount],
+    python_file_path: str,
+    import_statement_to_rows: dict[str, list[int]],
+) -> None:
+    for import_statement, rows in import_statement_to_rows.items():
+        import_count = import_statement_to_count.get(import_statement)
+        if import_count is None:
+            import_statement_to_count[import_statement] = ImportCount(
+                import_statement, len(rows), python_file_path, rows[0]
+            )
+        else:
+            import_count.count += len(rows)
+
+
+def _warn_index_unavailable(project_root: Path, error: sqlite3.OperationalError):
+    # e.g. "database is locked" while another process updates it for longer than `LOCK_TIMEOUT`.
+    logger.warning(
+        f"The index of {project_root} is not available ({error}). Searching the project instead."
+    )
+
+
+def _count_top_imports_with_index(
+    index: ImportIndex,
+    module_name: str,
+    parser: Parser,
+    update_index: bool,  # noqa: FBT001
+    limit: int | None,
+    ranker: ImportRanker | None,
+    deadline: float | None,
+) -> tuple[list[ImportCount], bool]:
+    partial = False
+    if update_index:
+        with stage("index_update"):
+            partial = index.update(parser, deadline=deadline).partial
+        if partial:
+            add_count("stopped_early")
+    with stage("index_count"):
+        if ranker is None:
+            return index.count_with_examples(module_name, limit), partial
+        for python_file_path, statement, count, row, mtime_ns in index.iter_file_counts(
+            module_name
+        ):
+            ranker.add(python_file_path, statement, count, row, mtime_ns)
+        return ranker.top(limit), partial
+
+
+def _count_imports_of_words_with_index(
+    index: ImportIndex,
+    module_names: list[str],
+    parser: Parser,
+    update_index: bool,  # noqa: FBT001
+) -> dict[str, list[ImportCount]]:
+    if update_index:
+        with stage("index_update"):
+            index.update(parser)
+    with stage("index_count"):
+        return {name: index.count_with_examples(name) for name in module_names}
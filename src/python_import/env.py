@@ -0,0 +1,372 @@
+"""
+Index of the names that the modules of a Python environment (stdlib and site-packages) export.
+
+Nothing is imported. The environment's paths are asked from the interpreter,
+and the `__init__.py` of each package (and each top-level module) is parsed with tree-sitter
+for its `__all__`, or its public top-level definitions and relative re-exports if it has no `__all__`.
+
+The result is a word -> candidate import statements dict, most popular first,
+stored like the compiled lookup table (see `python_import.lookup`).
+A module is more popular when more of the parsed files import it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+import subprocess
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .cache_dir import get_cache_dir
+from .lookup import write_lookup_table
+from .ts_utils import get_query, query_captures
+from .walk import IgnoreRules
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+    from os import PathLike
+
+    import tree_sitter
+    from tree_sitter import Parser
+
+# The number of candidate statements kept for each name.
+MAX_STATEMENTS_PER_NAME = 5
+
+# Not meant to be imported.
+_SKIP_DIR_NAMES = frozenset(
+    {"site-packages", "dist-packages", "test", "tests", "idlelib", "turtledemo"}
+)
+
+# Run in the interpreter of the environment.
+_ENV_PATHS_SCRIPT = """
+import json, sys, sysconfig
+print(json.dumps({
+    "stdlib": sysconfig.get_paths()["stdlib"],
+    "site_packages": [p for p in sys.path if p.endswith(("site-packages", "dist-packages"))],
+    "builtin_module_names": sorted(sys.builtin_module_names),
+}))
+"""
+
+# The top-level module of every absolute import.
+_IMPORTED_MODULE_QUERY = """
+(import_statement name: (dotted_name . (identifier) @module))
+(import_statement name: (aliased_import name: (dotted_name . (identifier) @module)))
+(import_from_statement module_name: (dotted_name . (identifier) @module))
+"""
+
+
+def get_default_python() -> str:
+    """
+    Return the `python3` in PATH (e.g. of the activated virtual environment).
+
+    Not `sys.executable`, which is usually the isolated environment python-import is installed in.
+    """
+    return shutil.which("python3") or shutil.which("python") or sys.executable
+
+
+def get_env_index_path(python: str | PathLike) -> Path:
+    # Not resolved, because the python of a virtual environment is a symlink to the base python.
+    python_hash = hashlib.sha1(
+        str(Path(python).absolute()).encode("utf-8")
+    ).hexdigest()[:16]
+    return get_cache_dir() / f"env-index-{python_hash}.marshal"
+
+
+def get_env_paths(python: str | PathLike) -> dict[str, Any]:
+    """
+    Ask the interpreter for its stdlib and site-packages directories and its builtin modules.
+    """
+    output = subprocess.run(
+        [str(python), "-c", _ENV_PATHS_SCRIPT],
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def _is_public(name: str) -> bool:
+    return not name.startswith("_") and name.isidentifier()
+
+
+def _iter_package_inits(
+    package_dir: Path, module_name: str, ignore_rules: IgnoreRules
+) -> Iterator[tuple[str, Path]]:
+    """Yield (module name, path) of the `__init__.py` of the package and its public subpackages."""
+    init_path = package_dir / "__init__.py"
+    if not init_path.is_file():
+        return
+    yield module_name, init_path
+    for child in sorted(package_dir.iterdir()):
+        if (
+            child.is_dir()
+            and _is_public(child.name)
+            and child.name not in _SKIP_DIR_NAMES
+            and not ignore_rules.is_ignored(str(child), is_dir=True)
+        ):
+            yield from _iter_package_inits(
+                child, f"{module_name}.{child.name}", ignore_rules
+            )
+
+
+def iter_env_modules(
+    env_paths: dict[str, Any], exclude: Sequence[str] = ()
+) -> Iterator[tuple[str, Path | None]]:
+    """
+    Yield (module name, file to parse) of the public modules in the environment.
+
+    The file is None for extension modules, which can only be imported as a whole.
+    Namespace packages (without `__init__.py`) are skipped,
+    and so are the packages and modules matching the `exclude` patterns
+    (gitignore-style, relative to the stdlib or site-packages directory).
+    """
+    for module_name in env_paths["builtin_module_names"]:
+        if _is_public(module_name):
+            yield module_name, None
+
+    stdlib_dir = Path(env_paths["stdlib"])
+    module_dirs = [stdlib_dir, stdlib_dir / "lib-dynload"]
+    module_dirs += [Path(path) for path in env_paths["site_packages"]]
+    seen: set[str] = set(env_paths["builtin_module_names"])
+    for module_dir in module_dirs:
+        if not module_dir.is_dir():
+            continue
+        ignore_rules = IgnoreRules().extended(str(module_dir), exclude)
+        for child in sorted(module_dir.iterdir()):
+            # e.g. numpy, six.py, _cffi_backend.cpython-311-x86_64-linux-gnu.so
+            module_name = child.name.split(".")[0]
+            if (
+                not _is_public(module_name)
+                or module_name in seen
+                or module_name in _SKIP_DIR_NAMES
+                or ignore_rules.is_ignored(str(child), is_dir=child.is_dir())
+            ):
+                continue
+            if child.is_dir():
+                if (child / "__init__.py").is_file():
+                    seen.add(module_name)
+                    yield from _iter_package_inits(child, module_name, ignore_rules)
+            elif child.suffix == ".py":
+                seen.add(module_name)
+                yield module_name, child
+            elif child.suffix in (".so", ".pyd"):
+                seen.add(module_name)
+                yield module_name, None
+
+
+def _iter_statements(node: tree_sitter.Node) -> Iterator[tree_sitter.Node]:
+    """Yield the top-level statements, including the ones in top-level `if` and `try` blocks."""
+    for child in node.named_children:
+        if child.type in ("if_statement", "try_statement"):
+            for clause in child.named_children:
+                if clause.type == "block":
+                    yield from _iter_statements(clause)
+                elif clause.type in (
+                    "elif_clause",
+                    "else_clause",
+                    "except_clause",
+                    "finally_clause",
+                ):
+                    for block in clause.named_children:
+                        if block.type == "block":
+                            yield from _iter_statements(block)
+        else:
+            yield child
+
+
+def _iter_strings(node: tree_sitter.Node) -> Iterator[str]:
+    if node.type == "string":
+        for child in node.named_children:
+            if child.type == "string_content" and child.text is not None:
+                yield child.text.decode("utf-8")
+        return
+    for child in node.named_children:
+        yield from _iter_strings(child)
+
+
+def _is_literal_list(node: tree_sitter.Node) -> bool:
+    """Whether the node is only lists or tuples of strings, e.g. `["a", "b"] + ["c"]`."""
+    if node.type in ("string", "comment"):
+        return True
+    if node.type in ("list", "tuple", "parenthesized_expression", "binary_operator"):
+        return all(_is_literal_list(child) for child in node.named_children)
+    return False
+
+
+def _text(node: tree_sitter.Node | None) -> str:
+    if node is None or node.text is None:
+        return ""
+    return node.text.decode("utf-8")
+
+
+def get_public_names_in_file(
+    python_file_path: str | PathLike,
+    parser: Parser,
+) -> tuple[list[str], list[str]]:
+    """
+    Return the names a module exports, and the top-level modules it imports (absolute imports only).
+
+    The exported names are `__all__` if the module defines it,
+    otherwise its public top-level functions, classes, variables and relative re-exports
+    (e.g. `from .core import array`).
+    If `__all__` is computed (e.g. `core.__all__ + ["a"]`), both are used.
+    """
+    try:
+        with open(python_file_path, "rb") as f:
+            source = f.read()
+    except OSError:
+        return [], []
+    tree = parser.parse(source)
+
+    all_names: list[str] | None = None
+    is_all_literal = True
+    names: list[str] = []
+    for statement in _iter_statements(tree.root_node):
+        node = statement
+        if node.type == "decorated_definition":
+            node = node.child_by_field_name("definition") or node
+        if node.type in ("function_definition", "class_definition"):
+            names.append(_text(node.child_by_field_name("name")))
+        elif node.type == "expression_statement" and node.named_children:
+            expression = node.named_children[0]
+            if expression.type not in ("assignment", "augmented_assignment"):
+                continue
+            left = _text(expression.child_by_field_name("left"))
+            right = expression.child_by_field_name("right")
+            if left == "__all__" and right is not None:
+                if all_names is None or expression.type == "assignment":
+                    all_names = []
+                all_names += _iter_strings(right)
+                is_all_literal = is_all_literal and _is_literal_list(right)
+            elif expression.type == "assignment":
+                names.append(left)
+        elif node.type == "import_from_statement":
+            module_name = node.child_by_field_name("module_name")
+            if module_name is None or module_name.type != "relative_import":
+                continue
+            for name_node in node.children_by_field_name("name"):
+                if name_node.type == "aliased_import":
+                    name_node = name_node.child_by_field_name("alias")
+                names.append(_text(name_node))
+
+    query = get_query(parser.language, _IMPORTED_MODULE_QUERY)
+    imported_modules = {
+        _text(node)
+        for nodes in query_captures(query, tree.root_node).values()
+        for node in nodes
+    }
+
+    if all_names is None:
+        exported_names = names
+    elif is_all_literal:
+        exported_names = all_names
+    else:
+        exported_names = all_names + names
+    return (
+        list(dict.fromkeys(name for name in exported_names if _is_public(name))),
+        sorted(imported_modules),
+    )
+
+
+def compile_env_index(
+    module_names_and_names: list[tuple[str, list[str]]],
+    module_popularity: Counter[str],
+) -> dict[str, list[str]]:
+    """
+    Compile (module name, exported names) into word -> candidate import statements.
+
+    A top-level module is always the first candidate of its own name (e.g. `import json`).
+    The others are ordered by the popularity of their top-level module, then the shortest module path,
+    as a package's public API is usually re-exported close to the top (e.g. `numpy` over `numpy.core`).
+
+    Examples:
+    >>> compile_env_index(
+    ...     [("pathlib", ["Path"]), ("mypkg", ["Path", "pathlib"]), ("mypkg.sub", ["Path"])],
+    ...     Counter({"pathlib": 10, "mypkg": 1}),
+    ... )["Path"]
+    ['from pathlib import Path', 'from mypkg import Path', 'from mypkg.sub import Path']
+    >>> compile_env_index([("pathlib", []), ("mypkg", ["pathlib"])], Counter())["pathlib"]
+    ['import pathlib', 'from mypkg import pathlib']
+    """
+    word_to_candidates: dict[str, list[tuple[tuple[int, int, int, str], str]]] = (
+        defaultdict(list)
+    )
+    for module_name, names in module_names_and_names:
+        top_level_module_name = module_name.split(".")[0]
+        popularity = module_popularity[top_level_module_name]
+        depth = module_name.count(".")
+        if depth == 0:
+            word_to_candidates[module_name].append(
+                ((0, -popularity, depth, module_name), f"import {module_name}")
+            )
+        for name in names:
+            word_to_candidates[name].append(
+                (
+                    (1, -popularity, depth, module_name),
+                    f"from {module_name} import {name}",
+                )
+            )
+
+    return {
+        word: [
+            statement for _, statement in sorted(candidates)[:MAX_STATEMENTS_PER_NAME]
+        ]
+        for word, candidates in word_to_candidates.items()
+    }
+
+
+def build_env_index(
+    python: str | PathLike,
+    parser: Parser,
+    *,
+    exclude: Sequence[str] = (),
+    jobs: int = 0,
+) -> tuple[Path, int]:
+    """
+    Index the names exported by the modules of the environment of the interpreter.
+
+    The modules matching the `exclude` patterns are not parsed (see `iter_env_modules()`).
+
+    Returns:
+        (path of the index, number of modules indexed)
+    """
+    # Not at the top, so that `lookup get` doesn't load the worker pool to find the index path.
+    from .parallel import imap_with_parser
+
+    env_paths = get_env_paths(python)
+    modules = list(iter_env_modules(env_paths, exclude))
+    python_modules = [
+        (module_name, path) for module_name, path in modules if path is not None
+    ]
+
+    module_names_and_names = [
+        (module_name, []) for module_name, path in modules if path is None
+    ]
+    module_popularity: Counter[str] = Counter()
+    for (module_name, _), (names, imported_modules) in zip(
+        python_modules,
+        imap_with_parser(
+            get_public_names_in_file,
+            ({"python_file_path": path} for _, path in python_modules),
+            parser,
+            jobs,
+        ),
+    ):
+        module_names_and_names.append((module_name, names))
+        top_level_module_name = module_name.split(".")[0]
+        module_popularity.update(
+            imported_module
+            for imported_module in imported_modules
+            if imported_module != top_level_module_name
+        )
+
+    env_index_path = write_lookup_table(
+        compile_env_index(module_names_and_names, module_popularity),
+        get_env_index_path(python),
+    )
+    return env_index_path, len(modules)
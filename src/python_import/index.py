@@ -0,0 +1,461 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import subprocess
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .cache_dir import get_cache_dir
+from .project_config import load_project_config
+from .rg import rg_project_config_args, use_ripgrep
+from .stats import add_count, stage
+from .ts_utils import iter_import_identifiers
+from .utils import ImportCount, get_import_statement_of_identifier
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+    from os import PathLike
+
+    from tree_sitter import Parser
+
+    # (path, stat, hash, import rows by name or None if only the stat changed)
+    _FileWrite = tuple[str, os.stat_result, str, dict[str, dict[str, list[int]]] | None]
+
+# Bump this when the schema changes. Old indices are then rebuilt from scratch.
+SCHEMA_VERSION = 4
+
+# Seconds to wait for the lock held by another process (e.g. an update in the background)
+# before giving up with `sqlite3.OperationalError`, and searching the project without the index instead.
+LOCK_TIMEOUT = 0.5
+# The updates in the background are not in a hurry, and wait for each other.
+UPDATE_LOCK_TIMEOUT = 60.0
+# The update commits after this many parsed files, so that it never holds the write lock for long.
+UPDATE_BATCH_FILES = 100
+
+_SCHEMA = """
+CREATE TABLE files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE imports (
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    statement TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    row INTEGER NOT NULL
+);
+CREATE INDEX imports_path ON imports (path);
+CREATE INDEX imports_name ON imports (name, statement);
+CREATE TABLE totals (
+    name TEXT NOT NULL,
+    statement TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (name, statement)
+) WITHOUT ROWID;
+"""
+
+
+def get_index_path(project_root: str | PathLike) -> Path:
+    project_root_hash = hashlib.sha1(
+        str(Path(project_root).resolve()).encode("utf-8")
+    ).hexdigest()[:16]
+    return get_cache_dir() / f"index-{project_root_hash}.sqlite"
+
+
+def list_python_files(
+    project_root: str | PathLike, *, exclude: Sequence[str] = ()
+) -> list[str]:
+    """
+    List the absolute paths of the Python files in the project.
+
+    Same files that `count` searches, i.e. `rg --type python` respecting .gitignore
+    and `[tool.python-import]` in pyproject.toml, without the `exclude` patterns.
+    """
+    project_config = load_project_config(project_root).with_exclude(exclude)
+    if not use_ripgrep():
+        from .walk import iter_python_files
+
+        return list(iter_python_files(project_root, project_config=project_config))
+
+    with rg_project_config_args(project_config) as project_config_args:
+        rg_outputs = subprocess.run(
+            ["rg", "--files", "--type", "python", *project_config_args],
+            cwd=project_root,
+            capture_output=True,
+            check=False,
+        )
+
+    project_root = Path(project_root)
+    return [
+        str((project_root / line).resolve())
+        for line in rg_outputs.stdout.decode("utf-8").split("\n")
+        if line
+    ]
+
+
+def get_all_imports_in_file_by_name(
+    project_root: str | PathLike,
+    python_file_path: str | PathLike,
+    parser: Parser,
+    source: bytes | None = None,
+) -> dict[str, dict[str, int]]:
+    """
+    Return every import statement in a Python file, grouped by the name `count` would find it with.
+
+    The statements are converted the same way as `get_all_imports_in_file_as_absolute`,
+    so the index gives the same answer as searching the word with ripgrep.
+
+    For example, `import a.b` is found with both `a` and `b`:
+    {"a": {"import a.b": 1}, "b": {"import a.b": 1}}
+
+    Pass `source` if the file has already been read.
+    """
+    return {
+        name: {
+            import_statement: len(rows)
+            for import_statement, rows in import_statement_to_rows.items()
+        }
+        for name, import_statement_to_rows in _get_import_rows_in_file_by_name(
+            project_root, python_file_path, parser, source
+        ).items()
+    }
+
+
+def _get_import_rows_in_file_by_name(
+    project_root: str | PathLike,
+    python_file_path: str | PathLike,
+    parser: Parser,
+    source: bytes | None = None,
+) -> dict[str, dict[str, list[int]]]:
+    if source is None:
+        with open(python_file_path) as f:
+            lines: str = f.read()
+        source = bytes(lines, "utf8")
+
+    with stage("parse"):
+        tree = parser.parse(source)
+
+    name_to_import_statement_to_rows: dict[str, dict[str, list[int]]] = defaultdict(
+        lambda: defaultdict(list)
+    )
+    # (name, start byte of the dotted_name / aliased_import node) already counted.
+    # Like ripgrep's `count`, `import foo.foo` is one use of `foo`.
+    counted_imports: set[tuple[bytes, int]] = set()
+    for node in iter_import_identifiers(tree):
+        name = node.text
+        assert name is not None
+        parent = node.parent if node.parent is not None else node
+        counted_import = (name, parent.start_byte)
+        if counted_import in counted_imports:
+            continue
+        import_statement = get_import_statement_of_identifier(
+            project_root, python_file_path, node
+        )
+        if import_statement is None:
+            continue
+        counted_imports.add(counted_import)
+
+        name_to_import_statement_to_rows[name.decode("utf-8")][import_statement].append(
+            node.start_point[0]
+        )
+
+    return name_to_import_statement_to_rows
+
+
+def build_index(
+    project_root: str | PathLike,
+    parser: Parser,
+    index_path: str | PathLike | None = None,
+    *,
+    exclude: Sequence[str] = (),
+) -> IndexUpdate:
+    """
+    Build the index of a project from scratch in a temporary file, and move it in place when done.
+
+    Until then, `count` keeps answering from the previous index (or with ripgrep if there was none),
+    instead of waiting for the lock of a half-built index. e.g. when it's built in the background.
+
+    The files matching the `exclude` patterns are left out, on top of the ones excluded in pyproject.toml.
+    """
+    index_path = (
+        Path(index_path) if index_path is not None else get_index_path(project_root)
+    )
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_index_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    try:
+        with ImportIndex(project_root, tmp_index_path) as index:
+            index_update = index.build(parser, exclude=exclude)
+        tmp_index_path.replace(index_path)
+    finally:
+        tmp_index_path.unlink(missing_ok=True)
+    return index_update
+
+
+@dataclass
+class IndexUpdate:
+    added: int = 0
+    changed: int = 0
+    removed: int = 0
+    partial: bool = False
+    """Whether the update stopped at the deadline. The files not checked yet are updated next time."""
+
+
+class ImportIndex:
+    """
+    Persistent SQLite index of the import statements in a project, keyed by the imported name.
+
+    Build it once with `build()`, then `count()` answers without running ripgrep or parsing any file.
+    Call `update()` to re-parse only the files that changed since.
+    """
+
+    def __init__(
+        self,
+        project_root: str | PathLike,
+        index_path: str | PathLike | None = None,
+        *,
+        check_same_thread: bool = True,
+        timeout: float = LOCK_TIMEOUT,
+    ):
+        self.project_root = Path(project_root).resolve()
+        self.index_path = (
+            Path(index_path) if index_path is not None else get_index_path(project_root)
+        )
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(
+            self.index_path, timeout=timeout, check_same_thread=check_same_thread
+        )
+
+        (schema_version,) = self.conn.execute("PRAGMA user_version").fetchone()
+        if schema_version != SCHEMA_VERSION:
+            self._create_schema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def exists(project_root: str | PathLike) -> bool:
+        return get_index_path(project_root).is_file()
+
+    def _create_schema(self):
+        with self.conn:
+            for (table,) in self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall():
+                self.conn.execute(f"DROP TABLE {table}")
+            self.conn.executescript(_SCHEMA)
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def build(self, parser: Parser, *, exclude: Sequence[str] = ()) -> IndexUpdate:
+        """
+        Rebuild the whole index from scratch.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM files")
+            self.conn.execute("DELETE FROM imports")
+            self.conn.execute("DELETE FROM totals")
+        return self.update(parser, exclude=exclude)
+
+    def update(
+        self,
+        parser: Parser,
+        *,
+        exclude: Sequence[str] = (),
+        deadline: float | None = None,
+    ) -> IndexUpdate:
+        """
+        Re-parse only the files that were added, changed or deleted since the last update.
+
+        A file is considered unchanged if its mtime and size are the same.
+        If they differ but the content hash is the same, only the stat is refreshed.
+        The per-file counts of re-parsed files are subtracted from / added to the totals.
+
+        The files excluded in pyproject.toml or by the `exclude` patterns are not listed,
+        so they are removed from the index like deleted files.
+
+        With `deadline` (a `time.perf_counter()` value), it stops when the time is up (checked for each file),
+        keeping the files updated so far.
+        """
+        indexed_files: dict[str, tuple[int, int, str]] = {
+            path: (mtime_ns, size, file_hash)
+            for path, mtime_ns, size, file_hash in self.conn.execute(
+                "SELECT path, mtime_ns, size, hash FROM files"
+            )
+        }
+        python_file_paths = list_python_files(self.project_root, exclude=exclude)
+
+        index_update = IndexUpdate()
+        batch: list[_FileWrite] = []
+        for python_file_path in python_file_paths:
+            if deadline is not None and time.perf_counter() >= deadline:
+                index_update.partial = True
+                break
+            try:
+                stat = Path(python_file_path).stat()
+            except FileNotFoundError:
+                # deleted after listing. It will be removed below.
+                continue
+
+            indexed_file = indexed_files.pop(python_file_path, None)
+            if indexed_file is not None and indexed_file[:2] == (
+                stat.st_mtime_ns,
+                stat.st_size,
+            ):
+                continue
+
+            with stage("read"), open(python_file_path, "rb") as f:
+                source = f.read()
+            add_count("files_read")
+            add_count("bytes_read", len(source))
+            file_hash = hashlib.blake2b(source, digest_size=16).hexdigest()
+
+            if indexed_file is None:
+                index_update.added += 1
+            elif indexed_file[2] == file_hash:
+                # touched, but the content is the same.
+                batch.append((python_file_path, stat, file_hash, None))
+                continue
+            else:
+                index_update.changed += 1
+
+            # Parsed outside of the transaction, which is short and holds the lock only to write.
+            batch.append(
+                (
+                    python_file_path,
+                    stat,
+                    file_hash,
+                    _get_import_rows_in_file_by_name(
+                        self.project_root, python_file_path, parser, source
+                    ),
+                )
+            )
+            if len(batch) >= UPDATE_BATCH_FILES:
+                self._write_batch(batch)
+                batch.clear()
+        self._write_batch(batch)
+        if index_update.partial:
+            # The files not checked yet are left as they are, not removed.
+            return index_update
+
+        with self.conn:
+            # files left are not in the project anymore
+            for python_file_path in indexed_files:
+                index_update.removed += 1
+                self._remove_file(python_file_path)
+
+            self.conn.execute("DELETE FROM totals WHERE count <= 0")
+
+        return index_update
+
+    def _write_batch(self, batch: list[_FileWrite]):
+        """Write the re-read files in one transaction. Each is consistent with the totals after the commit."""
+        with self.conn:
+            for python_file_path, stat, file_hash, rows_by_name in batch:
+                if rows_by_name is None:
+                    self.conn.execute(
+                        "UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?",
+                        (stat.st_mtime_ns, stat.st_size, python_file_path),
+                    )
+                    continue
+                # Whether the file is indexed is checked again here, as another process
+                # (e.g. the update in the background) may have added it since `update()` listed the index.
+                self._remove_file(python_file_path)
+                self._add_file(
+                    python_file_path,
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                    file_hash,
+                    rows_by_name,
+                )
+
+    def _add_file(
+        self,
+        python_file_path: str,
+        mtime_ns: int,
+        size: int,
+        file_hash: str,
+        name_to_import_statement_to_rows: dict[str, dict[str, list[int]]],
+    ):
+        rows = [
+            (python_file_path, name, statement, len(import_rows), min(import_rows))
+            for name, statement_to_rows in name_to_import_statement_to_rows.items()
+            for statement, import_rows in statement_to_rows.items()
+        ]
+        self.conn.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?)",
+            (python_file_path, mtime_ns, size, file_hash),
+        )
+        self.conn.executemany("INSERT INTO imports VALUES (?, ?, ?, ?, ?)", rows)
+        self.conn.executemany(
+            """
+            INSERT INTO totals VALUES (?, ?, ?)
+            ON CONFLICT (name, statement) DO UPDATE SET count = count + excluded.count
+            """,
+            ((name, statement, count) for _, name, statement, count, _ in rows),
+        )
+
+    def _remove_file(self, python_file_path: str):
+        rows = self.conn.execute(
+            "SELECT name, statement, count FROM imports WHERE path = ?",
+            (python_file_path,),
+        ).fetchall()
+        self.conn.executemany(
+            "UPDATE totals SET count = count - ? WHERE name = ? AND statement = ?",
+            ((count, name, statement) for name, statement, count in rows),
+        )
+        self.conn.execute("DELETE FROM imports WHERE path = ?", (python_file_path,))
+        self.conn.execute("DELETE FROM files WHERE path = ?", (python_file_path,))
+
+    def count(self, name: str, limit: int | None = None) -> dict[str, int]:
+        """
+        Return the import statements found with the name, in descending order of count.
+
+        With `limit`, only the top `limit` statements.
+        """
+        return dict(
+            self.conn.execute(
+                "SELECT statement, count FROM totals WHERE name = ? AND count > 0 ORDER BY count DESC LIMIT ?",
+                (name, -1 if limit is None else limit),
+            ).fetchall()
+        )
+
+    def count_with_examples(
+        self, name: str, limit: int | None = None
+    ) -> list[ImportCount]:
+        """
+        Same as `count()`, with a file and row where each statement is used.
+        """
+        import_counts = []
+        for statement, count in self.count(name, limit).items():
+            path, row = self.conn.execute(
+                "SELECT path, row FROM imports WHERE name = ? AND statement = ? ORDER BY path LIMIT 1",
+                (name, statement),
+            ).fetchone()
+            import_counts.append(ImportCount(statement, count, path, row))
+        return import_counts
+
+    def iter_file_counts(self, name: str) -> Iterator[tuple[str, str, int, int, int]]:
+        """
+        Yield (path, import statement, count, first row, mtime_ns of the file) of each file
+        with import statements found with the name, e.g. to rank them by where they are used.
+        """
+        yield from self.conn.execute(
+            """
+            SELECT imports.path, statement, count, row, mtime_ns FROM imports
+            JOIN files ON files.path = imports.path
+            WHERE name = ?
+            """,
+            (name,),
+        )
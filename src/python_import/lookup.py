@@ -0,0 +1,150 @@
+"""
+Pre-defined import statements of well-known names (e.g. `np` -> `import numpy as np`).
+
+The tables are defined in `lua/python_import/lookup_table.lua` and extended in the plugin options.
+The plugin sends the merged tables to `python-import lookup compile`,
+which compiles them into a single word -> statements dict, stored as a marshal file in the cache dir,
+so that the cli and the server find a name with one dict lookup, without ripgrep.
+
+Only `python-import lookup get` and the server's `lookup` read it. `count` is the count of the imports in the project,
+and doesn't answer from the table. The plugin looks up the same tables in memory before counting.
+"""
+
+from __future__ import annotations
+
+import marshal
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .cache_dir import get_cache_dir
+
+if TYPE_CHECKING:
+    from os import PathLike
+
+# Bump this when the compiled format changes. Old files are then ignored until compiled again.
+LOOKUP_TABLE_VERSION = 1
+
+
+def get_lookup_table_path() -> Path:
+    return get_cache_dir() / "lookup-table.marshal"
+
+
+def compile_lookup_table(tables: dict[str, Any]) -> dict[str, list[str]]:
+    """
+    Compile the lookup tables of the plugin into word -> import statements.
+
+    When a word is in several tables, the same table wins as in the plugin:
+    `statement_after_imports`, then `import`, `import_as` and `import_from`.
+
+    Examples:
+    >>> word_to_statements = compile_lookup_table(
+    ...     {
+    ...         "import": ["os"],
+    ...         "import_as": {"np": "numpy"},
+    ...         "import_from": {"Path": "pathlib", "os": "my_module"},
+    ...         "statement_after_imports": {"logger": ["import logging", "", "logger = 1"]},
+    ...     }
+    ... )
+    >>> word_to_statements["os"]
+    ['import os']
+    >>> word_to_statements["np"], word_to_statements["Path"]
+    (['import numpy as np'], ['from pathlib import Path'])
+    >>> word_to_statements["logger"]
+    ['import logging', '', 'logger = 1']
+    """
+    word_to_statements: dict[str, list[str]] = {}
+    # lowest priority first, so that the higher ones overwrite
+    for word, module in (tables.get("import_from") or {}).items():
+        word_to_statements[word] = [f"from {module} import {word}"]
+    for word, module in (tables.get("import_as") or {}).items():
+        word_to_statements[word] = [f"import {module} as {word}"]
+    for word in tables.get("import") or []:
+        word_to_statements[word] = [f"import {word}"]
+    for word, statements in (tables.get("statement_after_imports") or {}).items():
+        word_to_statements[word] = list(statements)
+    return word_to_statements
+
+
+def write_lookup_table(
+    word_to_statements: dict[str, list[str]],
+    path: str | PathLike | None = None,
+) -> Path:
+    """
+    Write the compiled lookup table, replacing the old one at once.
+    """
+    path = Path(path) if path is not None else get_lookup_table_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp_path.open("wb") as f:
+        marshal.dump((LOOKUP_TABLE_VERSION, word_to_statements), f)
+    tmp_path.replace(path)
+    return path
+
+
+def read_lookup_table(path: str | PathLike | None = None) -> dict[str, list[str]]:
+    """
+    Read the compiled lookup table. It's empty if it was never compiled or is of an old version.
+    """
+    path = Path(path) if path is not None else get_lookup_table_path()
+    try:
+        with path.open("rb") as f:
+            version, word_to_statements = marshal.load(f)
+    except (FileNotFoundError, EOFError, ValueError, TypeError):
+        return {}
+    if version != LOOKUP_TABLE_VERSION:
+        return {}
+    return word_to_statements
+
+
+class LookupTable:
+    """
+    The compiled lookup table, read again only when the file changes (e.g. in the server).
+    """
+
+    def __init__(self, path: str | PathLike | None = None):
+        self.path = Path(path) if path is not None else get_lookup_table_path()
+        self._mtime_ns: int | None = None
+        self._word_to_statements: dict[str, list[str]] = {}
+
+    def get(self, word: str) -> list[str] | None:
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if mtime_ns != self._mtime_ns:
+            self._word_to_statements = read_lookup_table(self.path)
+            self._mtime_ns = mtime_ns
+        return self._word_to_statements.get(word)
+
+
+def lookup_module_name(
+    module_name: str,
+    lookup_table: LookupTable,
+    env_index: LookupTable | None = None,
+) -> dict[str, Any]:
+    """
+    Find the import statements of a name in the compiled lookup table, then in the environment's index.
+
+    From the environment's index (see `python_import.env`), only the most popular candidate is returned.
+
+    Returns:
+        e.g. {"module_name": "np", "statements": ["import numpy as np"], "source": "lookup_table"}
+        The statements and source are None if the name is not found.
+    """
+    statements = lookup_table.get(module_name)
+    if statements is not None:
+        return {
+            "module_name": module_name,
+            "statements": statements,
+            "source": "lookup_table",
+        }
+    if env_index is not None:
+        candidates = env_index.get(module_name)
+        if candidates:
+            return {
+                "module_name": module_name,
+                "statements": candidates[:1],
+                "source": "env",
+            }
+    return {"module_name": module_name, "statements": None, "source": None}
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import chain, islice
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from .stats import Stats, collect_stats, get_stats
+from .tree_cache import get_tree_cache
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+    from tree_sitter import Parser
+
+T = TypeVar("T")
+
+# Spawning a worker (and loading the tree-sitter grammar in it) costs more than parsing a few files,
+# so each worker should get at least this many files.
+MIN_FILES_PER_WORKER = 16
+
+_worker_parser: Parser | None = None
+
+
+def imap_with_parser(
+    func: Callable[..., T],
+    kwargs_iterable: Iterable[dict[str, Any]],
+    parser: Parser,
+    jobs: int,
+    *,
+    deadline: float | None = None,
+) -> Iterator[T]:
+    """
+    Yield `func(parser=parser, **kwargs)` for each kwargs, in the same order.
+
+    The calls are spread over `jobs` worker processes (0: number of CPUs, 1: no worker processes),
+    each with its own parser. `func` has to be picklable, i.e. defined at module level.
+
+    `kwargs_iterable` can be a stream (e.g. ripgrep output). The calls start as soon as the kwargs arrive,
+    and the results are yielded as soon as they (and all the results before them) are ready.
+
+    With `deadline` (a `time.perf_counter()` value), it stops yielding when the time is up,
+    even while waiting for a worker (whose calls are then abandoned).
+    A call in this process (e.g. with `jobs=1`) can't be interrupted, so the deadline is checked before each.
+
+    While a tree cache is in use (see `python_import.tree_cache`), all calls run in this process.
+    """
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    if get_tree_cache() is not None:
+        # The trees parsed in worker processes can't be reused, so parse in this process.
+        jobs = 1
+
+    kwargs_iterator = iter(kwargs_iterable)
+    first_kwargs_list = []
+    for kwargs in islice(kwargs_iterator, jobs * MIN_FILES_PER_WORKER):
+        first_kwargs_list.append(kwargs)
+        if _is_past(deadline):
+            break
+    num_workers = min(jobs, math.ceil(len(first_kwargs_list) / MIN_FILES_PER_WORKER))
+
+    if num_workers <= 1:
+        for kwargs in chain(first_kwargs_list, kwargs_iterator):
+            if _is_past(deadline):
+                return
+            yield func(parser=parser, **kwargs)
+        return
+
+    stats = get_stats()
+
+    def pop_results() -> list[T]:
+        results, worker_stats = futures.popleft().result()
+        if stats is not None and worker_stats is not None:
+            stats.merge(worker_stats)
+        return results
+
+    executor = ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker)
+    timed_out = False
+    try:
+        futures: deque[Future[tuple[list[T], Stats | None]]] = deque()
+        for kwargs_batch in _batched(
+            chain(first_kwargs_list, kwargs_iterator), MIN_FILES_PER_WORKER
+        ):
+            if _is_past(deadline):
+                timed_out = True
+                return
+            futures.append(
+                executor.submit(
+                    _call_with_worker_parser,
+                    func,
+                    kwargs_batch,
+                    collect_worker_stats=stats is not None,
+                )
+            )
+            while futures and futures[0].done():
+                yield from pop_results()
+
+        while futures:
+            if deadline is not None:
+                wait(
+                    [futures[0]],
+                    timeout=max(deadline - time.perf_counter(), 0),
+                    return_when=FIRST_COMPLETED,
+                )
+                if not futures[0].done():
+                    timed_out = True
+                    return
+            yield from pop_results()
+    finally:
+        # Don't wait for the running calls (e.g. parsing a huge file) to finish, at exit either.
+        processes = list(executor._processes.values()) if timed_out else []
+        # The caller may stop early.
+        executor.shutdown(wait=not timed_out, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+
+def _is_past(deadline: float | None) -> bool:
+    return deadline is not None and time.perf_counter() >= deadline
+
+
+def _batched(iterable: Iterable[T], n: int) -> Iterator[list[T]]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, n)):
+        yield batch
+
+
+def _init_worker():
+    # Parser can't be pickled, so each worker makes its own.
+    global _worker_parser  # noqa: PLW0603
+
+    import tree_sitter_python as tspython
+    from tree_sitter import Language, Parser
+
+    _worker_parser = Parser(Language(tspython.language()))
+
+
+def _call_with_worker_parser(
+    func: Callable[..., T],
+    kwargs_batch: list[dict[str, Any]],
+    *,
+    collect_worker_stats: bool,
+) -> tuple[list[T], Stats | None]:
+    assert _worker_parser is not None
+    if not collect_worker_stats:
+        return [func(parser=_worker_parser, **kwargs) for kwargs in kwargs_batch], None
+
+    # The stats are recorded in the worker, and merged into the caller's stats.
+    with collect_stats() as worker_stats:
+        results = [func(parser=_worker_parser, **kwargs) for kwargs in kwargs_batch]
+    return results, worker_stats
@@ -0,0 +1,164 @@
+"""
+Which files of a project are searched and indexed, set in the `[tool.python-import]` section of its pyproject.toml.
+
+```toml
+[tool.python-import]
+# Only search these. gitignore-style patterns, relative to the project root.
+include = ["/src", "/tests"]
+# Never search these, e.g. vendored code and generated stubs that are not gitignored.
+exclude = ["/third_party/", "*_pb2.py", "*_pb2.pyi"]
+# Skip larger files (bytes, or with a K/M/G suffix).
+max-file-size = "1M"
+# A monorepo of many packages sharing one index. See `python_import.workspace`.
+workspace = true
+```
+
+The rules are applied on top of .gitignore while listing the files, so the excluded files are never read.
+The `--exclude` option of the cli adds to `exclude`.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from os import PathLike
+
+logger = logging.getLogger(__name__)
+
+_SIZE_RE = re.compile(r"(\d+)\s*([KMG]?)B?", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_size(size: str | int) -> int:
+    """
+    Parse a file size like 1M, 512K or 1000 (bytes) to bytes.
+
+    Examples:
+    >>> parse_size("1M")
+    1048576
+    >>> parse_size("512k")
+    524288
+    >>> parse_size(1000)
+    1000
+    """
+    if isinstance(size, int):
+        return size
+    match = _SIZE_RE.fullmatch(size.strip())
+    if match is None:
+        msg = f"Invalid file size: {size!r}. Use e.g. 1M, 512K or 1000 (bytes)."
+        raise ValueError(msg)
+    return int(match[1]) * _SIZE_UNITS[match[2].upper()]
+
+
+@dataclass(frozen=True)
+class ProjectConfig:
+    include: tuple[str, ...] = ()
+    """If not empty, only the files matching any of these are searched."""
+    exclude: tuple[str, ...] = ()
+    max_file_size: int | None = None
+    """In bytes."""
+    workspace: bool = False
+    workspace_members: tuple[str, ...] | None = None
+    """Globs of the package roots in the workspace. None to find them by their pyproject.toml."""
+
+    def with_exclude(self, exclude: Sequence[str]) -> ProjectConfig:
+        if not exclude:
+            return self
+        return replace(self, exclude=(*self.exclude, *exclude))
+
+    def get_ignore_lines(self) -> list[str]:
+        """
+        Return the include and exclude patterns as the lines of an ignore file, for ripgrep and the built-in search.
+
+        Examples:
+        >>> ProjectConfig(include=("/src", "tests/"), exclude=("*_pb2.py",)).get_ignore_lines()
+        ['/**', '!/**/', '!/src', '!/src/**', '!tests', '!**/tests/**', '*_pb2.py']
+        """
+        lines = []
+        if self.include:
+            # Ignore every file, but keep walking the directories to find the included ones.
+            lines += ["/**", "!/**/"]
+            for pattern in self.include:
+                pattern = pattern.rstrip("/")
+                # the pattern itself, or everything in it if it's a directory.
+                # A name without a slash matches at any depth, which `name/**` wouldn't.
+                children = f"{pattern}/**" if "/" in pattern else f"**/{pattern}/**"
+                lines += [f"!{pattern}", f"!{children}"]
+        # later lines win
+        lines += self.exclude
+        return lines
+
+
+def _read_pyproject_toml(pyproject_path: Path) -> dict[str, Any] | None:
+    try:
+        with pyproject_path.open("rb") as f:
+            content = f.read()
+    except OSError:
+        return None
+
+    try:
+        import tomllib
+    except ImportError:
+        # Python < 3.11. A dependency, but it may be missing from e.g. a hand-made environment.
+        try:
+            import tomli as tomllib
+        except ImportError:
+            if b"[tool.python-import" in content:
+                logger.warning(
+                    f"[tool.python-import] of {pyproject_path} is ignored. Install tomli to read it."
+                )
+            return None
+
+    try:
+        return tomllib.loads(content.decode("utf-8"))
+    except (UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+        if b"[tool.python-import" in content:
+            logger.warning(f"[tool.python-import] of {pyproject_path} is ignored: {e}")
+        return None
+
+
+def load_project_config(project_root: str | PathLike) -> ProjectConfig:
+    """
+    Read `[tool.python-import]` of the project's pyproject.toml.
+
+    The default (search everything not gitignored) if the project has no such section,
+    or if pyproject.toml can't be read (with a warning if it has the section).
+    """
+    pyproject = _read_pyproject_toml(Path(project_root) / "pyproject.toml")
+    if pyproject is None:
+        return ProjectConfig()
+    tool = pyproject.get("tool", {})
+    section = tool.get("python-import", {})
+
+    for key in ("include", "exclude", "workspace-members"):
+        patterns = section.get(key, [])
+        if not isinstance(patterns, list) or not all(
+            isinstance(pattern, str) for pattern in patterns
+        ):
+            msg = f"[tool.python-import] {key} in pyproject.toml has to be a list of strings."
+            raise ValueError(msg)
+    if section.get("workspace", False) not in (True, False):
+        msg = "[tool.python-import] workspace in pyproject.toml has to be a boolean."
+        raise ValueError(msg)
+
+    workspace_members = section.get("workspace-members")
+    if workspace_members is None:
+        # e.g. members = ["packages/*"]
+        workspace_members = tool.get("uv", {}).get("workspace", {}).get("members")
+    max_file_size = section.get("max-file-size")
+    return ProjectConfig(
+        include=tuple(section.get("include", [])),
+        exclude=tuple(section.get("exclude", [])),
+        max_file_size=None if max_file_size is None else parse_size(max_file_size),
+        # the members alone enable it
+        workspace=bool(section.get("workspace", "workspace-members" in section)),
+        workspace_members=(
+            None if workspace_members is None else tuple(workspace_members)
+        ),
+    )
@@ -0,0 +1,262 @@
+"""
+Rank the import statements of a name by where they are used, not only by how often.
+
+Each file importing a statement weighs
+- 1 / (1 + its directory distance from the file being edited), with `near`, and
+- 1 / (1 + days since it last changed / RECENCY_DAYS), with `recency` ("mtime", or "git" for the last commit).
+
+The score of a statement is the sum of the weights of its uses, so the statement used in the sibling modules
+comes first even if another one is used a bit more often far away.
+Only the top statements are materialized, picked from the scores with a heap.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+import marshal
+import os
+import subprocess
+import time
+from functools import lru_cache
+from operator import itemgetter
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+from .cache_dir import get_cache_dir
+from .utils import ImportCount
+
+if TYPE_CHECKING:
+    from os import PathLike
+
+Recency = Literal["mtime", "git"]
+
+# A file unchanged for this many days weighs half as much as one changed now.
+RECENCY_DAYS = 30
+# With "git" recency, the commits older than this are not read. The files not changed since weigh as if this old.
+GIT_LOG_DAYS = 365
+# and at most this many of the last commits, so that a busy repository is read quickly too.
+GIT_LOG_MAX_COMMITS = 5000
+
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def directory_distance(directory: str, other_directory: str) -> int:
+    """
+    Return the number of directories to go up from one directory and down to the other.
+
+    Examples:
+    >>> directory_distance("/p/src/a", "/p/src/a")
+    0
+    >>> directory_distance("/p/src/a", "/p/src/b")
+    2
+    >>> directory_distance("/p/src/a/x", "/p/src")
+    2
+    """
+    # str, not Path, as it's called for every directory with a match
+    parts = directory.split(os.sep)  # noqa: PTH206
+    other_parts = other_directory.split(os.sep)  # noqa: PTH206
+    common = 0
+    for part, other_part in zip(parts, other_parts):
+        if part != other_part:
+            break
+        common += 1
+    return len(parts) + len(other_parts) - 2 * common
+
+
+def get_git_file_times_path(project_root: str | PathLike) -> Path:
+    project_root_hash = hashlib.sha1(
+        str(Path(project_root).resolve()).encode("utf-8")
+    ).hexdigest()[:16]
+    return get_cache_dir() / f"git-file-times-{project_root_hash}.marshal"
+
+
+def _read_git_log(project_root: str) -> dict[str, float]:
+    git_log = subprocess.run(
+        [
+            "git",
+            "-c",
+            "core.quotePath=false",
+            "log",
+            f"--since={GIT_LOG_DAYS}.days",
+            f"--max-count={GIT_LOG_MAX_COMMITS}",
+            "--format=%x00%ct",
+            "--name-only",
+            "--no-renames",
+            "--relative",
+        ],
+        cwd=project_root,
+        capture_output=True,
+        check=False,
+        stdin=subprocess.DEVNULL,
+    ).stdout.decode("utf-8", "replace")
+
+    file_times: dict[str, float] = {}
+    # newest first. Each commit is "\0<commit time>\n\n<path>\n<path>\n..."
+    for commit in git_log.split("\0")[1:]:
+        commit_time, *paths = commit.splitlines()
+        for path in paths:
+            if path:
+                file_times.setdefault(
+                    os.path.join(project_root, path),  # noqa: PTH118
+                    float(commit_time),
+                )
+    return file_times
+
+
+@lru_cache(maxsize=8)
+def _get_git_file_times(project_root: str, head: str) -> dict[str, float]:
+    # Each cli call is a new process, so the table is also kept in the cache dir until HEAD moves.
+    cache_path = get_git_file_times_path(project_root)
+    try:
+        with cache_path.open("rb") as f:
+            cached_head, file_times = marshal.load(f)
+    except (FileNotFoundError, EOFError, ValueError, TypeError):
+        pass
+    else:
+        if cached_head == head:
+            return file_times
+
+    file_times = _read_git_log(project_root)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    with tmp_path.open("wb") as f:
+        marshal.dump((head, file_times), f)
+    tmp_path.replace(cache_path)
+    return file_times
+
+
+def get_git_file_times(project_root: str | PathLike) -> dict[str, float]:
+    """
+    Return the absolute path to the time (seconds since the epoch) of the last commit that changed the file,
+    for the files of the project changed in the last `GIT_LOG_DAYS` days (and `GIT_LOG_MAX_COMMITS` commits).
+
+    The log is read once per commit of HEAD, and kept in the cache dir for the next processes.
+    Empty if the project is not in a git repository.
+    """
+    project_root = str(Path(project_root).resolve())
+    head = subprocess.run(
+        ["git", "rev-parse", "HEAD"],
+        cwd=project_root,
+        capture_output=True,
+        check=False,
+        stdin=subprocess.DEVNULL,
+    )
+    if head.returncode != 0:
+        return {}
+    return _get_git_file_times(project_root, head.stdout.decode().strip())
+
+
+class ImportRanker:
+    """
+    Sum the weighted uses of the import statements of a name, and return the top ones.
+
+    The example of each statement is its use with the largest weight, e.g. in the nearest file.
+    """
+
+    def __init__(
+        self,
+        project_root: str | PathLike,
+        *,
+        near: str | PathLike | None = None,
+        recency: Recency | None = None,
+        now: float | None = None,
+    ):
+        if recency not in (None, "mtime", "git"):
+            msg = f"Unknown recency: {recency!r}. Use 'mtime' or 'git'."
+            raise ValueError(msg)
+        self.near_dir = (
+            None if near is None else os.path.dirname(Path(near).resolve())  # noqa: PTH120
+        )
+        self.recency = recency
+        self.now = time.time() if now is None else now
+        self._git_file_times = (
+            get_git_file_times(project_root) if recency == "git" else None
+        )
+        self._dir_weights: dict[str, float] = {}
+
+        self._scores: dict[str, float] = {}
+        self._counts: dict[str, int] = {}
+        # statement to (weight, path, row) of its example
+        self._examples: dict[str, tuple[float, str, int]] = {}
+
+    def _get_proximity_weight(self, python_file_path: str) -> float:
+        if self.near_dir is None:
+            return 1.0
+        directory = os.path.dirname(python_file_path)  # noqa: PTH120
+        weight = self._dir_weights.get(directory)
+        if weight is None:
+            weight = self._dir_weights[directory] = 1 / (
+                1 + directory_distance(self.near_dir, directory)
+            )
+        return weight
+
+    def _get_recency_weight(self, python_file_path: str, mtime_ns: int | None) -> float:
+        if self.recency is None:
+            return 1.0
+        if self._git_file_times is not None:
+            changed_time = self._git_file_times.get(
+                python_file_path, self.now - GIT_LOG_DAYS * _SECONDS_PER_DAY
+            )
+        elif mtime_ns is not None:
+            changed_time = mtime_ns / 1e9
+        else:
+            try:
+                changed_time = Path(python_file_path).stat().st_mtime
+            except OSError:
+                # deleted after searching
+                changed_time = self.now
+        age_days = max(self.now - changed_time, 0) / _SECONDS_PER_DAY
+        return 1 / (1 + age_days / RECENCY_DAYS)
+
+    def get_weight(self, python_file_path: str, mtime_ns: int | None = None) -> float:
+        """Return the weight of a use in the file. Pass `mtime_ns` if already known (e.g. from the index)."""
+        return self._get_proximity_weight(python_file_path) * self._get_recency_weight(
+            python_file_path, mtime_ns
+        )
+
+    def add(
+        self,
+        python_file_path: str,
+        statement: str,
+        count: int,
+        row: int,
+        mtime_ns: int | None = None,
+    ) -> None:
+        """Add the `count` uses of the statement in a file, the first at `row`."""
+        weight = self.get_weight(python_file_path, mtime_ns)
+        self._scores[statement] = self._scores.get(statement, 0.0) + weight * count
+        self._counts[statement] = self._counts.get(statement, 0) + count
+        example = self._examples.get(statement)
+        if example is None or weight > example[0]:
+            self._examples[statement] = (weight, python_file_path, row)
+
+    def add_file(
+        self, python_file_path: str, import_statement_to_rows: dict[str, list[int]]
+    ) -> None:
+        for statement, rows in import_statement_to_rows.items():
+            self.add(python_file_path, statement, len(rows), rows[0])
+
+    def top_statements(self, limit: int | None = None) -> list[str]:
+        """Return the top `limit` statements (all if None) in descending order of score."""
+        if limit is None:
+            scores = sorted(self._scores.items(), key=itemgetter(1), reverse=True)
+        else:
+            scores = heapq.nlargest(limit, self._scores.items(), key=itemgetter(1))
+        return [statement for statement, _ in scores]
+
+    def top(self, limit: int | None = None) -> list[ImportCount]:
+        """Same as `top_statements()`, with the count, score and example of each."""
+        import_counts = []
+        for statement in self.top_statements(limit):
+            _, path, row = self._examples[statement]
+            import_counts.append(
+                ImportCount(
+                    statement,
+                    self._counts[statement],
+                    path,
+                    row,
+                    score=round(self._scores[statement], 3),
+                )
+            )
+        return import_counts
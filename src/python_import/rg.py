@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .project_config import load_project_config
+from .stats import get_stats
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
+    from os import PathLike
+
+    from .project_config import ProjectConfig
+
+# Set to "python" to use the built-in search (see `python_import.walk`) even if ripgrep is installed.
+SEARCH_ENV_VAR = "PYTHON_IMPORT_SEARCH"
+
+_IMPORT_KEYWORD_RE = re.compile(r"\bimport\b")
+# A line that only lists names, like the continuation lines of
+# `from a import (\n    b,\n    c as d,\n)` or `import a, \\\n    b`.
+_IMPORT_CONTINUATION_LINE_RE = re.compile(
+    r"""
+    ^\s*\(?\s*
+    (?:[\w.]+(?:\s+as\s+\w+)?\s*,\s*)*   # b, c as d,
+    [\w.]+(?:\s+as\s+\w+)?\s*,?\s*      # e as f,
+    \)?\s*\\?\s*                        # ) or backslash
+    (?:\#.*)?$                           # comment
+    """,
+    re.VERBOSE,
+)
+
+
+def is_possible_import_line(line: str) -> bool:
+    """
+    Return False if no word in the line can be an imported name, without parsing the file.
+
+    It is conservative: a True may still not be an import (e.g. `# import this`),
+    but a line with an imported name is never False.
+
+    Examples:
+    >>> is_possible_import_line("from a import b")
+    True
+    >>> is_possible_import_line("    if TYPE_CHECKING: import b")
+    True
+    >>> is_possible_import_line("    b,  # continuation of `from a import (`")
+    True
+    >>> is_possible_import_line("    b as c)")
+    True
+    >>> is_possible_import_line("    return b")
+    False
+    >>> is_possible_import_line("b = c(d)")
+    False
+    """
+    return bool(
+        _IMPORT_KEYWORD_RE.search(line) or _IMPORT_CONTINUATION_LINE_RE.match(line)
+    )
+
+
+# rg --json writes the fields in a fixed order, e.g.
+# {"type":"match","data":{"path":{"text":"a.py"},"lines":{"text":"import numpy as np\n"},"line_number":1,
+#  "absolute_offset":0,"submatches":[{"match":{"text":"np"},"start":16,"end":18}]}}
+# so the fields we need can be pulled out without decoding the whole record.
+_RG_MATCH_RE = re.compile(
+    rb'\{"type":"match","data":\{"path":\{"text":"([^"\\]*(?:\\.[^"\\]*)*)"\},'
+    rb'"lines":\{"text":"([^"\\]*(?:\\.[^"\\]*)*)"\},"line_number":(\d+),'
+)
+# `{"match":` can't appear in the JSON strings before it, because the quotes in them are escaped.
+_RG_SUBMATCH_RE = re.compile(
+    rb'\{"match":\{"text":"([^"\\]*(?:\\.[^"\\]*)*)"\},"start":(\d+)'
+)
+
+
+def _decode_json_string(raw: bytes) -> str:
+    if b"\\" not in raw:
+        return raw.decode("utf-8")
+    # Most lines only have the escaped newline at the end.
+    if raw.endswith(b"\\n") and b"\\" not in raw[:-2]:
+        return raw[:-2].decode("utf-8") + "\n"
+    return json.loads(b'"' + raw + b'"')
+
+
+def _decode_json_text_or_bytes(data: dict[str, str]) -> str:
+    if "text" in data:
+        return data["text"]
+    return os.fsdecode(base64.b64decode(data["bytes"]))
+
+
+def _decode_rg_match_slow(
+    line: bytes,
+) -> tuple[str, str | None, int, list[tuple[str, int]]]:
+    # e.g. non-UTF8 path or line, given as base64 "bytes" instead of "text".
+    data = json.loads(line)["data"]
+    path = _decode_json_text_or_bytes(data["path"])
+    line_text = data["lines"].get("text")
+    submatches = [
+        (_decode_json_text_or_bytes(submatch["match"]), submatch["start"])
+        for submatch in data["submatches"]
+    ]
+    return path, line_text, data["line_number"], submatches
+
+
+def iter_rg_json_word_rowcols(
+    rg_json_lines: Iterable[bytes],
+) -> Iterator[tuple[str, dict[str, list[tuple[int, int]]]]]:
+    """
+    Parse `rg --json` output, and yield (file path as printed by ripgrep, matched text to 0-indexed rowcols)
+    of each file.
+
+    Only the "match" records are decoded, and only the path, line text, line number and submatches
+    are pulled out of them. The others ("begin", "context", "summary") are skipped by their prefix.
+    Every submatch of a line is a hit (e.g. both `foo`s in `from foo import foo`).
+    The hits that can't be imports (see `is_possible_import_line()`) are dropped,
+    and files without any hit left are not yielded.
+    """
+    path_raw = b""
+    path = ""
+    # the matched words are mostly the same few
+    raw_to_word: dict[bytes, str] = {}
+    word_rowcols: dict[str, list[tuple[int, int]]] = {}
+    for line in rg_json_lines:
+        if line.startswith(b'{"type":"match"'):
+            # Skip the lines that can't be imports, so that files with no import hits are not read at all.
+            # Non-UTF8 lines are given as base64 "bytes" instead of "text". Keep them to be safe.
+            match = _RG_MATCH_RE.match(line)
+            if match is None or b'{"bytes":' in line:
+                path, line_text, line_number, submatches = _decode_rg_match_slow(line)
+                path_raw = b""
+                if line_text is not None and not is_possible_import_line(line_text):
+                    continue
+            else:
+                if not is_possible_import_line(_decode_json_string(match[2])):
+                    continue
+                if match[1] != path_raw:
+                    path_raw = match[1]
+                    path = _decode_json_string(path_raw)
+                line_number = int(match[3])
+                submatches = []
+                for word_raw, start in _RG_SUBMATCH_RE.findall(line, match.end()):
+                    word = raw_to_word.get(word_raw)
+                    if word is None:
+                        word = raw_to_word[word_raw] = _decode_json_string(word_raw)
+                    submatches.append((word, int(start)))
+
+            for word, start in submatches:
+                # NOTE: rg json outputs are (1, 0)-indexed
+                word_rowcols.setdefault(word, []).append((line_number - 1, start))
+        elif line.startswith(b'{"type":"end"'):
+            if word_rowcols:
+                yield path, word_rowcols
+            word_rowcols = {}
+
+
+def iter_rg_json_rowcols(
+    rg_json_lines: Iterable[bytes],
+) -> Iterator[tuple[str, list[tuple[int, int]]]]:
+    """
+    Same as `iter_rg_json_word_rowcols()`, but with the rowcols of all matched words together.
+    """
+    for path, word_rowcols in iter_rg_json_word_rowcols(rg_json_lines):
+        if len(word_rowcols) == 1:
+            yield path, next(iter(word_rowcols.values()))
+        else:
+            yield (
+                path,
+                [rowcol for rowcols in word_rowcols.values() for rowcol in rowcols],
+            )
+
+
+@cache
+def _find_ripgrep() -> str | None:
+    return shutil.which("rg")
+
+
+def use_ripgrep() -> bool:
+    """
+    Whether to search with ripgrep, i.e. it's installed and the built-in search is not forced with `SEARCH_ENV_VAR`.
+    """
+    return os.environ.get(SEARCH_ENV_VAR) != "python" and _find_ripgrep() is not None
+
+
+@contextmanager
+def rg_project_config_args(project_config: ProjectConfig) -> Iterator[list[str]]:
+    """
+    Yield the ripgrep arguments that apply the include/exclude patterns and the maximum file size.
+
+    The patterns are written to a temporary ignore file for `--ignore-file`, which has the lowest precedence.
+    They can't be `--glob`s, because an included glob would search the files in .gitignore too.
+    Run ripgrep in the project root, which the patterns are relative to.
+    """
+    args = []
+    if project_config.max_file_size is not None:
+        args += ["--max-filesize", str(project_config.max_file_size)]
+    ignore_lines = project_config.get_ignore_lines()
+    if not ignore_lines:
+        yield args
+        return
+
+    with tempfile.TemporaryDirectory(prefix="python-import-") as tmp_dir:
+        ignore_file_path = Path(tmp_dir) / "ignore"
+        ignore_file_path.write_text("".join(f"{line}\n" for line in ignore_lines))
+        yield [*args, "--ignore-file", str(ignore_file_path)]
+
+
+def iter_rg_import_word_rowcols(
+    project_root: str | PathLike,
+    words: Sequence[str],
+    paths: list[str | PathLike] | None = None,
+    *,
+    exclude: Sequence[str] = (),
+) -> Iterator[tuple[str, dict[str, list[tuple[int, int]]]]]:
+    """
+    Search the words in the Python files of the project with a single ripgrep,
+    and yield (absolute file path, word to 0-indexed rowcols) of each file as soon as ripgrep finishes the file.
+
+    The output is streamed, so the memory use doesn't grow with the number of matches,
+    and the caller can start parsing the first file while ripgrep is still searching.
+    See `iter_rg_json_word_rowcols()` for which hits are yielded.
+
+    Pass `paths` to search only the files/directories instead of the whole project.
+    The files excluded by `[tool.python-import]` in pyproject.toml (see `python_import.project_config`)
+    or by the `exclude` patterns are not searched.
+
+    If ripgrep is not installed, the built-in search finds the same (see `python_import.walk`).
+    """
+    project_config = load_project_config(project_root).with_exclude(exclude)
+    if not use_ripgrep():
+        yield from _iter_walk_import_word_rowcols(
+            project_root, words, paths, project_config
+        )
+        return
+
+    project_root = Path(project_root)
+
+    with rg_project_config_args(project_config) as project_config_args:
+        yield from _iter_rg_process_word_rowcols(
+            project_root,
+            [
+                "rg",
+                "--word-regexp",
+                "--fixed-strings",
+                "--json",
+                "--type",
+                "python",
+                *project_config_args,
+                *(arg for word in words for arg in ("-e", word)),
+                *(str(path) for path in paths or []),
+            ],
+        )
+
+
+def _iter_rg_process_word_rowcols(
+    project_root: Path, rg_args: list[str]
+) -> Iterator[tuple[str, dict[str, list[tuple[int, int]]]]]:
+    process = subprocess.Popen(
+        rg_args,
+        cwd=project_root,
+        # rg searches stdin if it's not a tty, e.g. when serving over stdio.
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+    )
+    assert process.stdout is not None
+
+    stats = get_stats()
+    try:
+        # The time the caller spends between the files is not ripgrep's.
+        start = time.perf_counter()
+        for path, word_rowcols in iter_rg_json_word_rowcols(process.stdout):
+            if stats is not None:
+                stats.add_seconds("ripgrep", time.perf_counter() - start)
+                stats.add_count("files_matched")
+                stats.add_count(
+                    "import_hits",
+                    sum(len(rowcols) for rowcols in word_rowcols.values()),
+                )
+            yield str((project_root / path).resolve()), word_rowcols
+            start = time.perf_counter()
+        if stats is not None:
+            stats.add_seconds("ripgrep", time.perf_counter() - start)
+    finally:
+        # The caller may stop early.
+        process.kill()
+        process.stdout.close()
+        process.wait()
+
+
+def iter_rg_import_rowcols(
+    project_root: str | PathLike,
+    word: str,
+    paths: list[str | PathLike] | None = None,
+    *,
+    exclude: Sequence[str] = (),
+) -> Iterator[tuple[str, list[tuple[int, int]]]]:
+    """
+    Search the word in the Python files of the project with ripgrep,
+    and yield (absolute file path, 0-indexed rowcols) of each file as soon as ripgrep finishes the file.
+
+    See `iter_rg_import_word_rowcols()`.
+    """
+    for path, word_rowcols in iter_rg_import_word_rowcols(
+        project_root, [word], paths, exclude=exclude
+    ):
+        yield path, [rowcol for rowcols in word_rowcols.values() for rowcol in rowcols]
+
+
+def _iter_walk_import_word_rowcols(
+    project_root: str | PathLike,
+    words: Sequence[str],
+    paths: list[str | PathLike] | None,
+    project_config: ProjectConfig,
+) -> Iterator[tuple[str, dict[str, list[tuple[int, int]]]]]:
+    from .walk import iter_walk_import_word_rowcols
+
+    stats = get_stats()
+    start = time.perf_counter()
+    for path, word_rowcols in iter_walk_import_word_rowcols(
+        project_root, words, paths, project_config=project_config
+    ):
+        if stats is not None:
+            stats.add_seconds("search", time.perf_counter() - start)
+            stats.add_count("files_matched")
+            stats.add_count(
+                "import_hits", sum(len(rowcols) for rowcols in word_rowcols.values())
+            )
+        yield path, word_rowcols
+        start = time.perf_counter()
+    if stats is not None:
+        stats.add_seconds("search", time.perf_counter() - start)
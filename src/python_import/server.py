@@ -0,0 +1,384 @@
+from __future__ import annotations
+
+import inspect
+import io
+import json
+import logging
+import os
+import socketserver
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any
+
+import python_import
+
+from .count import count_imports_of_words_with_examples, count_top_imports
+from .env import get_default_python, get_env_index_path
+from .index import ImportIndex, get_index_path
+from .lookup import LookupTable, lookup_module_name
+from .stats import collect_stats
+from .tree_cache import DEFAULT_TREE_CACHE_BYTES, TreeCache, use_tree_cache
+from .utils import ImportCount, get_relative_import_resolver
+from .workspace import get_workspace_root
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from os import PathLike
+
+    from tree_sitter import Parser
+
+    from .ranking import Recency
+
+logger = logging.getLogger(__name__)
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class ImportServer:
+    """
+    JSON-RPC 2.0 server that keeps the parser and the project indices warm between lookups.
+
+    Each request and response is a single line of JSON, e.g.
+
+    --> {"jsonrpc": "2.0", "id": 1, "method": "count", "params": {"project_root": "/path", "module_name": "np"}}
+    <-- {"jsonrpc": "2.0", "id": 1, "result": [{"statement": "import numpy as np", "count": 4, ...}]}
+    """
+
+    def __init__(
+        self,
+        parser: Parser,
+        *,
+        collect_stats: bool = False,
+        tree_cache_bytes: int = DEFAULT_TREE_CACHE_BYTES,
+    ):
+        self.parser = parser
+        self.collect_stats = collect_stats
+        self._last_stats: dict[str, Any] | None = None
+        self.shutdown_requested = False
+        self._indices: dict[Path, ImportIndex] = {}
+        # (st_dev, st_ino) of each index file when it was opened
+        self._index_file_ids: dict[Path, tuple[int, int]] = {}
+        # See `_get_layout_stamp()`.
+        self._layout_stamps: dict[Path, dict[str, int | None]] = {}
+        self._lookup_table = LookupTable()
+        self._env_indices: dict[str, LookupTable] = {}
+        # The trees of the hot files are reused for the next lookups (of any word).
+        self._tree_cache = TreeCache(tree_cache_bytes) if tree_cache_bytes > 0 else None
+        # The socket server handles each connection in a thread,
+        # but the parser and the sqlite connections are not thread-safe.
+        self._lock = threading.Lock()
+
+    def close(self):
+        for index in self._indices.values():
+            index.close()
+        self._indices.clear()
+        self._index_file_ids.clear()
+
+    def _get_index(self, project_root: Path) -> ImportIndex | None:
+        """
+        Return the open index of the project, or None if it has none (or it can't be opened).
+
+        `python-import index build` replaces the index file when done,
+        so the connection to the previous (unlinked) file is reopened.
+        """
+        project_root = project_root.resolve()
+        try:
+            stat = get_index_path(project_root).stat()
+        except FileNotFoundError:
+            self._close_index(project_root)
+            return None
+
+        file_id = (stat.st_dev, stat.st_ino)
+        index = self._indices.get(project_root)
+        if index is not None:
+            if self._index_file_ids[project_root] == file_id:
+                return index
+            self._close_index(project_root)
+
+        try:
+            index = ImportIndex(project_root, check_same_thread=False)
+        except sqlite3.OperationalError as e:
+            # e.g. locked by an update in the background. `count` searches the project instead.
+            logger.warning(f"The index of {project_root} is not available ({e}).")
+            return None
+        self._indices[project_root] = index
+        self._index_file_ids[project_root] = file_id
+        return index
+
+    def _close_index(self, project_root: Path) -> None:
+        index = self._indices.pop(project_root, None)
+        if index is not None:
+            index.close()
+            del self._index_file_ids[project_root]
+
+    def ping(self) -> str:
+        return "pong"
+
+    def version(self) -> str:
+        return python_import.__version__
+
+    def shutdown(self) -> None:
+        self.shutdown_requested = True
+
+    def stats(self) -> dict[str, Any] | None:
+        """
+        Return the stats of the last `count`/`count_many`, or None if the server was not started with `--stats`.
+        """
+        return self._last_stats
+
+    def lookup(
+        self, module_names: list[str], python: str | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Same as `python-import lookup get`.
+
+        Returns:
+            [{"module_name": "np", "statements": ["import numpy as np"], "source": "lookup_table"}, ...]
+        """
+        if python is None:
+            python = get_default_python()
+        env_index = self._env_indices.get(python)
+        if env_index is None:
+            env_index = self._env_indices[python] = LookupTable(
+                get_env_index_path(python)
+            )
+        return [
+            lookup_module_name(module_name, self._lookup_table, env_index)
+            for module_name in module_names
+        ]
+
+    def count(
+        self,
+        project_root: str | PathLike,
+        module_name: str,
+        *,
+        limit: int | None = None,
+        max_time: float | None = None,
+        use_index: bool = True,
+        update_index: bool = True,
+        exclude: list[str] | None = None,
+        near: str | None = None,
+        recency: Recency | None = None,
+        jobs: int = 0,
+    ) -> list[dict[str, Any]]:
+        """
+        Same as `python-import count --format jsonl`. `max_time` is in seconds.
+        """
+        project_root = get_workspace_root(project_root)
+        with self._lookup(project_root):
+            import_counts, partial = count_top_imports(
+                project_root,
+                module_name,
+                self.parser,
+                limit=limit,
+                max_time=max_time,
+                use_index=use_index,
+                update_index=update_index,
+                index=self._get_index(project_root) if use_index else None,
+                exclude=exclude or (),
+                near=near,
+                recency=recency,
+                jobs=jobs,
+            )
+        return [
+            import_count | {"partial": partial}
+            for import_count in _import_counts_to_json(import_counts)
+        ]
+
+    def count_many(
+        self,
+        project_root: str | PathLike,
+        module_names: list[str],
+        *,
+        use_index: bool = True,
+        update_index: bool = True,
+        exclude: list[str] | None = None,
+        jobs: int = 0,
+    ) -> list[dict[str, Any]]:
+        """
+        Same as `count` for many names, with a single ripgrep search.
+
+        Returns:
+            [{"module_name": "np", "imports": [{"statement": "import numpy as np", "count": 4, ...}]}, ...]
+        """
+        project_root = get_workspace_root(project_root)
+        with self._lookup(project_root):
+            name_to_import_counts = count_imports_of_words_with_examples(
+                project_root,
+                module_names,
+                self.parser,
+                use_index=use_index,
+                update_index=update_index,
+                index=self._get_index(project_root) if use_index else None,
+                exclude=exclude or (),
+                jobs=jobs,
+            )
+        return [
+            {
+                "module_name": module_name,
+                "imports": _import_counts_to_json(import_counts),
+            }
+            for module_name, import_counts in name_to_import_counts.items()
+        ]
+
+    @contextmanager
+    def _lookup(self, project_root: Path) -> Iterator[None]:
+        # The relative imports resolved for the previous requests are reused, unless the layout changed.
+        project_root = project_root.resolve()
+        layout_stamp = self._layout_stamps.get(project_root)
+        if layout_stamp is not None and any(
+            _get_mtime_ns(path) != mtime_ns for path, mtime_ns in layout_stamp.items()
+        ):
+            get_relative_import_resolver.cache_clear()
+            self._layout_stamps.clear()
+
+        try:
+            with use_tree_cache(self._tree_cache):
+                if not self.collect_stats:
+                    yield
+                    return
+
+                with collect_stats() as stats, stats.timer("total"):
+                    yield
+                self._last_stats = stats.to_dict()
+        finally:
+            # after the request, to include the directories it resolved
+            self._layout_stamps[project_root] = _get_layout_stamp(project_root)
+
+    def handle_request(self, request: Any) -> dict[str, Any] | None:
+        """
+        Handle a decoded JSON-RPC request. Return None for notifications (requests without id).
+        """
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return _error_response(None, INVALID_REQUEST, "Invalid Request")
+
+        request_id = request.get("id")
+        method_name = request["method"]
+        params = request.get("params", {})
+
+        method = {
+            "ping": self.ping,
+            "version": self.version,
+            "shutdown": self.shutdown,
+            "count": self.count,
+            "count_many": self.count_many,
+            "lookup": self.lookup,
+            "stats": self.stats,
+        }.get(method_name)
+
+        if method is None:
+            response = _error_response(
+                request_id, METHOD_NOT_FOUND, f"Method not found: {method_name}"
+            )
+        else:
+            response = self._call(request_id, method_name, method, params)
+
+        if "id" not in request:
+            return None
+        return response
+
+    def _call(
+        self, request_id: Any, method_name: str, method: Callable, params: Any
+    ) -> dict[str, Any]:
+        try:
+            if isinstance(params, list):
+                bound_args = inspect.signature(method).bind(*params)
+            else:
+                bound_args = inspect.signature(method).bind(**params)
+        except TypeError as e:
+            return _error_response(request_id, INVALID_PARAMS, str(e))
+
+        try:
+            with self._lock:
+                result = method(*bound_args.args, **bound_args.kwargs)
+        except Exception as e:
+            logger.exception(f"Error while handling {method_name}")
+            return _error_response(request_id, INTERNAL_ERROR, str(e))
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def serve(self, rfile: IO[str], wfile: IO[str]) -> None:
+        """
+        Serve line-delimited JSON-RPC requests until EOF or `shutdown`.
+        """
+        for line in rfile:
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                response = _error_response(None, PARSE_ERROR, str(e))
+            else:
+                response = self.handle_request(request)
+
+            if response is not None:
+                wfile.write(json.dumps(response, separators=(",", ":")) + "\n")
+                wfile.flush()
+
+            if self.shutdown_requested:
+                break
+
+    def serve_unix_socket(self, socket_path: str | PathLike) -> None:
+        """
+        Serve on a Unix socket. Each connection is served like stdio.
+        """
+        import_server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                import_server.serve(
+                    io.TextIOWrapper(self.rfile, encoding="utf-8"),
+                    io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=True),
+                )
+                if import_server.shutdown_requested:
+                    threading.Thread(target=self.server.shutdown).start()
+
+        socket_path = Path(socket_path)
+        socket_path.unlink(missing_ok=True)
+        with socketserver.ThreadingUnixStreamServer(
+            str(socket_path), Handler
+        ) as server:
+            try:
+                server.serve_forever()
+            finally:
+                socket_path.unlink(missing_ok=True)
+
+
+def _get_mtime_ns(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns  # noqa: PTH116
+    except FileNotFoundError:
+        return None
+
+
+def _get_layout_stamp(project_root: Path) -> dict[str, int | None]:
+    """
+    Return the mtimes that change with the layout the relative imports are resolved with:
+    the project root (e.g. src/ created or removed), its pyproject.toml (e.g. the workspace members),
+    and in a workspace, the directories of the files resolved so far up to the workspace root
+    (e.g. a pyproject.toml or src/ created in a member package).
+    """
+    paths = [
+        str(project_root / "pyproject.toml"),
+        *get_relative_import_resolver(project_root).iter_layout_directories(),
+    ]
+    return {path: _get_mtime_ns(path) for path in paths}
+
+
+def _import_counts_to_json(import_counts: list[ImportCount]) -> list[dict[str, Any]]:
+    return [import_count.to_json() for import_count in import_counts]
+
+
+def _error_response(request_id: Any, code: int, message: str) -> dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {"code": code, "message": message},
+    }
@@ -0,0 +1,85 @@
+"""
+Wall time and counts per stage of a lookup (ripgrep, file reading, parsing, ...).
+
+Nothing is recorded unless it is enabled with `collect_stats()`,
+so the instrumented code only pays for a `None` check otherwise.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from contextlib import AbstractContextManager
+
+# Set to 1 to enable `--stats` of the cli commands.
+STATS_ENV_VAR = "PYTHON_IMPORT_STATS"
+
+
+@dataclass
+class Stats:
+    seconds: dict[str, float] = field(default_factory=dict)
+    """Wall time spent in each stage."""
+    counts: dict[str, int] = field(default_factory=dict)
+    """e.g. files_read, bytes_read, nodes_visited."""
+
+    @contextmanager
+    def timer(self, stage_name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_seconds(stage_name, time.perf_counter() - start)
+
+    def add_seconds(self, stage_name: str, seconds: float) -> None:
+        self.seconds[stage_name] = self.seconds.get(stage_name, 0.0) + seconds
+
+    def add_count(self, name: str, n: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def merge(self, other: Stats) -> None:
+        """Add the stats of e.g. a worker process."""
+        for stage_name, seconds in other.seconds.items():
+            self.add_seconds(stage_name, seconds)
+        for name, n in other.counts.items():
+            self.add_count(name, n)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"seconds": dict(self.seconds), "counts": dict(self.counts)}
+
+
+_stats: Stats | None = None
+_null_context = nullcontext()
+
+
+def get_stats() -> Stats | None:
+    """Return the stats being collected, or None if disabled."""
+    return _stats
+
+
+@contextmanager
+def collect_stats() -> Iterator[Stats]:
+    """Record the stats of everything called inside the context."""
+    global _stats  # noqa: PLW0603
+    previous_stats = _stats
+    _stats = Stats()
+    try:
+        yield _stats
+    finally:
+        _stats = previous_stats
+
+
+def stage(stage_name: str) -> AbstractContextManager[Any]:
+    """Time the block as a stage if the stats are enabled."""
+    if _stats is None:
+        return _null_context
+    return _stats.timer(stage_name)
+
+
+def add_count(name: str, n: int = 1) -> None:
+    if _stats is not None:
+        _stats.add_count(name, n)
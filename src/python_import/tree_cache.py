@@ -0,0 +1,94 @@
+"""
+LRU cache of parsed trees, so that a long-running process (`python-import serve`) doesn't parse
+the same files again for every lookup.
+
+A tree is reused only while the file's mtime and size stay the same.
+Nothing is cached unless it is enabled with `use_tree_cache()`.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from .stats import add_count
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    import tree_sitter
+
+# A tree takes a few times the size of its source. 64 MiB of source is about 10k files of 6 KiB.
+DEFAULT_TREE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class TreeCache:
+    """
+    Parsed trees by file path, evicting the least recently used ones
+    once the total size of their sources exceeds `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_TREE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        # path -> (mtime_ns, size, tree), least recently used first
+        self._trees: OrderedDict[str, tuple[int, int, tree_sitter.Tree]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._trees)
+
+    def get(self, path: str, mtime_ns: int, size: int) -> tree_sitter.Tree | None:
+        """Return the tree of the file if it hasn't changed since it was cached."""
+        cached = self._trees.get(path)
+        if cached is None or cached[:2] != (mtime_ns, size):
+            self.misses += 1
+            add_count("tree_cache_misses")
+            return None
+        self._trees.move_to_end(path)
+        self.hits += 1
+        add_count("tree_cache_hits")
+        return cached[2]
+
+    def put(self, path: str, mtime_ns: int, size: int, tree: tree_sitter.Tree) -> None:
+        """Cache the tree of the file. `size` is the size of the source it was parsed from."""
+        self.pop(path)
+        if size > self.max_bytes:
+            return
+        self._trees[path] = (mtime_ns, size, tree)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._trees.popitem(last=False)
+            self.nbytes -= evicted_size
+            add_count("tree_cache_evictions")
+
+    def pop(self, path: str) -> None:
+        cached = self._trees.pop(path, None)
+        if cached is not None:
+            self.nbytes -= cached[1]
+
+    def clear(self) -> None:
+        self._trees.clear()
+        self.nbytes = 0
+
+
+_tree_cache: TreeCache | None = None
+
+
+def get_tree_cache() -> TreeCache | None:
+    """Return the tree cache in use, or None if disabled."""
+    return _tree_cache
+
+
+@contextmanager
+def use_tree_cache(tree_cache: TreeCache | None) -> Iterator[TreeCache | None]:
+    """Reuse the trees of the cache for every file parsed inside the context."""
+    global _tree_cache  # noqa: PLW0603
+    previous_tree_cache = _tree_cache
+    _tree_cache = tree_cache
+    try:
+        yield tree_cache
+    finally:
+        _tree_cache = previous_tree_cache
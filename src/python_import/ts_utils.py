@@ -1,12 +1,54 @@
 from __future__ import annotations
 
+from functools import cache
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     import tree_sitter
 
+# Every identifier that `count` would resolve to an import statement.
+# i.e. any part of `import a.b.c`, the alias of `import a as b`,
+# the imported name of `from a import b` and the alias of `from a import b as c`.
+IMPORT_IDENTIFIER_QUERY = """
+(import_statement name: (dotted_name (identifier) @name))
+(import_statement name: (aliased_import alias: (identifier) @name))
+(import_from_statement name: (dotted_name (identifier) @name))
+(import_from_statement name: (aliased_import alias: (identifier) @name))
+"""
+
+# Every imported name, captured by the kind of the import statement.
+IMPORT_QUERY = """
+(import_statement name: (dotted_name) @import)
+(import_statement name: (aliased_import alias: (identifier) @import_as))
+(import_from_statement name: (dotted_name) @from_import)
+(import_from_statement name: (aliased_import alias: (identifier) @from_import_as))
+"""
+
 
 def get_node(tree: tree_sitter.Tree, row_col: tuple[int, int]):
     named_node = tree.root_node.named_descendant_for_point_range(row_col, row_col)
     # named_node = tree.root_node.descendant_for_point_range((row, col), (row, col))
     return named_node
+
+
+@cache
+def get_query(language: tree_sitter.Language, source: str) -> tree_sitter.Query:
+    from tree_sitter import Query
+
+    return Query(language, source)
+
+
+def query_captures(
+    query: tree_sitter.Query, node: tree_sitter.Node
+) -> dict[str, list[tree_sitter.Node]]:
+    try:
+        from tree_sitter import QueryCursor
+    except ImportError:
+        # tree-sitter < 0.25
+        return query.captures(node)  # type: ignore[attr-defined]
+    return QueryCursor(query).captures(node)
+
+
+def iter_import_identifiers(tree: tree_sitter.Tree):
+    query = get_query(tree.language, IMPORT_IDENTIFIER_QUERY)
+    yield from query_captures(query, tree.root_node).get("name", [])
@@ -1,16 +1,23 @@
 from __future__ import annotations
 
-import json
-import subprocess
+import os
 from collections import defaultdict
+from dataclasses import dataclass
+from functools import cache
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
-from .ts_utils import get_node
+from .rg import iter_rg_import_rowcols
+from .stats import add_count, stage
+from .tree_cache import get_tree_cache
+from .ts_utils import IMPORT_QUERY, get_node, get_query, query_captures
+from .workspace import Workspace
 
 if TYPE_CHECKING:
+    from collections.abc import Iterator
     from os import PathLike
 
+    import tree_sitter
     from tree_sitter import Parser
 
 
@@ -49,30 +56,41 @@ def relative_import_to_absolute_import(
     ... )
     'my_project.api'
     """
-    count_num_dots = 0
-    for i in range(len(from_import_name)):
-        if from_import_name[i] == ".":
-            count_num_dots += 1
-        else:
-            break
-
-    if count_num_dots == 0:
+    if not from_import_name.startswith("."):
         # absolute import
         return from_import_name
 
-    module_path = Path(python_file_path)
-    for _ in range(count_num_dots):
-        module_path = module_path.parent
+    return _relative_import_to_absolute_import(
+        _get_module_root(project_root, check_dir_exists=check_dir_exists),
+        python_file_path,
+        from_import_name,
+    )
 
-    module_path = module_path / from_import_name[count_num_dots:]
 
-    # get relative path from project root or src/ directory in project root
+def _get_module_root(project_root: str | PathLike, *, check_dir_exists: bool) -> Path:
+    """Return the src/ directory in the project root if it exists, otherwise the project root."""
     project_root = Path(project_root)
     if project_root.is_dir() or not check_dir_exists:
         src_dir = project_root / "src"
         if src_dir.is_dir() or not check_dir_exists:
-            project_root = src_dir
+            return src_dir
+    return project_root
+
+
+def _relative_import_to_absolute_import(
+    project_root: Path,
+    python_file_path: str | PathLike,
+    from_import_name: str,
+) -> str:
+    count_num_dots = len(from_import_name) - len(from_import_name.lstrip("."))
+
+    module_path = Path(python_file_path)
+    for _ in range(count_num_dots):
+        module_path = module_path.parent
 
+    module_path = module_path / from_import_name[count_num_dots:]
+
+    # get relative path from project root or src/ directory in project root
     try:
         relative_path = module_path.relative_to(project_root)
     except ValueError:
@@ -87,6 +105,209 @@ def relative_import_to_absolute_import(
     return str(relative_path).replace("/", ".")
 
 
+class RelativeImportResolver:
+    """
+    `relative_import_to_absolute_import()` for many files in a project.
+
+    The src/ layout is checked only once, and the results are memoized per (package directory, relative name),
+    so resolving the relative imports of a whole project makes almost no filesystem calls.
+
+    If the project root is a workspace (see `python_import.workspace`), each file's imports are resolved
+    against the package it belongs to instead.
+    """
+
+    def __init__(self, project_root: str | PathLike):
+        self.project_root = Path(project_root)
+        self._module_root = _get_module_root(self.project_root, check_dir_exists=True)
+        self._workspace = Workspace.from_project_root(self.project_root)
+        self._absolute_import_names: dict[tuple[str, str], str] = {}
+
+    def iter_layout_directories(self) -> Iterator[str]:
+        """
+        Yield the directories whose mtime changes with the layout the memoized results depend on,
+        e.g. when a src/ directory or a pyproject.toml is created in them.
+        """
+        yield str(self.project_root)
+        if self._workspace is not None:
+            yield from self._workspace.iter_resolved_directories()
+
+    def to_absolute(
+        self, python_file_path: str | PathLike, from_import_name: str
+    ) -> str:
+        if not from_import_name.startswith("."):
+            # absolute import
+            return from_import_name
+
+        # str, not Path, to keep the cache lookup cheap
+        key = (os.path.dirname(python_file_path), from_import_name)  # noqa: PTH120
+        absolute_import_name = self._absolute_import_names.get(key)
+        if absolute_import_name is None:
+            module_root = None
+            if self._workspace is not None:
+                module_root = self._workspace.get_module_root(key[0])
+            absolute_import_name = _relative_import_to_absolute_import(
+                module_root or self._module_root, python_file_path, from_import_name
+            )
+            self._absolute_import_names[key] = absolute_import_name
+        return absolute_import_name
+
+
+@cache
+def get_relative_import_resolver(
+    project_root: str | PathLike,
+) -> RelativeImportResolver:
+    """
+    Return the resolver of the project, shared by all files parsed in this process.
+
+    Call `get_relative_import_resolver.cache_clear()` if the project layout may have changed.
+    """
+    return RelativeImportResolver(project_root)
+
+
+def _read_source(python_file_path: str | PathLike) -> bytes:
+    with stage("read"), open(python_file_path) as f:
+        lines: str = f.read()
+    source = bytes(lines, "utf8")
+    add_count("files_read")
+    add_count("bytes_read", len(source))
+    return source
+
+
+def parse_file(python_file_path: str | PathLike, parser: Parser) -> tree_sitter.Tree:
+    """
+    Read and parse a Python file.
+
+    If a tree cache is in use (see `python_import.tree_cache`), the tree of an unchanged file is reused.
+    """
+    tree_cache = get_tree_cache()
+    if tree_cache is None:
+        source = _read_source(python_file_path)
+        with stage("parse"):
+            return parser.parse(source)
+
+    # Stat before reading, so that a change while reading makes the next lookup a miss.
+    stat_result = Path(python_file_path).stat()
+    path = str(python_file_path)
+    tree = tree_cache.get(path, stat_result.st_mtime_ns, stat_result.st_size)
+    if tree is None:
+        source = _read_source(python_file_path)
+        with stage("parse"):
+            tree = parser.parse(source)
+        tree_cache.put(path, stat_result.st_mtime_ns, stat_result.st_size, tree)
+    return tree
+
+
+def get_import_statement_of_identifier(  # noqa: PLR0911
+    project_root: str | PathLike,
+    python_file_path: str | PathLike,
+    node: tree_sitter.Node,
+) -> str | None:
+    """
+    Given an identifier node in a Python file, return the import statement that imports it as absolute import.
+
+    Return None if the identifier is not an imported name (e.g. the module name in `from logging import getLogger`).
+    """
+    # print(node)
+    # print(node.type)
+    # print("node.text ", node.text)
+    # print("node.parent ", node.parent)
+    # print("node.parent.text ", node.parent.text)
+
+    if node.parent is None or node.parent.type not in [
+        "dotted_name",
+        "aliased_import",
+    ]:
+        return None
+
+    if node.parent.type == "aliased_import":
+        assert node.parent.parent is not None
+
+        if node.parent.parent.type == "import_statement":
+            # import .. as ..
+            import_name_node = node.parent.child_by_field_name("name")
+            assert import_name_node is not None
+            import_name = import_name_node.text
+            assert import_name is not None
+            import_name = import_name.decode("utf-8")
+
+            import_as_node = node.parent.child_by_field_name("alias")
+            assert import_as_node is not None
+            import_as = import_as_node.text
+            assert import_as is not None
+            import_as = import_as.decode("utf-8")
+
+            return f"import {import_name} as {import_as}"
+
+        elif node.parent.parent.type == "import_from_statement":
+            # from .. import .. as ..
+            import_from_node = node.parent.parent.child_by_field_name("module_name")
+            assert import_from_node is not None
+            if import_from_node == node.parent:
+                # we found the dotted_name node in the module_name node
+                # e.g. from logging import getLogger
+                # but we only want to find import logging
+                return None
+            import_from = import_from_node.text
+            assert import_from is not None
+            import_from = import_from.decode("utf-8")
+            with stage("relative_import"):
+                import_from = get_relative_import_resolver(project_root).to_absolute(
+                    python_file_path, import_from
+                )
+            add_count("relative_import_calls")
+
+            import_name_node = node.parent.child_by_field_name("name")
+            assert import_name_node is not None
+            import_name = import_name_node.text
+            assert import_name is not None
+            import_name = import_name.decode("utf-8")
+
+            import_as_node = node.parent.child_by_field_name("alias")
+            assert import_as_node is not None
+            import_as = import_as_node.text
+            assert import_as is not None
+            import_as = import_as.decode("utf-8")
+
+            return f"from {import_from} import {import_name} as {import_as}"
+    elif node.parent.type == "dotted_name":
+        assert node.parent.parent is not None
+
+        if node.parent.parent.type == "import_statement":
+            # import logging
+            import_name = node.parent.text
+            assert import_name is not None
+            import_name = import_name.decode("utf-8")
+
+            return f"import {import_name}"
+        elif node.parent.parent.type == "import_from_statement":
+            # from logging import getLogger
+            import_from_node = node.parent.parent.child_by_field_name("module_name")
+            assert import_from_node is not None
+
+            if import_from_node == node.parent:
+                # we found the dotted_name node in the module_name node
+                # e.g. from logging import getLogger
+                # but we only want to find import logging
+                return None
+
+            import_from = import_from_node.text
+            assert import_from is not None
+            import_from = import_from.decode("utf-8")
+            with stage("relative_import"):
+                import_from = get_relative_import_resolver(project_root).to_absolute(
+                    python_file_path, import_from
+                )
+            add_count("relative_import_calls")
+
+            import_name = node.parent.text
+            assert import_name is not None
+            import_name = import_name.decode("utf-8")
+
+            return f"from {import_from} import {import_name}"
+
+    return None
+
+
 def get_all_imports_in_file_as_absolute(
     project_root: str | PathLike,
     python_file_path: str | PathLike,
@@ -98,11 +319,9 @@ def get_all_imports_in_file_as_absolute(
 
     This will return in a simple one-liner format, even if the import statement is multi-line or multi-statement.
     The location has to be 0-based, indicating the actual variable/function name of the import.
+    Each import is counted once, even if several locations point to it (e.g. both `foo`s in `import foo.foo`).
     """
-    with open(python_file_path) as f:
-        lines: str = f.read()
-
-    tree = parser.parse(bytes(lines, "utf8"))
+    tree = parse_file(python_file_path, parser)
 
     # tree.root_node_with_offset(
     # get node at position
@@ -134,126 +353,196 @@ def get_all_imports_in_file_as_absolute(
     #       (identifier)) ; [6, 4] - [6, 25]
     #     alias: (identifier))) ; [6, 29] - [6, 32]
 
-    # query = PY_LANGUAGE.query("""
-    #     (import_statement name: (dotted_name) @import)
-    #     (import_statement name: (aliased_import alias: (identifier) @import_as))
-    #     (import_from_statement name: (dotted_name) @from_import)
-    #     (import_from_statement name: (aliased_import alias: (identifier) @from_import_as))
-    #     """)
+    return {
+        import_statement: len(rows)
+        for import_statement, rows in _find_imports_at(
+            project_root, python_file_path, tree, rowcols
+        ).items()
+    }
 
-    import_statement_to_count = defaultdict(int)
 
-    for row_col in rowcols:
-        # match = query.matches(
-        #     tree.root_node,
-        #     start_point=(row_col_colend[0], row_col_colend[1]),
-        #     end_point=(row_col_colend[0], row_col_colend[1]),
-        # )
-        # print(match)
-
-        node = get_node(tree, row_col)
-        if node is None or node.type != "identifier":
-            continue
+def get_import_rows_in_file_as_absolute(
+    project_root: str | PathLike,
+    python_file_path: str | PathLike,
+    parser: Parser,
+    rowcols: list[tuple[int, int]],
+) -> dict[str, list[int]]:
+    """
+    Same as `get_all_imports_in_file_as_absolute()`, but with the 0-based row of each counted import.
 
-        # print(node)
-        # print(node.type)
-        # print("node.text ", node.text)
-        # print("node.parent ", node.parent)
-        # print("node.parent.text ", node.parent.text)
+    Returns:
+        import statement to rows, in the order of `rowcols`
+    """
+    tree = parse_file(python_file_path, parser)
 
-        if node.parent is None or node.parent.type not in [
-            "dotted_name",
-            "aliased_import",
-        ]:
-            continue
+    return _find_imports_at(project_root, python_file_path, tree, rowcols)
 
-        if node.parent.type == "aliased_import":
-            assert node.parent.parent is not None
-
-            if node.parent.parent.type == "import_statement":
-                # import .. as ..
-                import_name_node = node.parent.child_by_field_name("name")
-                assert import_name_node is not None
-                import_name = import_name_node.text
-                assert import_name is not None
-                import_name = import_name.decode("utf-8")
-
-                import_as_node = node.parent.child_by_field_name("alias")
-                assert import_as_node is not None
-                import_as = import_as_node.text
-                assert import_as is not None
-                import_as = import_as.decode("utf-8")
-
-                import_statement_to_count[f"import {import_name} as {import_as}"] += 1
-
-            elif node.parent.parent.type == "import_from_statement":
-                # from .. import .. as ..
-                import_from_node = node.parent.parent.child_by_field_name("module_name")
-                assert import_from_node is not None
-                if import_from_node == node.parent:
-                    # we found the dotted_name node in the module_name node
-                    # e.g. from logging import getLogger
-                    # but we only want to find import logging
-                    continue
-                import_from = import_from_node.text
-                assert import_from is not None
-                import_from = import_from.decode("utf-8")
-                import_from = relative_import_to_absolute_import(
-                    project_root, python_file_path, import_from
-                )
 
-                import_name_node = node.parent.child_by_field_name("name")
-                assert import_name_node is not None
-                import_name = import_name_node.text
-                assert import_name is not None
-                import_name = import_name.decode("utf-8")
-
-                import_as_node = node.parent.child_by_field_name("alias")
-                assert import_as_node is not None
-                import_as = import_as_node.text
-                assert import_as is not None
-                import_as = import_as.decode("utf-8")
-
-                import_statement_to_count[
-                    f"from {import_from} import {import_name} as {import_as}"
-                ] += 1
-        elif node.parent.type == "dotted_name":
-            assert node.parent.parent is not None
-
-            if node.parent.parent.type == "import_statement":
-                # import logging
-                import_name = node.parent.text
-                assert import_name is not None
-                import_name = import_name.decode("utf-8")
-
-                import_statement_to_count[f"import {import_name}"] += 1
-            elif node.parent.parent.type == "import_from_statement":
-                # from logging import getLogger
-                import_from_node = node.parent.parent.child_by_field_name("module_name")
-                assert import_from_node is not None
-
-                if import_from_node == node.parent:
-                    # we found the dotted_name node in the module_name node
-                    # e.g. from logging import getLogger
-                    # but we only want to find import logging
-                    continue
-
-                import_from = import_from_node.text
-                assert import_from is not None
-                import_from = import_from.decode("utf-8")
-                import_from = relative_import_to_absolute_import(
-                    project_root, python_file_path, import_from
-                )
+def get_import_rows_in_file_as_absolute_by_word(
+    project_root: str | PathLike,
+    python_file_path: str | PathLike,
+    parser: Parser,
+    word_rowcols: dict[str, list[tuple[int, int]]],
+) -> dict[str, dict[str, list[int]]]:
+    """
+    Same as `get_import_rows_in_file_as_absolute()` for the locations of many words, parsing the file only once.
+
+    Returns:
+        word to (import statement to rows)
+    """
+    tree = parse_file(python_file_path, parser)
+
+    return {
+        word: _find_imports_at(project_root, python_file_path, tree, rowcols)
+        for word, rowcols in word_rowcols.items()
+    }
+
+
+def _find_imports_at(
+    project_root: str | PathLike,
+    python_file_path: str | PathLike,
+    tree: tree_sitter.Tree,
+    rowcols: list[tuple[int, int]],
+) -> dict[str, list[int]]:
+    import_statement_to_rows: dict[str, list[int]] = defaultdict(list)
+    # start bytes of the dotted_name / aliased_import nodes already counted
+    counted_import_starts: set[int] = set()
+
+    for row_col in rowcols:
+        with stage("get_node"):
+            node = get_node(tree, row_col)
+        add_count("nodes_visited")
+        if node is None or node.type != "identifier" or node.parent is None:
+            continue
+        if node.parent.start_byte in counted_import_starts:
+            continue
 
-                import_name = node.parent.text
-                assert import_name is not None
-                import_name = import_name.decode("utf-8")
+        import_statement = get_import_statement_of_identifier(
+            project_root, python_file_path, node
+        )
+        if import_statement is not None:
+            import_statement_to_rows[import_statement].append(row_col[0])
+            counted_import_starts.add(node.parent.start_byte)
+
+    return import_statement_to_rows
+
+
+@dataclass(frozen=True)
+class ImportRecord:
+    name: str
+    """The name the import binds, e.g. `a` for `import a.b`, `c` for `from a import b as c`."""
+    statement: str
+    """The import statement as absolute import."""
+    row: int
+    """0-based row of the imported name."""
+
+
+@dataclass
+class ImportCount:
+    statement: str
+    """The import statement as absolute import."""
+    count: int
+    path: str | None = None
+    """A file with the import, to show as an example."""
+    row: int | None = None
+    """0-based row of the import in `path`."""
+    score: float | None = None
+    """The weighted count, if ranked by proximity or recency (see `python_import.ranking`)."""
+
+    @property
+    def kind(self) -> str:
+        """
+        `import` (import a.b), `from` (from a import b) or `as` (import a as b, from a import b as c).
+
+        Examples:
+        >>> ImportCount("import numpy as np", 1).kind
+        'as'
+        >>> ImportCount("from pathlib import Path", 1).kind
+        'from'
+        """
+        if " as " in self.statement:
+            return "as"
+        if self.statement.startswith("from "):
+            return "from"
+        return "import"
+
+    @property
+    def module(self) -> str:
+        """
+        The module the statement imports from.
+
+        Examples:
+        >>> ImportCount("import numpy as np", 1).module
+        'numpy'
+        >>> ImportCount("from torch.utils import data", 1).module
+        'torch.utils'
+        """
+        return self.statement.split()[1]
+
+    def to_json(self) -> dict[str, Any]:
+        import_count_json = {
+            "statement": self.statement,
+            "count": self.count,
+            "kind": self.kind,
+            "module": self.module,
+            "path": self.path,
+            "line": None if self.row is None else self.row + 1,
+        }
+        if self.score is not None:
+            import_count_json["score"] = self.score
+        return import_count_json
+
+
+def scan_imports_in_file(
+    project_root: str | PathLike,
+    python_file_path: str | PathLike,
+    parser: Parser,
+) -> list[ImportRecord]:
+    """
+    Return every import in a Python file with the name it binds, in a single pass over the tree.
 
-                import_statement_to_count[
-                    f"from {import_from} import {import_name}"
-                ] += 1
+    Multi-name statements like `from a import b, c` result in one record per name.
+    """
+    tree = parse_file(python_file_path, parser)
+    query = get_query(parser.language, IMPORT_QUERY)
+
+    import_records: list[tuple[tuple[int, int], ImportRecord]] = []
+    for capture_name, nodes in query_captures(query, tree.root_node).items():
+        for node in nodes:
+            if capture_name in ("import", "from_import"):
+                # dotted_name. Any of its identifiers gives the same statement.
+                identifier_node = node.named_children[0]
+            else:
+                # alias identifier
+                identifier_node = node
+
+            import_statement = get_import_statement_of_identifier(
+                project_root, python_file_path, identifier_node
+            )
+            if import_statement is None:
+                continue
+
+            if capture_name == "import":
+                # import a.b.c binds a
+                name_node = identifier_node
+            else:
+                name_node = node
+
+            name = name_node.text
+            assert name is not None
+            import_records.append(
+                (
+                    node.start_point,
+                    ImportRecord(
+                        name=name.decode("utf-8"),
+                        statement=import_statement,
+                        row=node.start_point[0],
+                    ),
+                )
+            )
 
-    return import_statement_to_count
+    # in the order of appearance
+    return [import_record for _, import_record in sorted(import_records)]
 
 
 def get_all_imports_in_file_as_absolute_with_word(
@@ -267,33 +556,14 @@ def get_all_imports_in_file_as_absolute_with_word(
 
     The locations will be determined using ripgrep.
     """
-    # NOTE: rg json outputs are (1, 0)-indexed
-    rg_outputs = subprocess.run(
-        [
-            "rg",
-            "--word-regexp",
-            "--fixed-strings",
-            "--json",
-            word,
-            str(python_file_path),
-        ],
-        cwd=project_root,
-        capture_output=True,
-        check=False,
-    )
-    # print(rg_outputs)
-
     # 0-indexed row, col
-    rowcols: list[tuple[int, int]] = []
-    for line in rg_outputs.stdout.decode("utf-8").split("\n"):
-        if not line:
-            continue
-        rg_output = json.loads(line)
-        if rg_output["type"] == "match":
-            row = rg_output["data"]["line_number"] - 1
-            col = rg_output["data"]["submatches"][0]["start"]
-            # col_end = rg_output["data"]["submatches"][0]["end"]
-            rowcols.append((row, col))
+    rowcols = [
+        rowcol
+        for _, file_rowcols in iter_rg_import_rowcols(
+            project_root, word, paths=[python_file_path]
+        )
+        for rowcol in file_rowcols
+    ]
 
     return get_all_imports_in_file_as_absolute(
         project_root, python_file_path, parser, rowcols
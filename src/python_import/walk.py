@@ -0,0 +1,363 @@
+"""
+Built-in search of the project, used instead of ripgrep when it is not installed.
+
+It finds the same files as `rg --type python`: the `*.py` and `*.pyi` files that are not hidden,
+not symlinks, and not ignored by a `.gitignore`, `.ignore` or `.rgignore` (including the ones in the parent directories
+up to the git root, and `.git/info/exclude`). The global gitignore of git is not read.
+The include/exclude patterns and the maximum file size of the project (see `python_import.project_config`)
+are applied while walking, so the skipped files are never opened.
+
+Each file is memory-mapped and searched for the whole words in a thread pool,
+and the hits are filtered the same way as ripgrep's (see `python_import.rg`).
+It is usually slower than ripgrep on large projects. Compare them with `benchmarks/bench_count.py`.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .project_config import load_project_config
+from .rg import is_possible_import_line
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+    from concurrent.futures import Future
+    from os import PathLike
+
+    from .project_config import ProjectConfig
+
+PYTHON_FILE_SUFFIXES = (".py", ".pyi")
+IGNORE_FILE_NAMES = (".gitignore", ".ignore", ".rgignore")
+
+# Files searched ahead of the one being yielded.
+_MAX_PENDING_FILES = 256
+
+
+def _glob_to_regex(pattern: str) -> str:
+    r"""
+    Translate a gitignore glob to a regex matching a /-separated relative path.
+
+    Examples:
+    >>> _glob_to_regex("*.py")
+    '[^/]*\\.py'
+    >>> _glob_to_regex("**/build")
+    '(?:.*/)?build'
+    >>> _glob_to_regex("a/**/b?")
+    'a/(?:.*/)?b[^/]'
+    """
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2 :]:
+            end = pattern.index("]", i + 2)
+            char_class = pattern[i + 1 : end].replace("\\", "\\\\")
+            if char_class.startswith("!"):
+                char_class = "^" + char_class[1:]
+            regex += f"[{char_class}]"
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+
+class IgnoreRules:
+    """
+    The patterns of the ignore files that apply to a directory, the last matching one winning like git.
+    """
+
+    def __init__(
+        self, rules: list[tuple[str, re.Pattern[str], bool, bool]] | None = None
+    ):
+        # (base directory, regex of the path relative to it, negated, directories only)
+        self.rules = rules or []
+
+    def extended(self, base_dir: str, lines: Sequence[str]) -> IgnoreRules:
+        """Return the rules with the patterns of an ignore file in `base_dir` added."""
+        rules = list(self.rules)
+        for line in lines:
+            pattern = line.rstrip("\n").rstrip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            negated = pattern.startswith("!")
+            if negated:
+                pattern = pattern[1:]
+            # e.g. \#file or \!file
+            pattern = pattern.removeprefix("\\")
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            if not pattern:
+                continue
+            if "/" in pattern:
+                # relative to the ignore file's directory
+                regex = _glob_to_regex(pattern.lstrip("/"))
+            else:
+                # a name at any depth
+                regex = "(?:.*/)?" + _glob_to_regex(pattern)
+            rules.append((base_dir, re.compile(regex), negated, dir_only))
+        return IgnoreRules(rules)
+
+    def extended_with_ignore_files(self, directory: str) -> IgnoreRules:
+        ignore_rules = self
+        for ignore_file_name in IGNORE_FILE_NAMES:
+            try:
+                with Path(directory, ignore_file_name).open() as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+            ignore_rules = ignore_rules.extended(directory, lines)
+        return ignore_rules
+
+    def is_ignored(self, path: str, *, is_dir: bool) -> bool:
+        for base_dir, regex, negated, dir_only in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if not path.startswith(base_dir + os.sep):
+                continue
+            relative_path = path[len(base_dir) + 1 :].replace(os.sep, "/")
+            if regex.fullmatch(relative_path):
+                return not negated
+        return False
+
+
+def _get_parent_ignore_rules(directory: Path, ignore_rules: IgnoreRules) -> IgnoreRules:
+    """Add the rules of the ignore files in the parent directories, up to the git root."""
+    parents = []
+    if not (directory / ".git").exists():
+        for parent in directory.parents:
+            parents.append(parent)
+            if (parent / ".git").exists():
+                break
+        else:
+            # not in a git repository
+            parents = []
+
+    git_root = parents[-1] if parents else directory
+    try:
+        with open(git_root / ".git" / "info" / "exclude") as f:
+            ignore_rules = ignore_rules.extended(str(git_root), f.readlines())
+    except OSError:
+        pass
+    for parent in reversed(parents):
+        ignore_rules = ignore_rules.extended_with_ignore_files(str(parent))
+    return ignore_rules
+
+
+def _iter_python_files_in_dir(
+    directory: str, ignore_rules: IgnoreRules, max_file_size: int | None
+) -> Iterator[str]:
+    ignore_rules = ignore_rules.extended_with_ignore_files(directory)
+    try:
+        entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name.startswith(".") or entry.is_symlink():
+            continue
+        if entry.is_dir():
+            if not ignore_rules.is_ignored(entry.path, is_dir=True):
+                yield from _iter_python_files_in_dir(
+                    entry.path, ignore_rules, max_file_size
+                )
+        elif entry.name.endswith(PYTHON_FILE_SUFFIXES) and not ignore_rules.is_ignored(
+            entry.path, is_dir=False
+        ):
+            if max_file_size is not None and _get_file_size(entry) > max_file_size:
+                continue
+            yield entry.path
+
+
+def _get_file_size(entry: os.DirEntry[str]) -> int:
+    try:
+        return entry.stat().st_size
+    except OSError:
+        # deleted after listing
+        return 0
+
+
+def iter_python_files(
+    project_root: str | PathLike,
+    paths: Sequence[str | PathLike] | None = None,
+    *,
+    project_config: ProjectConfig | None = None,
+) -> Iterator[str]:
+    """
+    Yield the absolute paths of the Python files in the project that ripgrep would search.
+
+    Pass `paths` to list only the files/directories instead of the whole project.
+    Like ripgrep, a file given explicitly is yielded even if it would be ignored.
+
+    The project config is read from its pyproject.toml if not given.
+    """
+    project_root = Path(project_root).resolve()
+    if project_config is None:
+        project_config = load_project_config(project_root)
+    # The lowest precedence, like `--ignore-file` of ripgrep.
+    config_ignore_rules = IgnoreRules().extended(
+        str(project_root), project_config.get_ignore_lines()
+    )
+    for path in paths or [project_root]:
+        path = project_root / path
+        if path.is_file():
+            yield str(path)
+        elif path.is_dir():
+            yield from _iter_python_files_in_dir(
+                str(path),
+                _get_parent_ignore_rules(path, config_ignore_rules),
+                project_config.max_file_size,
+            )
+
+
+def compile_words_regex(words: Sequence[str]) -> re.Pattern[bytes]:
+    r"""
+    Compile a regex matching any of the words as a whole word, like `rg --word-regexp --fixed-strings`.
+
+    It's a bytes regex (to search the mapped file without decoding it), so its `\w` is ASCII only.
+    A match next to a non-ASCII byte has to be checked with `is_unicode_word_match()`,
+    as ripgrep's word boundaries are Unicode-aware.
+
+    Examples:
+    >>> [m.group() for m in compile_words_regex(["foo", "foo_bar"]).finditer(b"foo_bar(foo) xfoo")]
+    [b'foo_bar', b'foo']
+    """
+    # Longest first, so that a word is not cut by a shorter one in the alternation.
+    alternatives = b"|".join(
+        re.escape(word.encode("utf-8"))
+        for word in sorted(set(words), key=len, reverse=True)
+    )
+    return re.compile(rb"(?<!\w)(?:" + alternatives + rb")(?!\w)")
+
+
+_UNICODE_WORD_CHAR_RE = re.compile(r"\w")
+
+
+def is_unicode_word_match(source: bytes | mmap.mmap, start: int, end: int) -> bool:
+    """
+    Return whether the match of `compile_words_regex()` at source[start:end] is a whole word
+    with the Unicode word characters too, e.g. not `foo` in `éfoo` or `fooé`.
+
+    Examples:
+    >>> source = "import foo, éfoo, fooé".encode()
+    >>> [is_unicode_word_match(source, m.start(), m.end()) for m in compile_words_regex(["foo"]).finditer(source)]
+    [True, False, False]
+    """
+    if start > 0 and source[start - 1] >= 0x80:
+        # the last character of up to 4 bytes before
+        before = bytes(source[max(start - 4, 0) : start]).decode("utf-8", "ignore")
+        if before and _UNICODE_WORD_CHAR_RE.match(before[-1]):
+            return False
+    if end < len(source) and source[end] >= 0x80:
+        after = bytes(source[end : end + 4]).decode("utf-8", "ignore")
+        if after and _UNICODE_WORD_CHAR_RE.match(after[0]):
+            return False
+    return True
+
+
+def search_file(
+    python_file_path: str, words_regex: re.Pattern[bytes]
+) -> dict[str, list[tuple[int, int]]]:
+    """
+    Return the matched words of the file to their 0-indexed (row, byte column),
+    only in the lines that can be imports (see `is_possible_import_line()`).
+    """
+    try:
+        with (
+            open(python_file_path, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source,
+        ):
+            return _search_source(source, words_regex)
+    except (OSError, ValueError):
+        # e.g. empty (can't be mapped) or deleted file
+        return {}
+
+
+def _search_source(
+    source: mmap.mmap, words_regex: re.Pattern[bytes]
+) -> dict[str, list[tuple[int, int]]]:
+    word_rowcols: dict[str, list[tuple[int, int]]] = {}
+    row = 0
+    # the start of the line of `row`
+    line_start = 0
+    line_is_possible_import = None
+    for match in words_regex.finditer(source):
+        start = match.start()
+        num_newlines = source[line_start:start].count(b"\n")
+        if num_newlines or line_is_possible_import is None:
+            row += num_newlines
+            line_start = source.rfind(b"\n", 0, start) + 1
+            line_end = source.find(b"\n", start)
+            line = source[line_start : line_end if line_end != -1 else len(source)]
+            line_is_possible_import = is_possible_import_line(
+                line.decode("utf-8", "replace")
+            )
+        if line_is_possible_import and is_unicode_word_match(
+            source, start, match.end()
+        ):
+            word = match.group().decode("utf-8")
+            word_rowcols.setdefault(word, []).append((row, start - line_start))
+    return word_rowcols
+
+
+def iter_walk_import_word_rowcols(
+    project_root: str | PathLike,
+    words: Sequence[str],
+    paths: Sequence[str | PathLike] | None = None,
+    *,
+    project_config: ProjectConfig | None = None,
+    max_workers: int | None = None,
+) -> Iterator[tuple[str, dict[str, list[tuple[int, int]]]]]:
+    """
+    Same as `iter_rg_import_word_rowcols()`, with the built-in search instead of ripgrep.
+
+    The files are searched in a thread pool, and yielded in the order they are listed.
+    """
+    words_regex = compile_words_regex(words)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures: deque[tuple[str, Future[dict[str, list[tuple[int, int]]]]]] = deque()
+
+        def pop_result() -> Iterator[tuple[str, dict[str, list[tuple[int, int]]]]]:
+            python_file_path, future = futures.popleft()
+            word_rowcols = future.result()
+            if word_rowcols:
+                yield python_file_path, word_rowcols
+
+        for python_file_path in iter_python_files(
+            project_root, paths, project_config=project_config
+        ):
+            futures.append(
+                (
+                    python_file_path,
+                    executor.submit(search_file, python_file_path, words_regex),
+                )
+            )
+            while futures and (
+                len(futures) > _MAX_PENDING_FILES or futures[0][1].done()
+            ):
+                yield from pop_result()
+        while futures:
+            yield from pop_result()
+    finally:
+        # The caller may stop early.
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,151 @@
+"""
+Workspace mode, for a monorepo of many packages (e.g. `libs/*/src/...` and `services/*/src/...`) sharing one index.
+
+Enable it in the pyproject.toml at the root of the monorepo:
+
+```toml
+[tool.python-import]
+workspace = true
+# Optional. The package roots, as globs relative to the workspace root.
+# Default: the members of `[tool.uv.workspace]` if set, otherwise every directory with a pyproject.toml,
+# setup.py or setup.cfg.
+workspace-members = ["libs/*", "services/*"]
+```
+
+Then a project root inside the workspace (e.g. `services/api`, found by the editor) is promoted to the workspace root,
+so that `count` answers from the index of the whole monorepo,
+and the relative imports of each file are resolved against its own package root (and its src/ layout).
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .project_config import load_project_config
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+    from os import PathLike
+
+PACKAGE_ROOT_MARKERS = ("pyproject.toml", "setup.py", "setup.cfg")
+
+
+def find_workspace_root(project_root: str | PathLike) -> Path | None:
+    """
+    Return the closest directory (the project root itself or a parent up to the git root)
+    that enables workspace mode in its pyproject.toml, or None if the project is not in a workspace.
+    """
+    project_root = Path(project_root).resolve()
+    for directory in (project_root, *project_root.parents):
+        if (directory / "pyproject.toml").is_file() and load_project_config(
+            directory
+        ).workspace:
+            return directory
+        if (directory / ".git").exists():
+            break
+    return None
+
+
+def get_workspace_root(project_root: str | PathLike) -> Path:
+    """Return the workspace root if the project is in a workspace, otherwise the project root itself."""
+    workspace_root = find_workspace_root(project_root)
+    return workspace_root if workspace_root is not None else Path(project_root)
+
+
+def _get_module_root(package_root: Path) -> Path:
+    """The src/ directory of the package if it exists, otherwise the package root."""
+    src_dir = package_root / "src"
+    return src_dir if src_dir.is_dir() else package_root
+
+
+class Workspace:
+    """
+    The package roots of a workspace, to find the one each file belongs to.
+
+    With `members` (globs of the package roots), they are listed once.
+    Otherwise, the package root of a file is the closest parent with a pyproject.toml, setup.py or setup.cfg.
+    Either way, the result is memoized per directory.
+    """
+
+    def __init__(
+        self, workspace_root: str | PathLike, members: Sequence[str] | None = None
+    ):
+        # The file paths are resolved too.
+        self.workspace_root = Path(workspace_root).resolve()
+        self._workspace_root = str(self.workspace_root)
+        self._package_roots: list[str] | None = None
+        if members is not None:
+            # longest first, so that a nested package wins
+            self._package_roots = sorted(
+                {
+                    str(path)
+                    for pattern in members
+                    for path in self.workspace_root.glob(pattern)
+                    if path.is_dir()
+                },
+                key=len,
+                reverse=True,
+            )
+        self._module_roots: dict[str, Path | None] = {}
+
+    @classmethod
+    def from_project_root(cls, project_root: str | PathLike) -> Workspace | None:
+        """Return the workspace if the project root enables workspace mode in its pyproject.toml."""
+        project_config = load_project_config(project_root)
+        if not project_config.workspace:
+            return None
+        return cls(project_root, project_config.workspace_members)
+
+    def get_package_root(self, directory: str) -> str | None:
+        """Return the package root of a directory, or None if it's not in any package of the workspace."""
+        if self._package_roots is not None:
+            for package_root in self._package_roots:
+                if directory == package_root or directory.startswith(
+                    package_root + os.sep
+                ):
+                    return package_root
+            return None
+
+        while directory.startswith(self._workspace_root + os.sep):
+            if any(
+                os.path.isfile(os.path.join(directory, marker))  # noqa: PTH113 PTH118
+                for marker in PACKAGE_ROOT_MARKERS
+            ):
+                return directory
+            directory = os.path.dirname(directory)  # noqa: PTH120
+        return None
+
+    def iter_resolved_directories(self) -> Iterator[str]:
+        """
+        Yield the directories whose content the memoized module roots depend on, i.e. the directories
+        of the files resolved so far and their parents up to the workspace root.
+        A package root (pyproject.toml, src/) added or removed in any of them changes its mtime.
+        """
+        seen = {self._workspace_root}
+        yield self._workspace_root
+        for directory in self._module_roots:
+            while directory not in seen and directory.startswith(
+                self._workspace_root + os.sep
+            ):
+                seen.add(directory)
+                yield directory
+                directory = os.path.dirname(directory)  # noqa: PTH120
+
+    def get_module_root(self, directory: str) -> Path | None:
+        """
+        Return the directory that the module names of the files in the directory are relative to,
+        i.e. the src/ directory of their package if it exists, otherwise the package root.
+        None if the directory is not in any package of the workspace.
+        """
+        try:
+            return self._module_roots[directory]
+        except KeyError:
+            pass
+        package_root = self.get_package_root(directory)
+        module_root = (
+            None if package_root is None else _get_module_root(Path(package_root))
+        )
+        self._module_roots[directory] = module_root
+        return module_root
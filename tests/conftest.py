@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch) -> Path:
+    """Keep the indices and the compiled lookup table of the test out of the user's cache."""
+    monkeypatch.setenv("PYTHON_IMPORT_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def make_project(tmp_path) -> Callable[[dict[str, str]], Path]:
+    """Return a function that writes the files (relative path to content) in a temporary directory and returns it."""
+
+    def make_project(files: dict[str, str]) -> Path:
+        for path, content in files.items():
+            (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / path).write_text(content)
+        return tmp_path
+
+    return make_project
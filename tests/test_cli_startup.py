@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+import pytest
+
+# Only loaded by the commands that need them.
+LAZY_MODULES = [
+    "tree_sitter",
+    "tree_sitter_python",
+    "sqlite3",
+    "concurrent.futures",
+    "socketserver",
+    "python_import._version",
+    "python_import.count",
+    "python_import.index",
+    "python_import.server",
+]
+
+# Time to import the cli on top of typer, which it can't start without.
+IMPORT_TIME_BUDGET_US = 50_000
+
+
+def _import_times(statement: str) -> dict[str, int]:
+    """Run the statement with `python -X importtime`, and return the cumulative microseconds of each module."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stderr
+    cumulative_us: dict[str, int] = {}
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, module_name = line.split("|")
+        cumulative_us[module_name.strip()] = int(cumulative)
+    return cumulative_us
+
+
+@pytest.mark.parametrize("module_name", LAZY_MODULES)
+def test_cli_import_is_lazy(module_name):
+    assert module_name not in _import_times("import python_import.cli")
+
+
+def test_cli_import_time_budget():
+    # The best of a few, to not fail on a busy machine.
+    cli_import_us = min(
+        _import_times("import python_import.cli")["python_import.cli"] for _ in range(3)
+    )
+    typer_import_us = min(_import_times("import typer")["typer"] for _ in range(3))
+    assert cli_import_us - typer_import_us < IMPORT_TIME_BUDGET_US
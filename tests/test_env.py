@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+import tree_sitter_python as tspython
+from tree_sitter import Language, Parser
+
+from python_import import env
+from python_import.cli.main import index_env, lookup_get
+from python_import.env import (
+    build_env_index,
+    get_env_index_path,
+    get_env_paths,
+    get_public_names_in_file,
+    iter_env_modules,
+)
+from python_import.lookup import read_lookup_table
+
+PY_LANGUAGE = Language(tspython.language())
+
+
+@pytest.fixture
+def env_paths(tmp_path, monkeypatch):
+    """A fake environment, so that the tests don't depend on the installed packages."""
+    stdlib_dir = tmp_path / "lib/python3"
+    site_packages_dir = stdlib_dir / "site-packages"
+    files = {
+        stdlib_dir / "pathlib.py": "import os\nclass Path: ...\ndef _private(): ...\n",
+        stdlib_dir / "os.py": "import sys\n\n__all__ = ['sep']\nsep = '/'\nfoo = 1\n",
+        stdlib_dir / "_bootlocale.py": "def getpreferredencoding(): ...\n",
+        stdlib_dir / "test/__init__.py": "",
+        site_packages_dir / "mypkg/__init__.py": (
+            "from pathlib import Path\n"
+            "from .core import array, helper as _helper\n"
+            "try:\n    from .fast import speedup\nexcept ImportError:\n    speedup = None\n"
+        ),
+        site_packages_dir / "mypkg/core/__init__.py": (
+            "__all__ = ['array']\n__all__ += ['Path']\n"
+        ),
+        site_packages_dir / "mypkg/_internal/__init__.py": "x = 1\n",
+        site_packages_dir / "mypkg-1.0.dist-info/METADATA": "",
+        site_packages_dir / "other.py": "import pathlib\nimport mypkg.core\nPath = 1\n",
+        site_packages_dir / "speedups.cpython-311-x86_64-linux-gnu.so": "",
+    }
+    for path, content in files.items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+    paths = {
+        "stdlib": str(stdlib_dir),
+        "site_packages": [str(site_packages_dir)],
+        "builtin_module_names": ["_abc", "sys"],
+    }
+    monkeypatch.setattr(env, "get_env_paths", lambda python: paths)
+    return paths
+
+
+def test_get_env_paths():
+    env_paths = get_env_paths(sys.executable)
+    assert (Path(env_paths["stdlib"]) / "os.py").is_file()
+    assert "sys" in env_paths["builtin_module_names"]
+
+
+def test_iter_env_modules(env_paths):
+    stdlib_dir = Path(env_paths["stdlib"])
+    site_packages_dir = Path(env_paths["site_packages"][0])
+    assert list(iter_env_modules(env_paths)) == [
+        ("sys", None),
+        ("os", stdlib_dir / "os.py"),
+        ("pathlib", stdlib_dir / "pathlib.py"),
+        ("mypkg", site_packages_dir / "mypkg/__init__.py"),
+        ("mypkg.core", site_packages_dir / "mypkg/core/__init__.py"),
+        ("other", site_packages_dir / "other.py"),
+        ("speedups", None),
+    ]
+
+    assert [
+        module_name
+        for module_name, _ in iter_env_modules(env_paths, ["core/", "*.so", "/os.py"])
+    ] == ["sys", "pathlib", "mypkg", "other"]
+
+
+def test_get_public_names_in_file(env_paths):
+    parser = Parser(PY_LANGUAGE)
+    site_packages_dir = Path(env_paths["site_packages"][0])
+    assert get_public_names_in_file(Path(env_paths["stdlib"]) / "os.py", parser) == (
+        ["sep"],
+        ["sys"],
+    )
+    assert get_public_names_in_file(
+        site_packages_dir / "mypkg/__init__.py", parser
+    ) == (
+        ["array", "speedup"],
+        ["pathlib"],
+    )
+    assert get_public_names_in_file(
+        site_packages_dir / "mypkg/core/__init__.py", parser
+    ) == (["array", "Path"], [])
+
+
+def test_build_env_index(env_paths, cache_dir):
+    env_index_path, num_modules = build_env_index("python3", Parser(PY_LANGUAGE))
+    assert env_index_path == get_env_index_path("python3")
+    assert num_modules == 7
+
+    word_to_candidates = read_lookup_table(env_index_path)
+    # pathlib is imported by more modules than mypkg, and other is not imported at all
+    assert word_to_candidates["Path"] == [
+        "from pathlib import Path",
+        "from mypkg.core import Path",
+        "from other import Path",
+    ]
+    assert word_to_candidates["array"] == [
+        "from mypkg import array",
+        "from mypkg.core import array",
+    ]
+    assert word_to_candidates["speedups"] == ["import speedups"]
+    assert "foo" not in word_to_candidates
+    assert "getpreferredencoding" not in word_to_candidates
+
+
+def test_cli_lookup_get_from_env_index(env_paths, cache_dir, capsys):
+    index_env(python="python3", jobs=1)
+    capsys.readouterr()
+
+    lookup_get(["Path", "nothing"], python="python3")
+    assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == [
+        {
+            "module_name": "Path",
+            "statements": ["from pathlib import Path"],
+            "source": "env",
+        },
+        {"module_name": "nothing", "statements": None, "source": None},
+    ]
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import logging
+import shutil
+import sqlite3
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+import pytest
+import tree_sitter_python as tspython
+from tree_sitter import Language, Parser
+
+import python_import.index
+from python_import.cli.main import count, index_update
+from python_import.count import count_imports, count_imports_of_words
+from python_import.index import (
+    ImportIndex,
+    IndexUpdate,
+    build_index,
+    get_all_imports_in_file_by_name,
+    get_index_path,
+)
+from python_import.utils import ImportCount
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR / "sample_projects/project1"
+PY_LANGUAGE = Language(tspython.language())
+parser = Parser(PY_LANGUAGE)
+
+
+def test_all_imports_by_name():
+    imports = get_all_imports_in_file_by_name(
+        PROJECT_ROOT,
+        PROJECT_ROOT / "src/myproject1/a/b/c/d.py",
+        parser,
+    )
+
+    assert imports == {
+        "bar": {
+            "from foo import bar": 1,
+            "from python_import import foo as bar": 1,
+        },
+        "relative1": {"from myproject1.utils.a.b.c import relative1": 1},
+        "relative_three_dots": {"from myproject1.a import relative_three_dots": 1},
+        "foo": {"from python_import import foo": 3},
+    }
+
+
+def test_index_count(cache_dir):
+    with ImportIndex(PROJECT_ROOT) as index:
+        assert index.build(parser).added == 1
+        assert index.count("foo") == {"from python_import import foo": 3}
+        assert index.count("unknown") == {}
+        assert index.count_with_examples("foo") == [
+            ImportCount(
+                "from python_import import foo",
+                3,
+                str((PROJECT_ROOT / "src/myproject1/a/b/c/d.py").resolve()),
+                11,
+            )
+        ]
+
+    assert ImportIndex.exists(PROJECT_ROOT)
+
+
+@pytest.mark.parametrize("module_name", ["foo", "bar", "relative1"])
+def test_cli_count_with_index_matches_ripgrep(cache_dir, module_name):
+    with redirect_stdout(StringIO()) as stdout:
+        count(project_root=PROJECT_ROOT, module_names=[module_name], use_index=False)
+    without_index = stdout.getvalue()
+
+    with ImportIndex(PROJECT_ROOT) as index:
+        index.build(parser)
+
+    with redirect_stdout(StringIO()) as stdout:
+        count(project_root=PROJECT_ROOT, module_names=[module_name])
+
+    assert sorted(stdout.getvalue().splitlines()) == sorted(without_index.splitlines())
+
+
+def test_count_imports_of_words_with_index(cache_dir):
+    # `a.b` is not an identifier, so it is searched with ripgrep.
+    module_names = ["foo", "bar", "relative1", "a.b"]
+    without_index = count_imports_of_words(
+        PROJECT_ROOT, module_names, parser, use_index=False, jobs=1
+    )
+
+    with ImportIndex(PROJECT_ROOT) as index:
+        index.build(parser)
+        with_index = count_imports_of_words(
+            PROJECT_ROOT, module_names, parser, index=index, jobs=1
+        )
+
+    assert {name: sorted(counts.items()) for name, counts in with_index.items()} == {
+        name: sorted(counts.items()) for name, counts in without_index.items()
+    }
+
+
+def test_index_counts_repeated_names_like_ripgrep(cache_dir, make_project):
+    project_root = make_project(
+        {
+            "a.py": "import foo.foo\nfrom foo import foo\nimport foo.foo.bar as foo\n",
+            "b.py": "from foo.foo import foo, bar\n",
+        }
+    )
+    without_index = count_imports(project_root, "foo", parser, use_index=False, jobs=1)
+    assert without_index["import foo.foo"] == 1
+
+    build_index(project_root, parser)
+    assert count_imports(project_root, "foo", parser, jobs=1) == without_index
+
+
+def test_index_update(cache_dir, tmp_path, monkeypatch):
+    # commit after each file
+    monkeypatch.setattr("python_import.index.UPDATE_BATCH_FILES", 1)
+    project_root = tmp_path / "project1"
+    shutil.copytree(PROJECT_ROOT, project_root)
+    module_dir = project_root / "src/myproject1"
+
+    with ImportIndex(project_root) as index:
+        index.build(parser)
+        assert index.update(parser) == IndexUpdate()
+
+        (module_dir / "new.py").write_text("from python_import import foo\n")
+        (module_dir / "a/b/c/d.py").write_text("from . import foo\n")
+        assert index.update(parser) == IndexUpdate(added=1, changed=1)
+        assert index.count("foo") == {
+            "from python_import import foo": 1,
+            "from myproject1.a.b.c import foo": 1,
+        }
+        assert index.count("bar") == {}
+
+        (module_dir / "new.py").unlink()
+        assert index.update(parser) == IndexUpdate(removed=1)
+        assert index.count("foo") == {"from myproject1.a.b.c import foo": 1}
+
+
+def test_index_update_stops_at_deadline(cache_dir, tmp_path):
+    project_root = tmp_path / "project1"
+    shutil.copytree(PROJECT_ROOT, project_root)
+    with ImportIndex(project_root) as index:
+        index.build(parser)
+        (project_root / "src/myproject1/new.py").write_text("import numpy as np\n")
+
+        assert index.update(parser, deadline=time.perf_counter()) == IndexUpdate(
+            partial=True
+        )
+        # the files not checked are kept
+        assert index.count("foo") == {"from python_import import foo": 3}
+        assert index.update(parser) == IndexUpdate(added=1)
+
+
+def test_concurrent_index_updates(cache_dir, tmp_path, monkeypatch):
+    project_root = tmp_path / "project1"
+    shutil.copytree(PROJECT_ROOT, project_root)
+    build_index(project_root, parser)
+    (project_root / "src/myproject1/new.py").write_text("import numpy as np\n")
+
+    other_index = ImportIndex(project_root)
+    list_python_files = python_import.index.list_python_files
+
+    def list_python_files_while_other_updates(*args, **kwargs):
+        # the other process adds the new file after this one read the indexed files
+        monkeypatch.setattr(python_import.index, "list_python_files", list_python_files)
+        assert other_index.update(parser) == IndexUpdate(added=1)
+        return list_python_files(*args, **kwargs)
+
+    with ImportIndex(project_root) as index:
+        monkeypatch.setattr(
+            python_import.index,
+            "list_python_files",
+            list_python_files_while_other_updates,
+        )
+        assert index.update(parser) == IndexUpdate(added=1)
+        assert index.count("np") == {"import numpy as np": 1}
+    other_index.close()
+
+
+def test_count_searches_project_when_index_is_locked(cache_dir, caplog):
+    build_index(PROJECT_ROOT, parser)
+    # e.g. an update in another process
+    locking_conn = sqlite3.connect(get_index_path(PROJECT_ROOT))
+    try:
+        locking_conn.execute("BEGIN EXCLUSIVE")
+        with caplog.at_level(logging.WARNING):
+            assert count_imports(PROJECT_ROOT, "foo", parser, jobs=1) == {
+                "from python_import import foo": 3
+            }
+    finally:
+        locking_conn.close()
+    assert "database is locked" in caplog.text
+
+
+def test_build_index_replaces_index_when_done(cache_dir, tmp_path):
+    project_root = tmp_path / "project1"
+    shutil.copytree(PROJECT_ROOT, project_root)
+
+    assert build_index(project_root, parser) == IndexUpdate(added=1)
+    (project_root / "src/myproject1/new.py").write_text("import numpy as np\n")
+
+    # the old index is used until the new one is built
+    with ImportIndex(project_root) as old_index:
+        assert build_index(project_root, parser) == IndexUpdate(added=2)
+        assert old_index.count("np") == {}
+    with ImportIndex(project_root) as index:
+        assert index.count("np") == {"import numpy as np": 1}
+
+    # no temporary file left
+    assert list(cache_dir.glob("index-*")) == [get_index_path(project_root)]
+
+
+def test_cli_index_update_builds_missing_index(cache_dir):
+    with redirect_stdout(StringIO()) as stdout:
+        index_update(PROJECT_ROOT)
+
+    assert stdout.getvalue().startswith("Indexed 1 files in ")
+    assert ImportIndex.exists(PROJECT_ROOT)
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+import marshal
+import sys
+from io import StringIO
+
+import tree_sitter_python as tspython
+from tree_sitter import Language, Parser
+
+from python_import.cli.main import lookup_compile, lookup_get
+from python_import.lookup import (
+    LookupTable,
+    compile_lookup_table,
+    get_lookup_table_path,
+    read_lookup_table,
+    write_lookup_table,
+)
+from python_import.server import ImportServer
+
+TABLES = {
+    "import": ["os"],
+    "import_as": {"np": "numpy"},
+    # the plugin encodes empty tables as lists
+    "import_from": [],
+    "statement_after_imports": {
+        "logger": ["import logging", "", "logger = logging.getLogger(__name__)"]
+    },
+}
+
+
+def test_write_and_read_lookup_table(tmp_path):
+    path = tmp_path / "lookup-table.marshal"
+    assert read_lookup_table(path) == {}
+
+    word_to_statements = compile_lookup_table(TABLES)
+    assert write_lookup_table(word_to_statements, path) == path
+    assert read_lookup_table(path) == word_to_statements
+    assert list(tmp_path.iterdir()) == [path]
+
+    # old version
+    path.write_bytes(marshal.dumps((0, word_to_statements)))
+    assert read_lookup_table(path) == {}
+
+
+def test_lookup_table_reads_again_when_compiled(tmp_path):
+    path = tmp_path / "lookup-table.marshal"
+    lookup_table = LookupTable(path)
+    assert lookup_table.get("np") is None
+
+    write_lookup_table(compile_lookup_table(TABLES), path)
+    assert lookup_table.get("np") == ["import numpy as np"]
+
+
+def test_cli_lookup_compile_and_get(cache_dir, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "stdin", StringIO(json.dumps(TABLES)))
+    lookup_compile()
+    assert get_lookup_table_path().is_file()
+    capsys.readouterr()
+
+    lookup_get(["np", "logger", "foo"])
+    assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == [
+        {
+            "module_name": "np",
+            "statements": ["import numpy as np"],
+            "source": "lookup_table",
+        },
+        {
+            "module_name": "logger",
+            "statements": TABLES["statement_after_imports"]["logger"],
+            "source": "lookup_table",
+        },
+        {"module_name": "foo", "statements": None, "source": None},
+    ]
+
+
+def test_server_lookup(cache_dir):
+    server = ImportServer(Parser(Language(tspython.language())))
+    assert server.lookup(["os"]) == [
+        {"module_name": "os", "statements": None, "source": None}
+    ]
+
+    write_lookup_table(compile_lookup_table(TABLES))
+    assert server.lookup(["os"]) == [
+        {"module_name": "os", "statements": ["import os"], "source": "lookup_table"}
+    ]
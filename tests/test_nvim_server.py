@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+PLUGIN_DIR = Path(__file__).parent.parent
+
+# One sync and one async round trip to `python-import serve`, then an async request cancelled before its response.
+SMOKE_TEST_LUA = """
+local config = require "python_import.config"
+config.opts = vim.deepcopy(config.default_opts)
+local server = require "python_import.server"
+
+local function fail(msg)
+  io.stderr:write(msg .. "\\n")
+  vim.cmd "cquit 1"
+end
+
+if server.request "ping" ~= "pong" then
+  fail "sync ping failed"
+end
+
+local result = nil
+server.request_async("ping", nil, function(res)
+  result = res
+end)
+if not vim.wait(config.opts.server.timeout, function()
+  return result ~= nil
+end, 5) then
+  fail "async ping timed out"
+end
+if result ~= "pong" then
+  fail("async ping returned " .. vim.inspect(result))
+end
+
+local called = false
+local cancel = server.request_async("ping", nil, function()
+  called = true
+end)
+cancel()
+vim.wait(200, function()
+  return called
+end, 5)
+if called then
+  fail "cancelled callback was called"
+end
+
+server.stop()
+vim.cmd "qall!"
+"""
+
+
+@pytest.mark.skipif(
+    shutil.which("nvim") is None or shutil.which("python-import") is None,
+    reason="nvim or the python-import cli is not installed",
+)
+def test_server_async_round_trip(tmp_path):
+    script = tmp_path / "smoke.lua"
+    script.write_text(SMOKE_TEST_LUA)
+    subprocess.run(
+        [
+            "nvim",
+            "--headless",
+            "--clean",
+            "--cmd",
+            f"set rtp^={PLUGIN_DIR}",
+            "-c",
+            f"luafile {script}",
+        ],
+        check=True,
+        timeout=30,
+        stdin=subprocess.DEVNULL,
+    )
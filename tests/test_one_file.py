@@ -6,7 +6,12 @@ from pathlib import Path
 import tree_sitter_python as tspython
 from tree_sitter import Language, Parser
 
-from python_import.utils import get_all_imports_in_file_as_absolute_with_word
+from python_import.utils import (
+    RelativeImportResolver,
+    get_all_imports_in_file_as_absolute_with_word,
+    relative_import_to_absolute_import,
+    scan_imports_in_file,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -70,3 +75,57 @@ def test_relative_three_dots():
     assert imports == {
         "from myproject1.a import relative_three_dots": 1,
     }
+
+
+def test_scan_imports():
+    import_records = scan_imports_in_file(
+        SCRIPT_DIR / "sample_projects/project1",
+        SCRIPT_DIR / "sample_projects/project1/src/myproject1/a/b/c/d.py",
+        parser,
+    )
+
+    assert [(r.name, r.statement, r.row) for r in import_records] == [
+        ("bar", "from foo import bar", 2),
+        ("relative1", "from myproject1.utils.a.b.c import relative1", 3),
+        ("relative_three_dots", "from myproject1.a import relative_three_dots", 7),
+        ("foo", "from python_import import foo", 11),
+        ("foo", "from python_import import foo", 14),
+        ("foo", "from python_import import foo", 17),
+        ("bar", "from python_import import foo as bar", 20),
+    ]
+
+
+def test_relative_import_resolver(monkeypatch):
+    project_root = SCRIPT_DIR / "sample_projects/project1"
+    python_file_paths = [
+        project_root / "src/myproject1/a/b/c/d.py",
+        project_root / "src/myproject1/a/b/c/e.py",
+        project_root / "src/myproject1/a/f.py",
+    ]
+    from_import_names = ["numpy", ".", ".e", "..b.c", "....utils.a"]
+    expected = [
+        relative_import_to_absolute_import(project_root, path, name)
+        for path in python_file_paths
+        for name in from_import_names
+    ]
+
+    is_dir_calls = 0
+    is_dir = Path.is_dir
+
+    def counting_is_dir(self):
+        nonlocal is_dir_calls
+        is_dir_calls += 1
+        return is_dir(self)
+
+    monkeypatch.setattr(Path, "is_dir", counting_is_dir)
+
+    resolver = RelativeImportResolver(project_root)
+    for _ in range(100):
+        assert [
+            resolver.to_absolute(path, name)
+            for path in python_file_paths
+            for name in from_import_names
+        ] == expected
+
+    # project root and src/, only once
+    assert is_dir_calls == 2
@@ -1,19 +1,305 @@
 from __future__ import annotations
 
-from contextlib import redirect_stdout
+import json
+import time
+from contextlib import redirect_stderr, redirect_stdout
 from io import StringIO
 from pathlib import Path
 
-from python_import.cli.main import count
+import tree_sitter_python as tspython
+from tree_sitter import Language, Parser
+
+import python_import.count
+from python_import.cli.main import OutputFormat, count, scan
+from python_import.count import (
+    count_imports,
+    count_imports_of_words,
+    count_top_imports,
+)
+from python_import.parallel import MIN_FILES_PER_WORKER, imap_with_parser
+from python_import.stats import collect_stats
 
 SCRIPT_DIR = Path(__file__).parent
+PY_LANGUAGE = Language(tspython.language())
 
 
 def test_cli_count():
     with redirect_stdout(StringIO()) as stdout:
         count(
             project_root=SCRIPT_DIR / "sample_projects/project1",
-            module_name="foo",
+            module_names=["foo"],
+        )
+
+    assert stdout.getvalue() == "00003:from python_import import foo\n"
+
+
+def test_cli_count_stats():
+    with redirect_stdout(StringIO()) as stdout, redirect_stderr(StringIO()) as stderr:
+        count(
+            project_root=SCRIPT_DIR / "sample_projects/project1",
+            module_names=["foo"],
+            use_index=False,
+            stats=True,
         )
 
     assert stdout.getvalue() == "00003:from python_import import foo\n"
+    stats = json.loads(stderr.getvalue())
+    assert {"ripgrep", "read", "parse", "get_node", "total"} <= stats["seconds"].keys()
+    assert stats["counts"]["files_read"] == 1
+    assert stats["counts"]["nodes_visited"] == 5
+    assert stats["counts"]["relative_import_calls"] == 3
+
+
+def test_count_imports_stats_from_workers(tmp_path):
+    num_files = MIN_FILES_PER_WORKER * 4
+    for i in range(num_files):
+        (tmp_path / f"mod{i}.py").write_text("import numpy as np\n")
+
+    parser = Parser(PY_LANGUAGE)
+    with collect_stats() as stats:
+        count_imports(tmp_path, "np", parser, use_index=False, jobs=2)
+
+    assert stats.counts["files_matched"] == num_files
+    assert stats.counts["files_read"] == num_files
+    assert stats.counts["bytes_read"] == num_files * len("import numpy as np\n")
+
+
+def test_count_imports_parallel_same_as_serial(tmp_path):
+    # enough files to use multiple workers
+    num_files = MIN_FILES_PER_WORKER * 4
+    for i in range(num_files):
+        module_dir = tmp_path / f"src/myproject/pkg{i % 4}"
+        module_dir.mkdir(parents=True, exist_ok=True)
+        (module_dir / f"mod{i}.py").write_text(
+            "import numpy as np\n"
+            f"from . import mod{(i + 1) % num_files}\n"
+            + ("from .utils import np\n" if i % 3 == 0 else "")
+        )
+
+    parser = Parser(PY_LANGUAGE)
+    serial = count_imports(tmp_path, "np", parser, use_index=False, jobs=1)
+    parallel = count_imports(tmp_path, "np", parser, use_index=False, jobs=2)
+
+    assert list(parallel.items()) == list(serial.items())
+    assert serial["import numpy as np"] == num_files
+    assert serial["from myproject.pkg0.utils import np"] == len(range(0, num_files, 12))
+
+
+def test_count_top_imports_stops_early(tmp_path):
+    num_files = 40
+    for i in range(num_files):
+        (tmp_path / f"mod{i}.py").write_text(
+            "import pandas as np\n" if i % 8 == 0 else "import numpy as np\n"
+        )
+
+    parser = Parser(PY_LANGUAGE)
+    import_counts, partial = count_top_imports(
+        tmp_path, "np", parser, use_index=False, jobs=1
+    )
+    assert not partial
+    assert [(x.statement, x.count) for x in import_counts] == [
+        ("import numpy as np", 35),
+        ("import pandas as np", 5),
+    ]
+
+    # numpy soon takes the lead, and the search stops after it stays on top over 10 files
+    import_counts, partial = count_top_imports(
+        tmp_path, "np", parser, limit=1, stable_files=10, use_index=False, jobs=1
+    )
+    assert partial
+    assert len(import_counts) == 1
+    assert import_counts[0].statement == "import numpy as np"
+    assert import_counts[0].count < 35
+
+    import_counts, partial = count_top_imports(
+        tmp_path, "np", parser, max_time=0, use_index=False, jobs=2
+    )
+    assert partial
+    assert sum(x.count for x in import_counts) < num_files
+
+
+def _sleep(parser: Parser, seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+def test_imap_with_parser_stops_waiting_at_deadline():
+    # e.g. a worker parsing a huge file
+    start = time.perf_counter()
+    results = list(
+        imap_with_parser(
+            _sleep,
+            [{"seconds": 60}] * (2 * MIN_FILES_PER_WORKER),
+            Parser(PY_LANGUAGE),
+            jobs=2,
+            deadline=start + 0.5,
+        )
+    )
+    assert results == []
+    assert time.perf_counter() - start < 10
+
+
+def test_count_imports_all_submatches(tmp_path):
+    # The first `foo` of these lines is not the imported name.
+    (tmp_path / "a.py").write_text("from foo import foo\n")
+    (tmp_path / "b.py").write_text("from foo.foo import bar, foo\n")
+    # Both `foo`s point to the same import.
+    (tmp_path / "c.py").write_text("import foo.foo\n")
+
+    parser = Parser(PY_LANGUAGE)
+    assert count_imports(tmp_path, "foo", parser, use_index=False, jobs=1) == {
+        "from foo import foo": 1,
+        "from foo.foo import foo": 1,
+        "import foo.foo": 1,
+    }
+
+
+def test_count_imports_of_words_same_as_each_word():
+    project_root = SCRIPT_DIR / "sample_projects/project1"
+    module_names = ["foo", "bar", "relative1", "relative_three_dots", "os", "foo"]
+
+    parser = Parser(PY_LANGUAGE)
+    name_to_import_statement_to_count = count_imports_of_words(
+        project_root, module_names, parser, use_index=False, jobs=1
+    )
+
+    assert list(name_to_import_statement_to_count) == module_names[:-1]
+    for (
+        module_name,
+        import_statement_to_count,
+    ) in name_to_import_statement_to_count.items():
+        assert list(import_statement_to_count.items()) == list(
+            count_imports(
+                project_root, module_name, parser, use_index=False, jobs=1
+            ).items()
+        )
+
+
+def test_cli_count_stdin(monkeypatch):
+    monkeypatch.setattr("sys.stdin", StringIO("bar\nos\n"))
+    with redirect_stdout(StringIO()) as stdout:
+        count(
+            project_root=SCRIPT_DIR / "sample_projects/project1",
+            module_names=["foo"],
+            stdin=True,
+            use_index=False,
+        )
+
+    d_py = str(
+        (SCRIPT_DIR / "sample_projects/project1/src/myproject1/a/b/c/d.py").resolve()
+    )
+    assert [json.loads(line) for line in stdout.getvalue().splitlines()] == [
+        {
+            "module_name": "foo",
+            "imports": [
+                {
+                    "statement": "from python_import import foo",
+                    "count": 3,
+                    "kind": "from",
+                    "module": "python_import",
+                    "path": d_py,
+                    "line": 12,
+                }
+            ],
+        },
+        {
+            "module_name": "bar",
+            "imports": [
+                {
+                    "statement": "from foo import bar",
+                    "count": 1,
+                    "kind": "from",
+                    "module": "foo",
+                    "path": d_py,
+                    "line": 3,
+                },
+                {
+                    "statement": "from python_import import foo as bar",
+                    "count": 1,
+                    "kind": "as",
+                    "module": "python_import",
+                    "path": d_py,
+                    "line": 21,
+                },
+            ],
+        },
+        {"module_name": "os", "imports": []},
+    ]
+
+
+def test_cli_count_format_jsonl():
+    with redirect_stdout(StringIO()) as stdout:
+        count(
+            project_root=SCRIPT_DIR / "sample_projects/project1",
+            module_names=["bar"],
+            use_index=False,
+            output_format=OutputFormat.jsonl,
+        )
+
+    d_py = str(
+        (SCRIPT_DIR / "sample_projects/project1/src/myproject1/a/b/c/d.py").resolve()
+    )
+    assert [json.loads(line) for line in stdout.getvalue().splitlines()] == [
+        {
+            "statement": "from foo import bar",
+            "count": 1,
+            "kind": "from",
+            "module": "foo",
+            "path": d_py,
+            "line": 3,
+            "partial": False,
+        },
+        {
+            "statement": "from python_import import foo as bar",
+            "count": 1,
+            "kind": "as",
+            "module": "python_import",
+            "path": d_py,
+            "line": 21,
+            "partial": False,
+        },
+    ]
+
+
+def test_cli_scan():
+    with redirect_stdout(StringIO()) as stdout:
+        scan(project_root=SCRIPT_DIR / "sample_projects/project1")
+
+    records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert len(records) == 7
+    assert records[0] == {
+        "name": "bar",
+        "statement": "from foo import bar",
+        "path": str(
+            (
+                SCRIPT_DIR / "sample_projects/project1/src/myproject1/a/b/c/d.py"
+            ).resolve()
+        ),
+        "line": 3,
+    }
+
+
+def test_count_imports_skips_files_without_import_lines(tmp_path, monkeypatch):
+    (tmp_path / "imports.py").write_text(
+        "from a import (\n    b,\n    np as numpy,\n)\nimport numpy as np\n"
+    )
+    (tmp_path / "usage.py").write_text("def f():\n    return np.zeros(3)\n\nx = 'np'\n")
+
+    parsed_files = []
+    original_func = python_import.count.get_import_rows_in_file_as_absolute
+
+    def get_import_rows_in_file_as_absolute(python_file_path, **kwargs):
+        parsed_files.append(Path(python_file_path).name)
+        return original_func(python_file_path=python_file_path, **kwargs)
+
+    monkeypatch.setattr(
+        python_import.count,
+        "get_import_rows_in_file_as_absolute",
+        get_import_rows_in_file_as_absolute,
+    )
+
+    parser = Parser(PY_LANGUAGE)
+    assert count_imports(tmp_path, "np", parser, use_index=False, jobs=1) == {
+        "import numpy as np": 1
+    }
+    assert parsed_files == ["imports.py"]
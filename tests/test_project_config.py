@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import logging
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+import tree_sitter_python as tspython
+from tree_sitter import Language, Parser
+
+from python_import.count import count_imports, count_imports_of_words
+from python_import.index import ImportIndex, list_python_files
+from python_import.project_config import ProjectConfig, load_project_config
+from python_import.rg import SEARCH_ENV_VAR, iter_rg_import_word_rowcols
+from python_import.walk import iter_walk_import_word_rowcols
+
+PY_LANGUAGE = Language(tspython.language())
+
+requires_rg = pytest.mark.skipif(
+    shutil.which("rg") is None, reason="rg is not installed"
+)
+
+
+@pytest.fixture
+def configured_project(make_project):
+    files = {
+        ".git/HEAD": "",
+        ".gitignore": "src/ignored.py\n",
+        "pyproject.toml": (
+            "[tool.python-import]\n"
+            'include = ["/src", "tests"]\n'
+            'exclude = ["/src/gen/", "*_pb2.py"]\n'
+            "max-file-size = 200\n"
+        ),
+        "setup.py": "import foo\n",
+        "src/a.py": "import foo\n",
+        "src/big.py": "import foo\n" + "x = 1\n" * 100,
+        "src/ignored.py": "import foo\n",
+        "src/msg_pb2.py": "import foo\n",
+        "src/gen/b.py": "import foo\n",
+        "src/third_party/c.py": "from bar import foo\n",
+        "tests/test_a.py": "import foo\n",
+        "other/tests/test_b.py": "import foo\n",
+        "other/d.py": "import foo\n",
+    }
+    return make_project(files)
+
+
+def _relative_paths(project_root: Path, paths) -> list[str]:
+    return sorted(Path(path).relative_to(project_root).as_posix() for path in paths)
+
+
+def test_load_project_config(configured_project, tmp_path):
+    assert load_project_config(configured_project) == ProjectConfig(
+        include=("/src", "tests"),
+        exclude=("/src/gen/", "*_pb2.py"),
+        max_file_size=200,
+    )
+    # no pyproject.toml
+    assert load_project_config(tmp_path / "src") == ProjectConfig()
+
+    (tmp_path / "pyproject.toml").write_text(
+        '[tool.python-import]\nworkspace = true\n[tool.uv.workspace]\nmembers = ["packages/*"]\n'
+    )
+    assert load_project_config(tmp_path) == ProjectConfig(
+        workspace=True, workspace_members=("packages/*",)
+    )
+
+    (tmp_path / "pyproject.toml").write_text(
+        '[tool.python-import]\nexclude = "build"\n'
+    )
+    with pytest.raises(ValueError, match="list of strings"):
+        load_project_config(tmp_path)
+
+
+def test_load_project_config_with_tomli(configured_project, monkeypatch):
+    pytest.importorskip("tomli")
+    # Python < 3.11
+    monkeypatch.setitem(sys.modules, "tomllib", None)
+    assert load_project_config(configured_project).max_file_size == 200
+
+
+def test_load_project_config_warns_if_unreadable(
+    configured_project, monkeypatch, caplog
+):
+    with caplog.at_level(logging.WARNING):
+        (configured_project / "pyproject.toml").write_text(
+            "[tool.python-import]\nexclude = [\n"
+        )
+        assert load_project_config(configured_project) == ProjectConfig()
+        assert "is ignored" in caplog.text
+
+        caplog.clear()
+        (configured_project / "pyproject.toml").write_text(
+            '[tool.python-import]\nexclude = ["tests/"]\n'
+        )
+        monkeypatch.setitem(sys.modules, "tomllib", None)
+        monkeypatch.setitem(sys.modules, "tomli", None)
+        assert load_project_config(configured_project) == ProjectConfig()
+        assert "Install tomli" in caplog.text
+
+
+@pytest.mark.parametrize("search", ["rg", "python"])
+def test_list_python_files_applies_project_config(
+    configured_project, monkeypatch, search
+):
+    if search == "rg" and shutil.which("rg") is None:
+        pytest.skip("rg is not installed")
+    monkeypatch.setenv(SEARCH_ENV_VAR, search)
+
+    assert _relative_paths(
+        configured_project, list_python_files(configured_project)
+    ) == [
+        "other/tests/test_b.py",
+        "src/a.py",
+        "src/third_party/c.py",
+        "tests/test_a.py",
+    ]
+    assert _relative_paths(
+        configured_project,
+        list_python_files(configured_project, exclude=["third_party/", "tests/"]),
+    ) == ["src/a.py"]
+
+
+@requires_rg
+def test_walk_finds_same_as_rg_with_project_config(configured_project):
+    assert dict(
+        iter_walk_import_word_rowcols(configured_project, ["foo"], ["src"])
+    ) == dict(iter_rg_import_word_rowcols(configured_project, ["foo"], [Path("src")]))
+    assert dict(
+        iter_walk_import_word_rowcols(
+            configured_project,
+            ["foo"],
+            project_config=load_project_config(configured_project).with_exclude(
+                ["/other/"]
+            ),
+        )
+    ) == dict(
+        iter_rg_import_word_rowcols(configured_project, ["foo"], exclude=["/other/"])
+    )
+
+
+def test_count_with_exclude_skips_index(configured_project, cache_dir):
+    parser = Parser(PY_LANGUAGE)
+    with ImportIndex(configured_project) as index:
+        index.build(parser)
+
+    assert count_imports(configured_project, "foo", parser) == {
+        "import foo": 3,
+        "from bar import foo": 1,
+    }
+    assert count_imports(
+        configured_project, "foo", parser, exclude=["tests/"], jobs=1
+    ) == {"import foo": 1, "from bar import foo": 1}
+    assert count_imports_of_words(
+        configured_project, ["foo"], parser, exclude=["/src/"], jobs=1
+    ) == {"foo": {"import foo": 2}}
+
+    # Excluding in pyproject.toml removes the files from the index on the next update.
+    (configured_project / "pyproject.toml").write_text(
+        '[tool.python-import]\nexclude = ["tests/", "/src/gen/", "/src/big.py"]\n'
+    )
+    with ImportIndex(configured_project) as index:
+        update = index.update(parser)
+        assert (update.added, update.removed) == (3, 2)
+        assert index.count("foo") == {
+            "import foo": 4,
+            "from bar import foo": 1,
+        }
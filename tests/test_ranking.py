@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+
+import pytest
+import tree_sitter_python as tspython
+from tree_sitter import Language, Parser
+
+from python_import import ranking
+from python_import.count import count_top_imports
+from python_import.index import ImportIndex
+from python_import.ranking import (
+    RECENCY_DAYS,
+    ImportRanker,
+    get_git_file_times,
+    get_git_file_times_path,
+)
+
+PY_LANGUAGE = Language(tspython.language())
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def project(make_project):
+    # `from app.db import Session` is used more, but far from app/api/.
+    files = {
+        "app/api/routes.py": "from app.api.deps import Session\n",
+        "app/api/users.py": "",
+        "app/db/a.py": "from app.db import Session\n",
+        "app/db/b.py": "from app.db import Session\n",
+        "scripts/c.py": "from app.db import Session\n",
+    }
+    return make_project(files)
+
+
+def test_import_ranker(tmp_path):
+    ranker = ImportRanker(tmp_path, near=tmp_path / "a/b/c.py")
+    ranker.add_file(str(tmp_path / "a/b/d.py"), {"import x": [3]})
+    ranker.add_file(str(tmp_path / "e/f.py"), {"import y": [1, 5], "import x": [0]})
+    ranker.add_file(str(tmp_path / "e/g.py"), {"import y": [2]})
+    assert [
+        (import_count.statement, import_count.count, import_count.score)
+        for import_count in ranker.top()
+    ] == [("import x", 2, 1.25), ("import y", 3, 0.75)]
+    # the nearest use is the example
+    assert (ranker.top(1)[0].path, ranker.top(1)[0].row) == (
+        str(tmp_path / "a/b/d.py"),
+        3,
+    )
+
+    with pytest.raises(ValueError, match="Unknown recency"):
+        ImportRanker(tmp_path, recency="ctime")  # type: ignore[arg-type]
+
+
+def test_import_ranker_recency(tmp_path):
+    now = 1_000 * DAY
+    for name, days_ago in [("old.py", 10 * RECENCY_DAYS), ("new.py", 0)]:
+        (tmp_path / name).write_text("")
+        mtime = now - days_ago * DAY
+        os.utime(tmp_path / name, (mtime, mtime))
+
+    ranker = ImportRanker(tmp_path, recency="mtime", now=now)
+    ranker.add(str(tmp_path / "old.py"), "import old", 5, 0)
+    ranker.add(str(tmp_path / "new.py"), "import new", 1, 0)
+    # the mtime from the index
+    ranker.add("/deleted.py", "import old", 1, 0, mtime_ns=int(now * 1e9))
+    assert [
+        (import_count.statement, import_count.score) for import_count in ranker.top()
+    ] == [("import old", 1.455), ("import new", 1.0)]
+
+
+@pytest.mark.parametrize("use_index", [False, True])
+def test_count_top_imports_near(project, cache_dir, use_index):
+    parser = Parser(PY_LANGUAGE)
+    if use_index:
+        with ImportIndex(project) as index:
+            index.build(parser)
+
+    import_counts, _ = count_top_imports(
+        project, "Session", parser, use_index=use_index, jobs=1
+    )
+    assert [import_count.statement for import_count in import_counts] == [
+        "from app.db import Session",
+        "from app.api.deps import Session",
+    ]
+    assert import_counts[0].score is None
+
+    import_counts, _ = count_top_imports(
+        project,
+        "Session",
+        parser,
+        near=project / "app/api/users.py",
+        limit=1,
+        use_index=use_index,
+        jobs=1,
+    )
+    assert [import_count.to_json() for import_count in import_counts] == [
+        {
+            "statement": "from app.api.deps import Session",
+            "count": 1,
+            "kind": "from",
+            "module": "app.api.deps",
+            "path": str(project / "app/api/routes.py"),
+            "line": 1,
+            "score": 1.0,
+        }
+    ]
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_get_git_file_times(tmp_path, cache_dir, monkeypatch):
+    def git(*args: str) -> None:
+        subprocess.run(
+            ["git", "-c", "user.name=a", "-c", "user.email=a@a", *args],
+            cwd=tmp_path,
+            check=True,
+            capture_output=True,
+        )
+
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg/a.py").write_text("")
+    (tmp_path / "b.py").write_text("")
+    git("init")
+    git("add", ".")
+    git("commit", "-m", "first", "--date=2000-01-01T00:00:00Z")
+    (tmp_path / "pkg/a.py").write_text("import os\n")
+    git("commit", "-am", "second")
+
+    # the commit dates are the committer's, i.e. now
+    file_times = get_git_file_times(tmp_path / "pkg")
+    assert list(file_times) == [str((tmp_path / "pkg/a.py").resolve())]
+    assert get_git_file_times(tmp_path / "pkg") is file_times
+
+    # A new process reads it from the cache dir until HEAD moves.
+    assert get_git_file_times_path(tmp_path / "pkg").is_file()
+    ranking._get_git_file_times.cache_clear()
+    monkeypatch.setattr(ranking, "_read_git_log", lambda project_root: {})
+    assert get_git_file_times(tmp_path / "pkg") == file_times
+    git("commit", "--allow-empty", "-m", "third")
+    assert get_git_file_times(tmp_path / "pkg") == {}
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import base64
+import json
+from pathlib import Path
+
+from python_import.rg import (
+    iter_rg_import_rowcols,
+    iter_rg_import_word_rowcols,
+    iter_rg_json_rowcols,
+)
+
+SCRIPT_DIR = Path(__file__).parent
+
+
+def test_iter_rg_import_rowcols():
+    project_root = SCRIPT_DIR / "sample_projects/project1"
+    assert list(iter_rg_import_rowcols(project_root, "foo")) == [
+        (
+            str((project_root / "src/myproject1/a/b/c/d.py").resolve()),
+            [(2, 5), (11, 30), (14, 30), (17, 30), (20, 30)],
+        )
+    ]
+
+
+def test_iter_rg_import_word_rowcols():
+    project_root = SCRIPT_DIR / "sample_projects/project1"
+    assert list(iter_rg_import_word_rowcols(project_root, ["foo", "bar"])) == [
+        (
+            str((project_root / "src/myproject1/a/b/c/d.py").resolve()),
+            {
+                "foo": [(2, 5), (11, 30), (14, 30), (17, 30), (20, 30)],
+                "bar": [(2, 16), (20, 37)],
+            },
+        )
+    ]
+
+
+def test_iter_rg_import_rowcols_stops_early(tmp_path):
+    for i in range(100):
+        (tmp_path / f"mod{i}.py").write_text("import numpy as np\n")
+
+    rg_import_rowcols = iter_rg_import_rowcols(tmp_path, "np")
+    python_file_path, rowcols = next(rg_import_rowcols)
+    assert Path(python_file_path).parent == tmp_path.resolve()
+    assert rowcols == [(0, 16)]
+
+    # kills ripgrep
+    rg_import_rowcols.close()
+
+
+def _rg_match(path: dict, lines: dict, line_number: int, *starts: int) -> bytes:
+    record = {
+        "type": "match",
+        "data": {
+            "path": path,
+            "lines": lines,
+            "line_number": line_number,
+            "absolute_offset": 0,
+            "submatches": [
+                {"match": {"text": "np"}, "start": start, "end": start + 2}
+                for start in starts
+            ],
+        },
+    }
+    return json.dumps(record, separators=(",", ":")).encode()
+
+
+def _rg_record(record_type: str, path: dict) -> bytes:
+    return json.dumps(
+        {"type": record_type, "data": {"path": path}}, separators=(",", ":")
+    ).encode()
+
+
+def test_iter_rg_json_rowcols():
+    a = {"text": 'dir "a"\\a.py'}
+    b = {"bytes": base64.b64encode(b"b\xff.py").decode()}
+    rg_json_lines = [
+        _rg_record("begin", a),
+        _rg_match(a, {"text": "import numpy as np\n"}, 1, 16),
+        _rg_record("context", a),
+        _rg_match(a, {"text": "x = np.zeros(3)\n"}, 3, 4),
+        _rg_match(a, {"text": 'from np import np  # "\tquoted"\n'}, 5, 5, 15),
+        _rg_record("end", a),
+        _rg_record("begin", b),
+        _rg_match(
+            b, {"bytes": base64.b64encode(b"import np  # \xff\n").decode()}, 2, 7
+        ),
+        _rg_record("end", b),
+        _rg_record("begin", a),
+        _rg_match(a, {"text": "x = np.zeros(3)\n"}, 3, 4),
+        _rg_record("end", a),
+        b'{"type":"summary","data":{}}',
+    ]
+    assert list(iter_rg_json_rowcols(rg_json_lines)) == [
+        ('dir "a"\\a.py', [(0, 16), (4, 5), (4, 15)]),
+        ("b\udcff.py", [(1, 7)]),
+    ]
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+from io import StringIO
+from pathlib import Path
+
+import tree_sitter_python as tspython
+from tree_sitter import Language, Parser
+
+from python_import.index import build_index
+from python_import.server import METHOD_NOT_FOUND, PARSE_ERROR, ImportServer
+from python_import.utils import get_relative_import_resolver
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR / "sample_projects/project1"
+PY_LANGUAGE = Language(tspython.language())
+D_PY = str((PROJECT_ROOT / "src/myproject1/a/b/c/d.py").resolve())
+FOO_IMPORT = {
+    "statement": "from python_import import foo",
+    "count": 3,
+    "kind": "from",
+    "module": "python_import",
+    "path": D_PY,
+    "line": 12,
+}
+
+
+def test_server_count():
+    server = ImportServer(Parser(PY_LANGUAGE))
+    response = server.handle_request(
+        {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "count",
+            "params": {
+                "project_root": str(PROJECT_ROOT),
+                "module_name": "foo",
+                "use_index": False,
+            },
+        }
+    )
+
+    assert response == {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "result": [FOO_IMPORT | {"partial": False}],
+    }
+
+
+def test_server_count_many():
+    server = ImportServer(Parser(PY_LANGUAGE))
+    assert server.count_many(PROJECT_ROOT, ["foo", "os"], use_index=False) == [
+        {
+            "module_name": "foo",
+            "imports": [FOO_IMPORT],
+        },
+        {"module_name": "os", "imports": []},
+    ]
+
+
+def test_server_reopens_rebuilt_index(cache_dir, make_project):
+    project_root = make_project({"a.py": "import numpy as np\n"})
+    build_index(project_root, Parser(PY_LANGUAGE))
+    server = ImportServer(Parser(PY_LANGUAGE))
+    try:
+        assert [
+            x["count"] for x in server.count(project_root, "np", update_index=False)
+        ] == [1]
+
+        # e.g. `python-import index build` in another process
+        (project_root / "b.py").write_text("import numpy as np\n")
+        build_index(project_root, Parser(PY_LANGUAGE))
+        assert [
+            x["count"] for x in server.count(project_root, "np", update_index=False)
+        ] == [2]
+    finally:
+        server.close()
+
+
+def test_server_keeps_resolver_until_layout_changes(make_project):
+    project_root = make_project({"pkg/a.py": "from .b import foo\n"}).resolve()
+    server = ImportServer(Parser(PY_LANGUAGE))
+    assert server.count(project_root, "foo", use_index=False)[0]["statement"] == (
+        "from pkg.b import foo"
+    )
+    resolver = get_relative_import_resolver(project_root)
+    server.count(project_root, "foo", use_index=False)
+    assert get_relative_import_resolver(project_root) is resolver
+
+    # src/ layout
+    (project_root / "src").mkdir()
+    (project_root / "pkg").rename(project_root / "src/pkg")
+    assert server.count(project_root, "foo", use_index=False)[0]["statement"] == (
+        "from pkg.b import foo"
+    )
+    assert get_relative_import_resolver(project_root) is not resolver
+
+
+def test_server_stats():
+    server = ImportServer(Parser(PY_LANGUAGE), collect_stats=True)
+    assert server.stats() is None
+
+    server.count(PROJECT_ROOT, "foo", use_index=False)
+    stats = server.stats()
+    assert stats is not None
+    assert stats["counts"]["files_read"] == 1
+    assert "total" in stats["seconds"]
+
+
+def test_server_serve_stdio():
+    requests = [
+        {"jsonrpc": "2.0", "id": 1, "method": "ping"},
+        {"jsonrpc": "2.0", "method": "ping"},  # notification: no response
+        {"jsonrpc": "2.0", "id": 2, "method": "unknown"},
+        {"jsonrpc": "2.0", "id": 3, "method": "shutdown"},
+        {"jsonrpc": "2.0", "id": 4, "method": "ping"},  # not served after shutdown
+    ]
+    rfile = StringIO(
+        "not json\n" + "".join(json.dumps(request) + "\n" for request in requests)
+    )
+    wfile = StringIO()
+
+    server = ImportServer(Parser(PY_LANGUAGE))
+    server.serve(rfile, wfile)
+
+    responses = [json.loads(line) for line in wfile.getvalue().splitlines()]
+    assert [response["id"] for response in responses] == [None, 1, 2, 3]
+    assert responses[0]["error"]["code"] == PARSE_ERROR
+    assert responses[1]["result"] == "pong"
+    assert responses[2]["error"]["code"] == METHOD_NOT_FOUND
+
+
+def test_server_subprocess():
+    requests = [
+        {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "count",
+            "params": [str(PROJECT_ROOT), "bar"],
+        },
+        {"jsonrpc": "2.0", "id": 2, "method": "shutdown"},
+    ]
+    process = subprocess.run(
+        [sys.executable, "-c", "from python_import.cli import app; app()", "serve"],
+        input="".join(json.dumps(request) + "\n" for request in requests),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    responses = [json.loads(line) for line in process.stdout.splitlines()]
+    assert responses[0]["result"] == [
+        {
+            "statement": "from foo import bar",
+            "count": 1,
+            "kind": "from",
+            "module": "foo",
+            "path": D_PY,
+            "line": 3,
+            "partial": False,
+        },
+        {
+            "statement": "from python_import import foo as bar",
+            "count": 1,
+            "kind": "as",
+            "module": "python_import",
+            "path": D_PY,
+            "line": 21,
+            "partial": False,
+        },
+    ]
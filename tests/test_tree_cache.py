@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import os
+import shutil
+from pathlib import Path
+
+import tree_sitter_python as tspython
+from tree_sitter import Language, Parser
+
+from python_import.server import ImportServer
+from python_import.tree_cache import TreeCache, use_tree_cache
+from python_import.utils import parse_file
+
+SCRIPT_DIR = Path(__file__).parent
+PY_LANGUAGE = Language(tspython.language())
+
+
+def test_tree_cache_evicts_least_recently_used():
+    parser = Parser(PY_LANGUAGE)
+    tree = parser.parse(b"import os\n")
+    tree_cache = TreeCache(max_bytes=30)
+    tree_cache.put("a.py", 1, 10, tree)
+    tree_cache.put("b.py", 1, 10, tree)
+    tree_cache.put("c.py", 1, 10, tree)
+    assert tree_cache.get("a.py", 1, 10) is tree
+
+    tree_cache.put("d.py", 1, 10, tree)
+    assert tree_cache.get("b.py", 1, 10) is None
+    assert tree_cache.get("a.py", 1, 10) is tree
+    assert (len(tree_cache), tree_cache.nbytes) == (3, 30)
+
+    # changed file
+    assert tree_cache.get("c.py", 2, 10) is None
+    # too large to cache
+    tree_cache.put("e.py", 1, 31, tree)
+    assert tree_cache.get("e.py", 1, 31) is None
+    assert (tree_cache.hits, tree_cache.misses) == (2, 3)
+
+
+def test_parse_file_reuses_tree_until_file_changes(tmp_path):
+    parser = Parser(PY_LANGUAGE)
+    python_file_path = tmp_path / "a.py"
+    python_file_path.write_text("import os\n")
+
+    with use_tree_cache(TreeCache()) as tree_cache:
+        tree = parse_file(python_file_path, parser)
+        assert parse_file(python_file_path, parser) is tree
+
+        python_file_path.write_text("import sys\n")
+        os.utime(python_file_path, ns=(0, 0))
+        changed_tree = parse_file(python_file_path, parser)
+        assert changed_tree is not tree
+        assert changed_tree.root_node.text == b"import sys\n"
+
+    assert tree_cache is not None
+    assert (tree_cache.hits, tree_cache.misses) == (1, 2)
+    # not in use outside the context
+    assert parse_file(python_file_path, parser) is not changed_tree
+
+
+def test_server_reuses_trees_across_lookups(tmp_path):
+    project_root = tmp_path / "project1"
+    shutil.copytree(SCRIPT_DIR / "sample_projects/project1", project_root)
+    server = ImportServer(Parser(PY_LANGUAGE), collect_stats=True)
+
+    server.count(project_root, "foo", use_index=False)
+    first_counts = server.stats()["counts"]  # type: ignore[index]
+    assert first_counts["tree_cache_misses"] > 0
+    assert "tree_cache_hits" not in first_counts
+
+    # another word in the same files
+    server.count_many(project_root, ["foo", "os"], use_index=False)
+    second_counts = server.stats()["counts"]  # type: ignore[index]
+    assert "tree_cache_misses" not in second_counts
+    assert second_counts["tree_cache_hits"] > 0
+    assert "files_read" not in second_counts
+
+    server.close()
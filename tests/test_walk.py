@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+
+import pytest
+import tree_sitter_python as tspython
+from tree_sitter import Language, Parser
+
+from python_import.count import count_imports
+from python_import.rg import SEARCH_ENV_VAR, iter_rg_import_word_rowcols
+from python_import.walk import (
+    compile_words_regex,
+    iter_python_files,
+    iter_walk_import_word_rowcols,
+    search_file,
+)
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR / "sample_projects/project1"
+
+requires_rg = pytest.mark.skipif(
+    shutil.which("rg") is None, reason="rg is not installed"
+)
+
+
+@pytest.fixture
+def ignored_project(tmp_path):
+    files = {
+        ".git/HEAD": "",
+        ".git/info/exclude": "excluded.py\n",
+        ".gitignore": "build/\n*.gen.py\n/top_only.py\n!keep.gen.py\n",
+        "a.py": "import foo\n",
+        "b.pyi": "from foo import bar\n",
+        "c.txt": "import foo\n",
+        "excluded.py": "import foo\n",
+        "top_only.py": "import foo\n",
+        "x.gen.py": "import foo\n",
+        "keep.gen.py": "import foo\n",
+        ".hidden/d.py": "import foo\n",
+        "build/e.py": "import foo\n",
+        "pkg/top_only.py": "import foo\n",
+        "pkg/.ignore": "f.py\n",
+        "pkg/f.py": "import foo\n",
+    }
+    for path, content in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(content)
+    return tmp_path
+
+
+def test_iter_python_files_respects_ignore_files(ignored_project):
+    assert [
+        Path(path).relative_to(ignored_project).as_posix()
+        for path in iter_python_files(ignored_project)
+    ] == ["a.py", "b.pyi", "keep.gen.py", "pkg/top_only.py"]
+
+    # the parent directories' ignore files apply to a subdirectory too
+    assert list(iter_python_files(ignored_project / "pkg")) == [
+        str(ignored_project / "pkg/top_only.py")
+    ]
+
+
+def test_search_file(tmp_path):
+    python_file_path = tmp_path / "a.py"
+    python_file_path.write_text(
+        "from a import (\n    foo,\n    foo_bar as é,\n)\nfoo()  # a call\nimport x.foo, foo\n"
+    )
+    assert search_file(str(python_file_path), compile_words_regex(["foo", "é"])) == {
+        "foo": [(1, 4), (5, 9), (5, 14)],
+        "é": [(2, 15)],
+    }
+
+    (tmp_path / "empty.py").write_text("")
+    assert search_file(str(tmp_path / "empty.py"), compile_words_regex(["foo"])) == {}
+
+
+def test_search_file_unicode_word_boundaries(tmp_path):
+    (tmp_path / "a.py").write_text(
+        "import foo\nimport fooé\nimport éfoo\nimport foo  # é\n"
+    )
+    assert search_file(str(tmp_path / "a.py"), compile_words_regex(["foo"])) == {
+        "foo": [(0, 7), (3, 7)]
+    }
+
+
+@requires_rg
+def test_walk_unicode_word_boundaries_same_as_rg(tmp_path):
+    (tmp_path / "a.py").write_text(
+        "import foo\nimport fooé\nimport éfoo, ßfoo\nfrom foo import ü\n"
+    )
+    words = ["foo", "ü"]
+    assert dict(iter_walk_import_word_rowcols(tmp_path, words)) == dict(
+        iter_rg_import_word_rowcols(tmp_path, words)
+    )
+
+
+@requires_rg
+@pytest.mark.parametrize("project_root", [PROJECT_ROOT, SCRIPT_DIR.parent / "src"])
+def test_walk_finds_same_as_rg(project_root):
+    words = ["foo", "os", "Path", "annotations"]
+    assert dict(iter_walk_import_word_rowcols(project_root, words)) == dict(
+        iter_rg_import_word_rowcols(project_root, words)
+    )
+
+
+def test_count_without_rg(monkeypatch):
+    parser = Parser(Language(tspython.language()))
+    monkeypatch.setenv(SEARCH_ENV_VAR, "python")
+    assert count_imports(PROJECT_ROOT, "foo", parser, use_index=False) == {
+        "from python_import import foo": 3
+    }
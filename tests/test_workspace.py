@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import logging
+import sys
+
+import pytest
+import tree_sitter_python as tspython
+from tree_sitter import Language, Parser
+
+from python_import.count import count_imports
+from python_import.index import ImportIndex, build_index
+from python_import.server import ImportServer
+from python_import.utils import get_relative_import_resolver
+from python_import.workspace import Workspace, find_workspace_root, get_workspace_root
+
+PY_LANGUAGE = Language(tspython.language())
+
+
+@pytest.fixture
+def monorepo(make_project):
+    files = {
+        ".git/HEAD": "",
+        "pyproject.toml": "[tool.python-import]\nworkspace = true\n",
+        # src/ layout
+        "libs/core/pyproject.toml": "",
+        "libs/core/src/core/__init__.py": "from .utils import helper\n",
+        "libs/core/src/core/utils.py": "from .helpers import helper\n",
+        # flat layout
+        "services/api/pyproject.toml": "[project]\nname = 'api'\n",
+        "services/api/api/__init__.py": "",
+        "services/api/api/main.py": (
+            "from core.utils import helper\nfrom .routes import router\n"
+        ),
+        "services/api/api/v2/app.py": "from ..routes import router\n",
+        "scripts/run.py": "from .routes import router\n",
+    }
+    return make_project(files)
+
+
+def test_find_workspace_root(monorepo):
+    assert find_workspace_root(monorepo / "services/api") == monorepo
+    assert find_workspace_root(monorepo) == monorepo
+    assert get_workspace_root(monorepo / "libs/core") == monorepo
+
+    (monorepo / "pyproject.toml").write_text("")
+    assert find_workspace_root(monorepo / "services/api") is None
+    assert get_workspace_root(monorepo / "services/api") == monorepo / "services/api"
+
+
+def test_find_workspace_root_without_tomllib(monorepo, monkeypatch, caplog):
+    # Python < 3.11 reads pyproject.toml with tomli, a dependency there.
+    pytest.importorskip("tomli")
+    monkeypatch.setitem(sys.modules, "tomllib", None)
+    assert find_workspace_root(monorepo / "services/api") == monorepo
+
+    # not silently ignored without it
+    monkeypatch.setitem(sys.modules, "tomli", None)
+    with caplog.at_level(logging.WARNING):
+        assert find_workspace_root(monorepo / "services/api") is None
+    assert "Install tomli" in caplog.text
+
+
+def test_workspace_package_roots(monorepo):
+    workspace = Workspace(monorepo)
+    assert workspace.get_package_root(str(monorepo / "libs/core/src/core")) == str(
+        monorepo / "libs/core"
+    )
+    assert workspace.get_module_root(str(monorepo / "libs/core/src/core")) == (
+        monorepo / "libs/core/src"
+    )
+    assert workspace.get_module_root(str(monorepo / "services/api/api/v2")) == (
+        monorepo / "services/api"
+    )
+    assert workspace.get_module_root(str(monorepo / "scripts")) is None
+
+    workspace = Workspace(monorepo, ["libs/*"])
+    assert workspace.get_module_root(str(monorepo / "libs/core/src/core")) == (
+        monorepo / "libs/core/src"
+    )
+    assert workspace.get_module_root(str(monorepo / "services/api/api")) is None
+
+
+def test_count_resolves_relative_imports_per_package(monorepo):
+    parser = Parser(PY_LANGUAGE)
+    assert count_imports(monorepo, "helper", parser, use_index=False, jobs=1) == {
+        "from core.helpers import helper": 1,
+        "from core.utils import helper": 2,
+    }
+    assert count_imports(monorepo, "router", parser, use_index=False, jobs=1) == {
+        "from api.routes import router": 2,
+        # not in any package
+        "from scripts.routes import router": 1,
+    }
+
+    # only the listed members are packages
+    (monorepo / "pyproject.toml").write_text(
+        '[tool.python-import]\nworkspace-members = ["libs/*"]\n'
+    )
+    get_relative_import_resolver.cache_clear()
+    assert count_imports(monorepo, "router", parser, use_index=False, jobs=1) == {
+        "from services.api.api.routes import router": 2,
+        "from scripts.routes import router": 1,
+    }
+
+
+def test_server_shares_workspace_index(monorepo, cache_dir):
+    parser = Parser(PY_LANGUAGE)
+    build_index(monorepo, parser)
+    server = ImportServer(parser)
+    try:
+        result = server.count(monorepo / "services/api", "helper", update_index=False)
+        assert [(x["statement"], x["count"]) for x in result] == [
+            ("from core.utils import helper", 2),
+            ("from core.helpers import helper", 1),
+        ]
+        assert list(server._indices) == [monorepo]
+    finally:
+        server.close()
+    assert not ImportIndex.exists(monorepo / "services/api")
+
+
+def test_server_sees_new_member_package(monorepo):
+    server = ImportServer(Parser(PY_LANGUAGE))
+    assert [
+        x["statement"] for x in server.count(monorepo, "router", use_index=False)
+    ] == [
+        "from api.routes import router",
+        "from scripts.routes import router",
+    ]
+
+    # between two requests: scripts/ becomes a package, and api moves to a src/ layout
+    (monorepo / "scripts/pyproject.toml").write_text("")
+    (monorepo / "services/api/src").mkdir()
+    (monorepo / "services/api/api").rename(monorepo / "services/api/src/api")
+    assert [
+        x["statement"] for x in server.count(monorepo, "router", use_index=False)
+    ] == [
+        "from api.routes import router",
+        "from routes import router",
+    ]